@@ -0,0 +1,19 @@
+"""
+ASGI config for gricapp project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``, served e.g. by ``uvicorn config.asgi:application``.
+
+See gricapi.asgi, Django 2.2 has no ASGI support of its own.
+"""
+
+import os
+
+import django
+
+from gricapi.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
+
+django.setup(set_prefix=False)
+application = ASGIHandler()
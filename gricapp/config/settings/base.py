@@ -72,6 +72,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 AUTH_USER_MODEL = 'gricapi.User'
 
 MIDDLEWARE = [
+    'gricapi.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -101,6 +102,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+# threads running requests in each process served by config.asgi,
+# each one may hold a database connection
+ASGI_THREADS = config('ASGI_THREADS', default=8, cast=int)
 
 
 # Database
@@ -113,6 +117,25 @@ DATABASES = {
         cast=db_url
     )
 }
+# seconds a connection stays open after a request for the next ones of
+# the same thread, 0 closes it at the end of every request
+DATABASES['default']['CONN_MAX_AGE'] = config(
+    'DATABASE_CONN_MAX_AGE', default=0, cast=int)
+# connections of each process kept open by an in-process pool on
+# PostgreSQL and shared by its threads, 0 disables the pool,
+# see gricapi.backends.postgresql
+DATABASE_POOL_SIZE = config('DATABASE_POOL_SIZE', default=0, cast=int)
+if DATABASE_POOL_SIZE and DATABASES['default']['ENGINE'] in (
+        'django.db.backends.postgresql',
+        'django.db.backends.postgresql_psycopg2'):
+    DATABASES['default']['ENGINE'] = 'gricapi.backends.postgresql'
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': DATABASE_POOL_SIZE,
+        'MAX_IDLE': config('DATABASE_POOL_MAX_IDLE', default=300, cast=int),
+        'TIMEOUT': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+        'HEALTH_CHECKS': config(
+            'DATABASE_HEALTH_CHECKS', default=True, cast=bool),
+    }
 
 
 # Password validation
@@ -167,6 +190,46 @@ MEDIA_URL = '/media/'
 REST_FRAMEWORK = {
 }
 
+# keyset pagination of the gricapi list endpoints,
+# clients may ask for up to API_MAX_PAGE_SIZE rows with ?page_size=
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=100, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=1000, cast=int)
+# rows read per query by the streaming exports
+API_EXPORT_CHUNK_SIZE = config('API_EXPORT_CHUNK_SIZE', default=500, cast=int)
+# rows inserted per query by the produce import
+API_IMPORT_BATCH_SIZE = config('API_IMPORT_BATCH_SIZE', default=500, cast=int)
+
+# Cache, e.g. CACHE_URL=rediscache://host:6379/0 (needs django-redis),
+# local memory when unset
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+# cached gricapi payloads expire after API_CACHE_TIMEOUT seconds,
+# changing API_CACHE_VERSION discards all of them
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int)
+API_CACHE_VERSION = config(
+    'API_CACHE_VERSION', default=config('SOURCE_VERSION', default='1'))
+
+# requests running the same SQL more times than this are logged as
+# likely N+1 queries, see gricapi.metrics
+API_N_PLUS_ONE_THRESHOLD = config(
+    'API_N_PLUS_ONE_THRESHOLD', default=10, cast=int)
+
+# minutes after which the stock reserved by an unpaid order is released
+# by the release_expired_reservations command
+STOCK_RESERVATION_TIMEOUT = config(
+    'STOCK_RESERVATION_TIMEOUT', default=30, cast=int)
+
+# background tasks of gricapi.tasks, run by the run_workers command, or
+# right after the commit queuing them in the same process when eager
+TASKS_EAGER = config('TASKS_EAGER', default=False, cast=bool)
+# attempts of a failing task, retried TASKS_RETRY_DELAY seconds later,
+# doubling each time
+TASKS_MAX_ATTEMPTS = config('TASKS_MAX_ATTEMPTS', default=5, cast=int)
+TASKS_RETRY_DELAY = config('TASKS_RETRY_DELAY', default=30, cast=int)
+# seconds a worker may run a task before it is given to another one
+TASKS_LEASE = config('TASKS_LEASE', default=300, cast=int)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=14),
@@ -3,6 +3,15 @@ from .base import *  # NOQA
 
 DEBUG = True
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'gricapi.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'gricapi.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
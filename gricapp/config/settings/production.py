@@ -5,7 +5,12 @@ from datetime import timedelta
 DEBUG = False
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'gricapi.renderers.FastJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'gricapi.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
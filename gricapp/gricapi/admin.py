@@ -1,7 +1,7 @@
 # Register your models here.
 from django.contrib import admin
 from gricapi.models import (
-    User, Profile, Produce, Order, OrderItem, Category
+    User, Profile, Produce, Order, OrderItem, Category, Task
 )
 
 
@@ -41,7 +41,13 @@ class OrderAdmin(admin.ModelAdmin):
                     'consumer', 'paid')
 
 
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'date_created')
+    list_filter = ('name', 'status')
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Produce, ProduceAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(Task, TaskAdmin)
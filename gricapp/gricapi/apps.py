@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class GricapiConfig(AppConfig):
     name = 'gricapi'
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel,unused-import
+        from gricapi import signals  # NOQA
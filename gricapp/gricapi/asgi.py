@@ -0,0 +1,221 @@
+"""
+ASGI serving of the Django application.
+
+Django 2.2 only serves WSGI, where a worker is held by a request from
+the first byte of its body to the last byte of its response, however
+slowly a mobile client sends and reads them. `ASGIHandler` reads the
+body and writes the response on the event loop of the ASGI server and
+only runs Django's handler, views and database access in a thread pool
+of `ASGI_THREADS` threads. A thread is released as soon as its response
+is rendered, so one process can keep hundreds of slow connections open
+with a few threads and as many database connections.
+
+Streaming responses, the exports, read their rows lazily on the thread
+which started them, so they keep it until their last chunk is sent; at
+most `STREAM_BUFFER` chunks are rendered ahead of the client. A client
+leaving mid-response stops the thread before its next chunk.
+"""
+import asyncio
+import io
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+STREAM_BUFFER = 8
+
+
+class ClientDisconnected(Exception):
+    """ The client left before the whole response was sent """
+
+
+def get_environ(scope, body):
+    """
+    Return the WSGI environ of the ASGI HTTP `scope`, reading the
+    request body from the seekable `body` file.
+    """
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings hold bytes as latin-1, see PEP 3333
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1])
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = '%s,%s' % (environ[name], value)
+        environ[name] = value
+    # the body was read whole, it may have been sent in chunks
+    environ['CONTENT_LENGTH'] = str(body.seek(0, io.SEEK_END))
+    body.seek(0)
+    return environ
+
+
+class ASGIHandler:
+    """
+    ASGI application running the Django handler in a thread pool, see
+    the module docstring.
+    """
+
+    def __init__(self, threads=None):
+        self.handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope type %r.'
+                             % scope['type'])
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """
+        Return the request body in a file, spooled to disk past
+        FILE_UPLOAD_MAX_MEMORY_SIZE, or None when the client left.
+        """
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, mode='w+b')
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def wait_for_disconnect(self, receive):
+        """
+        Return once the client left, the server then sends
+        `http.disconnect`.
+        """
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def next_chunk(self, chunks, disconnected):
+        """
+        Return the next item of the `chunks` queue, or raise
+        `ClientDisconnected` when the `disconnected` future is done first.
+        """
+        if disconnected.done():
+            raise ClientDisconnected
+        getter = asyncio.ensure_future(chunks.get())
+        await asyncio.wait([getter, disconnected],
+                           return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        raise ClientDisconnected
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        chunks = asyncio.Queue(maxsize=STREAM_BUFFER)
+        stop = threading.Event()
+        handled = loop.run_in_executor(
+            self.executor, self.run, get_environ(scope, body), loop,
+            chunks, stop)
+        # servers drop what is sent after a client left without an error,
+        # only receive() tells
+        disconnected = asyncio.ensure_future(
+            self.wait_for_disconnect(receive))
+        finished = False
+        try:
+            started = await self.next_chunk(chunks, disconnected)
+            if started is None:
+                # the handler failed, raise its error
+                finished = True
+                await handled
+                return
+            status, headers = started
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': headers})
+            while True:
+                chunk = await self.next_chunk(chunks, disconnected)
+                if chunk is None:
+                    finished = True
+                    break
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except BaseException as error:
+            if not finished:
+                # let the handler thread end, not wait on a full queue
+                stop.set()
+                while await chunks.get() is not None:
+                    pass
+            if not isinstance(error, ClientDisconnected):
+                raise
+        finally:
+            disconnected.cancel()
+            await asyncio.gather(disconnected, return_exceptions=True)
+            await handled
+            body.close()
+
+    def run(self, environ, loop, chunks, stop):
+        """
+        Run the Django handler, in a thread of the pool, and put on the
+        `chunks` queue its status and headers, the chunks of its body,
+        then None.
+        """
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put((int(status.split(' ', 1)[0]), [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]))
+
+        try:
+            response = self.handler(environ, start_response)
+            try:
+                if getattr(response, 'streaming', False):
+                    for chunk in response:
+                        if stop.is_set():
+                            break
+                        put(chunk)
+                else:
+                    put(b''.join(response))
+            finally:
+                # sends request_finished, which closes the database
+                # connections of this thread
+                response.close()
+        finally:
+            put(None)
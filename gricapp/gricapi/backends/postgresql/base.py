@@ -0,0 +1,113 @@
+"""
+PostgreSQL backend keeping its connections in a `ConnectionPool`.
+
+Django closes a connection at the end of every request unless
+`CONN_MAX_AGE` keeps it; this backend hands it back to the pool of the
+process instead, and takes one from it the next time a connection is
+needed. The pool is set by the `POOL` entry of the database settings:
+
+    'POOL': {
+        'MAX_SIZE': 10,         # connections of the process
+        'MAX_IDLE': 300,        # seconds an idle connection is kept
+        'TIMEOUT': 10,          # seconds to wait for a free connection
+        'HEALTH_CHECKS': True,  # run SELECT 1 before reusing one
+    }
+
+Connections handed back are rolled back and their session state is
+discarded, broken ones are closed.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from gricapi.pool import ConnectionPool, PoolExhausted
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return True
+
+
+def _reset(connection):
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    # hand it out as a new connection would be: in autocommit mode and
+    # without the settings, temporary tables, advisory locks or prepared
+    # statements of the session
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute('DISCARD ALL')
+    return True
+
+
+def get_pool(settings_dict, conn_params):
+    """
+    Return the pool of the process for the connection parameters.
+    """
+    # a forked process, e.g. a gunicorn worker, opens its own connections
+    key = (os.getpid(), repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = _pools[key] = ConnectionPool(
+                lambda: base.Database.connect(**conn_params),
+                max_size=options.get('MAX_SIZE', 10),
+                max_idle=options.get('MAX_IDLE', 300),
+                timeout=options.get('TIMEOUT', 10),
+                check=_ping if options.get('HEALTH_CHECKS', True) else None,
+                reset=_reset)
+    return pool
+
+
+def close_pools():
+    """
+    Close the idle connections of every pool of the process.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # PostgreSQL does not drop a database with open connections
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.settings_dict, conn_params)
+        try:
+            connection = self.pool.acquire()
+        except PoolExhausted as error:
+            raise base.Database.OperationalError(str(error))
+        # as the base class does for new connections
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,222 @@
+"""
+In-process benchmarks of the API endpoints.
+
+Every scenario sends one kind of request through the DRF test client,
+against whatever data the database holds, e.g. from `seed_marketplace`.
+The whole run happens in a transaction rolled back at the end, so the
+rows written by the create and update scenarios do not stay. The
+response cache is cleared before every request so the uncached path is
+measured.
+
+Results hold the p50, p95 and p99 latency in ms, the largest number of
+queries of a request and the peak memory allocated by one, in KiB.
+"""
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .metrics import QueryRecorder
+from .models import User, Category, Produce, Order
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+
+
+class Context:
+    """
+    The rows the scenarios read and write, created or picked once per
+    run, and a counter making every request of a scenario distinct.
+    """
+
+    def __init__(self):
+        admin, _ = Group.objects.get_or_create(name='admin')
+        self.user = User.objects.create(groups=admin, email=BENCHMARK_EMAIL)
+        category = Category.objects.values('category_name').annotate(
+            count=Count('pk')).filter(count=1).order_by(
+                'category_name').first()
+        if category is None:
+            category = {'category_name': Category.objects.create(
+                category_name='Benchmark').category_name}
+        self.category = Category.objects.get(
+            category_name=category['category_name'])
+        self.produce = list(Produce.objects.order_by('-stock', 'pk')[:3])
+        if len(self.produce) < 3:
+            raise ValueError('Seed produce first.')
+        # enough for every order of the run, rolled back with it
+        Produce.objects.filter(
+            pk__in=[produce.pk for produce in self.produce]).update(
+                stock=10 ** 6)
+        self.order = Order.objects.create(consumer=self.user)
+        self.count = 0
+
+    def produce_data(self):
+        return {
+            'owner': self.user.email,
+            'produce_name': 'Benchmark maize %d' % self.count,
+            'produce_category': self.category.category_name,
+            'stock': self.count % 50 + 1,
+            'measurement_unit': 'bags',
+            'price_tag': '1250.50',
+            'product_description': 'Dry yellow maize',
+        }
+
+    def order_items(self):
+        return [{'produce': produce.pk,
+                 'quantity_ordered': (self.count + index) % 3 + 1}
+                for index, produce in enumerate(self.produce)]
+
+
+def _products_create(context):
+    return 'post', reverse('api:products-list'), context.produce_data()
+
+
+def _products_update(context):
+    return ('put', reverse('api:products-detail',
+                           args=[context.produce[0].pk]),
+            dict(context.produce_data(),
+                 produce_name=context.produce[0].produce_name))
+
+
+def _category_create(context):
+    data = context.produce_data()
+    data.pop('produce_category')
+    return 'post', reverse('api:produce-category-list'), {
+        'category_name': 'Benchmark %d' % context.count,
+        'products': [data],
+    }
+
+
+def _order_create(context):
+    return 'post', reverse('api:shopping-list'), {
+        'consumer': context.user.email, 'items': context.order_items()}
+
+
+def _order_update(context):
+    return ('patch', reverse('api:shopping-detail', args=[context.order.pk]),
+            {'consumer': context.user.email, 'items': context.order_items()})
+
+
+# name -> function of the context returning (method, url, data)
+SCENARIOS = OrderedDict([
+    ('products-list', lambda context: (
+        'get', reverse('api:products-list'), None)),
+    ('products-retrieve', lambda context: (
+        'get', reverse('api:products-detail',
+                       args=[context.produce[0].pk]), None)),
+    ('products-create', _products_create),
+    ('products-update', _products_update),
+    ('produce-category-list', lambda context: (
+        'get', reverse('api:produce-category-list'), None)),
+    ('produce-category-retrieve', lambda context: (
+        'get', reverse('api:produce-category-detail',
+                       args=[context.category.pk]), None)),
+    ('produce-category-create', _category_create),
+    ('shopping-list', lambda context: (
+        'get', reverse('api:shopping-list'), None)),
+    ('shopping-retrieve', lambda context: (
+        'get', reverse('api:shopping-detail',
+                       args=[context.order.pk]), None)),
+    ('shopping-create', _order_create),
+    ('shopping-update', _order_update),
+])
+
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of the sorted `values`.
+    """
+    index = max(0, int(round(fraction * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+class Benchmark:
+    """
+    Runs the scenarios `iterations` times each after a warm-up request,
+    then once more to trace the memory allocated.
+    """
+
+    def __init__(self, iterations=50, scenarios=None):
+        self.iterations = iterations
+        self.scenarios = [name for name in SCENARIOS
+                          if not scenarios or name in scenarios]
+
+    def request(self, client, context, name):
+        method, url, data = SCENARIOS[name](context)
+        context.count += 1
+        cache.clear()
+        recorder = QueryRecorder()
+        with connections['default'].execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            duration = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise ValueError('%s answered %d: %s' % (
+                name, response.status_code, response.content[:200]))
+        return duration, recorder.count
+
+    def measure(self, client, context, name):
+        self.request(client, context, name)
+        durations, queries = [], []
+        for _ in range(self.iterations):
+            duration, count = self.request(client, context, name)
+            durations.append(duration * 1000)
+            queries.append(count)
+        tracemalloc.start()
+        try:
+            self.request(client, context, name)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        durations.sort()
+        return OrderedDict([
+            ('p50_ms', round(percentile(durations, 0.50), 3)),
+            ('p95_ms', round(percentile(durations, 0.95), 3)),
+            ('p99_ms', round(percentile(durations, 0.99), 3)),
+            ('queries', max(queries)),
+            ('alloc_kib', round(peak / 1024, 1)),
+        ])
+
+    def run(self):
+        """
+        Return the results of every scenario, keyed by name.
+        """
+        results = OrderedDict()
+        hosts = list(settings.ALLOWED_HOSTS) + ['testserver']
+        with override_settings(ALLOWED_HOSTS=hosts, DEBUG=False), \
+                transaction.atomic():
+            context = Context()
+            client = APIClient()
+            client.force_authenticate(user=context.user)
+            for name in self.scenarios:
+                results[name] = self.measure(client, context, name)
+            transaction.set_rollback(True)
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of `results` against the `baseline` results:
+    a latency or allocation more than `tolerance` (a fraction) above it,
+    or any extra query.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'alloc_kib'):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append('%s %s: %s > %s' % (
+                    name, metric, result[metric], base[metric]))
+        if result['queries'] > base['queries']:
+            regressions.append('%s queries: %s > %s' % (
+                name, result['queries'], base['queries']))
+    return regressions
@@ -0,0 +1,173 @@
+"""
+Read-through cache of serialized API payloads.
+
+Payloads are stored with Django's cache framework under keys made of
+the namespace, `API_CACHE_VERSION` and a fingerprint of the serializer
+fields, so a deploy changing the shape of a payload never reads the
+entries written by the previous one.
+"""
+import hashlib
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+from rest_framework.response import Response
+
+from gricapi.serializers import ProduceSerializer
+
+# namespace -> ResponseCache
+_caches = {}
+
+
+class ResponseCache:
+    """
+    Caches the `data` and the `Link`, `ETag` and `Last-Modified` headers
+    of list and retrieve responses for one namespace. Conditional
+    requests are answered from the cached validators.
+
+    Detail entries are keyed by primary key and deleted one by one with
+    `invalidate_objects`; a detail route looked up by slug is first
+    resolved to the primary key with `resolve_slug`, and its payload is
+    only served when it still shows that slug. List entries are
+    keyed by the query parameters and a generation token, which
+    `invalidate_lists` replaces so every page cached before is left to
+    expire.
+    """
+    cached_headers = ('Link', 'ETag', 'Last-Modified')
+
+    def __init__(self, namespace, serializer_class):
+        self.namespace = namespace
+        self.serializer_class = serializer_class
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._prefix = None
+        _caches[namespace] = self
+
+    @property
+    def prefix(self):
+        if self._prefix is None:
+            fields = self.serializer_class().fields
+            shape = ','.join(
+                '%s:%s' % (name, field.__class__.__name__)
+                for name, field in fields.items())
+            fingerprint = hashlib.md5(shape.encode('utf-8')).hexdigest()[:8]
+            self._prefix = 'gricapi:%s:%s:%s' % (
+                self.namespace, settings.API_CACHE_VERSION, fingerprint)
+        return self._prefix
+
+    def generation(self):
+        key = '%s:generation' % self.prefix
+        return cache.get_or_set(key, uuid4().hex, None)
+
+    def list_key(self, query_params):
+        query = urlencode(sorted(query_params.lists()), doseq=True)
+        digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return '%s:list:%s:%s' % (self.prefix, self.generation(), digest)
+
+    def detail_key(self, pk):
+        return '%s:detail:%s' % (self.prefix, pk)
+
+    def invalidate_lists(self):
+        cache.set('%s:generation' % self.prefix, uuid4().hex, None)
+
+    def invalidate_objects(self, pks):
+        cache.delete_many([self.detail_key(pk) for pk in pks])
+
+    def slug_key(self, slug):
+        return 'gricapi:%s:slug:%s' % (self.namespace, slug)
+
+    def resolve_slug(self, queryset, lookup):
+        """
+        Return the primary key of the row matching the `{field: slug}`
+        `lookup`, or None when there is none. The answer is remembered
+        for `API_CACHE_TIMEOUT`, or until `forget_slug` is called for a
+        deleted row.
+        """
+        (slug,) = lookup.values()
+        key = self.slug_key(slug)
+        pk = cache.get(key)
+        if pk is None:
+            pk = queryset.filter(**lookup).values_list('pk', flat=True).first()
+            if pk is not None:
+                cache.set(key, pk, settings.API_CACHE_TIMEOUT)
+        return pk
+
+    def forget_slug(self, slug):
+        cache.delete(self.slug_key(slug))
+
+    def matches_slug(self, pk, lookup, data):
+        """
+        Return whether the payload `data` is the one of the row `pk`
+        resolved from the `{field: slug}` `lookup`, forgetting the slug
+        when the row was replaced by another one using it.
+        """
+        ((field, slug),) = lookup.items()
+        if data.get('id') == pk and data.get(field) == slug:
+            return True
+        self.forget_slug(slug)
+        return False
+
+    def fetch(self, request, key, get_response, accept=None):
+        """
+        Return the response cached under `key`, or call `get_response`
+        and cache its payload when it is successful. A payload which
+        `accept`, when given, refuses is neither served from the cache
+        nor cached.
+        """
+        cached = cache.get(key)
+        if cached is not None and accept is not None and not accept(
+                cached[0]):
+            cache.delete(key)
+            cached = None
+        if cached is not None:
+            self._count(hit=True)
+            data, headers = cached
+            response = Response(data, headers=headers)
+            response['X-Cache'] = 'HIT'
+            if 'ETag' in headers:
+                response = get_conditional_response(
+                    request, etag=headers['ETag'],
+                    last_modified=parse_http_date_safe(
+                        headers.get('Last-Modified')),
+                    response=response)
+            return response
+
+        self._count(hit=False)
+        response = get_response()
+        if response.status_code == 200 and (
+                accept is None or accept(response.data)):
+            headers = {name: response[name] for name in self.cached_headers
+                       if response.has_header(name)}
+            cache.set(key, (response.data, headers),
+                      settings.API_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        Return the hit and miss counts of this process.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def get_cache_stats():
+    """
+    Return the hit and miss counts of every namespace.
+    """
+    return {namespace: response_cache.stats()
+            for namespace, response_cache in _caches.items()}
+
+
+produce_cache = ResponseCache('produce', ProduceSerializer)
@@ -0,0 +1,56 @@
+"""
+Streaming exports of querysets as CSV or NDJSON.
+"""
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def iterate_chunks(queryset, chunk_size):
+    """
+    Yield the rows of `queryset` in lists of `chunk_size`, in primary key
+    order. Every chunk is read by queries of its own, resuming after the
+    last primary key of the previous one, so no cursor or transaction
+    stays open while a chunk is sent and the prefetches of `queryset`
+    are applied chunk by chunk. A `.values()` queryset must include `pk`.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        last_pk = last['pk'] if isinstance(last, dict) else last.pk
+
+
+class _Echo:
+    """ A file-like object returning what is written to it """
+
+    def write(self, value):  # pylint: disable=no-self-use
+        return value
+
+
+def csv_lines(header, rows):
+    """
+    Yield the CSV lines of `rows`, dicts keyed by the names in `header`.
+    """
+    writer = csv.DictWriter(_Echo(), fieldnames=header,
+                            extrasaction='ignore')
+    # writeheader() only returns the line from Python 3.8 on
+    yield writer.writerow(dict(zip(header, header)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(records):
+    """
+    Yield every record as a line of JSON.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for record in records:
+        yield encoder.encode(record) + '\n'
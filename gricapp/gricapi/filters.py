@@ -0,0 +1,128 @@
+"""
+Filter backends for the catalog.
+"""
+from collections import Counter
+
+from django.db.models import BooleanField, Case, Count, Max, Min, Q, When
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .serializers import ProduceSerializer
+
+
+class ProduceFilterSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of `ProduceFacetFilter`.
+    """
+    # pylint: disable=abstract-method
+    category = serializers.ListField(
+        child=serializers.CharField(), required=False)
+    measurement_unit = serializers.ListField(
+        child=serializers.ChoiceField(
+            choices=ProduceSerializer.MEASUREMENT_OPTIONS),
+        required=False)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False)
+    in_stock = serializers.NullBooleanField(required=False)
+    facets = serializers.BooleanField(required=False)
+
+
+class ProduceFacetFilter(BaseFilterBackend):
+    """
+    Filters produce by `?category=`, `?measurement_unit=` (both may be
+    repeated), `?min_price=`, `?max_price=` and `?in_stock=`.
+
+    With `?facets=true` the list also counts the produce of every
+    category, measurement unit and stock status, each facet counted under
+    the other filters only so a buyer sees what widening it would give,
+    plus the price range. All of it comes from one query grouped by
+    category, unit and stock status, folded here.
+    """
+    facet_fields = ('category', 'measurement_unit', 'in_stock')
+
+    def get_params(self, request):
+        serializer = ProduceFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def get_price_filter(self, params):
+        condition = Q()
+        if params.get('min_price') is not None:
+            condition &= Q(price_tag__gte=params['min_price'])
+        if params.get('max_price') is not None:
+            condition &= Q(price_tag__lte=params['max_price'])
+        return condition
+
+    def filter_queryset(self, request, queryset, view):
+        params = self.get_params(request)
+        if params.get('category'):
+            queryset = queryset.filter(
+                produce_category__category_name__in=params['category'])
+        if params.get('measurement_unit'):
+            queryset = queryset.filter(
+                measurement_unit__in=params['measurement_unit'])
+        if params.get('in_stock') is not None:
+            queryset = queryset.filter(stock__gt=0) if params['in_stock'] \
+                else queryset.filter(stock=0)
+        return queryset.filter(self.get_price_filter(params))
+
+    def get_facets(self, request, queryset, view):
+        """
+        Return the facets of `queryset`, not yet filtered by this backend,
+        or None when they were not requested.
+        """
+        params = self.get_params(request)
+        if not params.get('facets'):
+            return None
+        groups = queryset.order_by().annotate(
+            in_stock=Case(When(stock__gt=0, then=True), default=False,
+                          output_field=BooleanField()),
+        ).values(
+            'produce_category__category_name', 'measurement_unit', 'in_stock',
+        ).annotate(
+            count=Count('pk', filter=self.get_price_filter(params)),
+            min_price=Min('price_tag'),
+            max_price=Max('price_tag'),
+        )
+        return self.fold(groups, params)
+
+    def fold(self, groups, params):
+        selected = {
+            'category': set(params.get('category') or ()),
+            'measurement_unit': set(params.get('measurement_unit') or ()),
+            'in_stock': ({params['in_stock']}
+                         if params.get('in_stock') is not None else set()),
+        }
+        counts = {name: Counter() for name in self.facet_fields}
+        lows, highs = [], []
+        for group in groups:
+            values = {
+                'category': group['produce_category__category_name'],
+                'measurement_unit': group['measurement_unit'],
+                'in_stock': group['in_stock'],
+            }
+            matches = {name: not selected[name] or value in selected[name]
+                       for name, value in values.items()}
+            for name in self.facet_fields:
+                if all(match for other, match in matches.items()
+                       if other != name):
+                    counts[name][values[name]] += group['count']
+            if all(matches.values()):
+                lows.append(group['min_price'])
+                highs.append(group['max_price'])
+
+        facets = {
+            name: [{'value': value, 'count': count}
+                   for value, count in sorted(
+                       counter.items(), key=lambda item: (-item[1], item[0]))
+                   if count]
+            for name, counter in counts.items()
+        }
+        price = serializers.DecimalField(max_digits=10, decimal_places=2)
+        facets['price'] = {
+            'min': price.to_representation(min(lows)) if lows else None,
+            'max': price.to_representation(max(highs)) if highs else None,
+        }
+        return facets
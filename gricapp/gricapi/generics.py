@@ -2,13 +2,46 @@
 
 from rest_framework import generics, mixins
 
+from .metrics import serialize_timer
 from .mixins import (
     CreateModelMixin, UpdateModelMixin,
     ListModelMixin, RetrieveModelMixin
 )
+from .readers import get_reader
 
 
 class GenericAPIView(generics.GenericAPIView):
+    # A field detail routes also accept in place of `lookup_field`, e.g.
+    # `slug` to serve `/catalog/produce/<slug>/` next to `<pk>`.
+    slug_lookup_field = None
+    # Render lists and exports from `.values()` rows with the read
+    # serializer compiled by `gricapi.readers`, when it can be.
+    fast_read = False
+
+    def get_lookup_filter(self):
+        """
+        Return the filter selecting the object of a detail route. Values
+        that are not all digits are looked up with `slug_lookup_field`
+        when the view sets one.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        value = self.kwargs[lookup_url_kwarg]
+        if self.slug_lookup_field is not None and not value.isdigit():
+            return {self.slug_lookup_field: value}
+        return {self.lookup_field: value}
+
+    def get_object(self):
+        """
+        Returns the object the view is displaying.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        obj = generics.get_object_or_404(
+            queryset, **self.get_lookup_filter())
+
+        # May raise a permission denied
+        self.check_object_permissions(self.request, obj)
+
+        return obj
 
     def get_serializer_class(self):
         """
@@ -40,6 +73,25 @@ class GenericAPIView(generics.GenericAPIView):
         kwargs['context'] = self.get_serializer_context()
         return serializer_class(*args, **kwargs)
 
+    def serialize(self, get_data):
+        """
+        Return `get_data()`, the data of a read serializer or row reader,
+        timed as the serialization of the request, see gricapi.metrics.
+        """
+        with serialize_timer(self.request):
+            return get_data()
+
+    def get_row_reader(self):
+        """
+        Return the `RowReader` compiled from the read serializer, or None
+        when the view does not read fast or the serializer cannot be
+        compiled.
+        """
+        if not self.fast_read:
+            return None
+        return get_reader(self.get_read_serializer_class(),
+                          self.get_queryset().model)
+
     def get_read_serializer_class(self):
         """
         Return the class to use for the serializer.
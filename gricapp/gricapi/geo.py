@@ -0,0 +1,250 @@
+"""
+Geocoding of profile addresses and "near me" queries on produce.
+
+Addresses are geocoded offline against `GAZETTEER`, a list of towns of
+the regions the marketplace serves: the first town named in an address
+gives its coordinates. Profiles store them with their geohash.
+
+On PostgreSQL the nearest produce are read in distance order from a GiST
+index on `ll_to_earth(latitude, longitude)` (the cube and earthdistance
+extensions). On SQLite the search reads the geohash cells around the
+point from the `profile_geohash_idx` index, nearest first with the
+`gricapi_distance` SQL function and no more than the rows asked for,
+widening the cells until the nearest rows are known for sure. It stops
+at the cells covering the `radius`, or at the widest cells, a quarter
+of the globe, and never scans the whole table.
+"""
+import math
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+
+EARTH_RADIUS = 6371.0088  # km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# the cells searched first around a point, about 20 x 20 km
+NEAREST_START_PRECISION = 4
+
+GAZETTEER = (
+    # Nigeria
+    ('lagos', 6.5244, 3.3792),
+    ('ikeja', 6.6018, 3.3515),
+    ('ibadan', 7.3775, 3.9470),
+    ('abuja', 9.0765, 7.3986),
+    ('kano', 12.0022, 8.5920),
+    ('kaduna', 10.5105, 7.4165),
+    ('zaria', 11.0855, 7.7199),
+    ('port harcourt', 4.8156, 7.0498),
+    ('benin city', 6.3350, 5.6037),
+    ('enugu', 6.4584, 7.5464),
+    ('jos', 9.8965, 8.8583),
+    ('ilorin', 8.4966, 4.5421),
+    ('abeokuta', 7.1475, 3.3619),
+    ('onitsha', 6.1413, 6.8029),
+    ('owerri', 5.4840, 7.0351),
+    ('maiduguri', 11.8311, 13.1510),
+    ('sokoto', 13.0059, 5.2476),
+    ('makurdi', 7.7322, 8.5391),
+    ('akure', 7.2571, 5.2058),
+    ('calabar', 4.9757, 8.3417),
+    ('uyo', 5.0377, 7.9128),
+    ('yola', 9.2035, 12.4954),
+    ('minna', 9.5836, 6.5463),
+    ('lokoja', 7.8023, 6.7333),
+    # Ghana
+    ('accra', 5.6037, -0.1870),
+    ('kumasi', 6.6885, -1.6244),
+    ('tamale', 9.4008, -0.8393),
+    # Kenya
+    ('nairobi', -1.2921, 36.8219),
+    ('mombasa', -4.0435, 39.6682),
+    ('kisumu', -0.0917, 34.7680),
+    ('nakuru', -0.3031, 36.0800),
+    ('eldoret', 0.5143, 35.2698),
+    # Uganda
+    ('kampala', 0.3476, 32.5825),
+    ('gulu', 2.7724, 32.2881),
+    # Tanzania
+    ('dar es salaam', -6.7924, 39.2083),
+    ('arusha', -3.3869, 36.6830),
+    ('dodoma', -6.1630, 35.7516),
+    # Rwanda, Ethiopia
+    ('kigali', -1.9441, 30.0619),
+    ('addis ababa', 9.0300, 38.7400),
+    # Southern Africa
+    ('johannesburg', -26.2041, 28.0473),
+    ('pretoria', -25.7479, 28.2293),
+    ('cape town', -33.9249, 18.4241),
+    ('durban', -29.8587, 31.0218),
+    ('lusaka', -15.3875, 28.3228),
+    ('harare', -17.8252, 31.0335),
+    ('lilongwe', -13.9626, 33.7741),
+    # North, West and Central Africa
+    ('cairo', 30.0444, 31.2357),
+    ('casablanca', 33.5731, -7.5898),
+    ('dakar', 14.7167, -17.4677),
+    ('abidjan', 5.3600, -4.0083),
+    ('douala', 4.0511, 9.7679),
+    ('yaounde', 3.8480, 11.5021),
+)
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+
+
+def geocode(address):
+    """
+    Return the `(latitude, longitude)` of the first town of the
+    gazetteer named in `address`, or None when it names none.
+    """
+    if not address:
+        return None
+    words = ' %s ' % ' '.join(WORD_RE.findall(address.lower()))
+    found = None
+    for name, latitude, longitude in GAZETTEER:
+        position = words.find(' %s ' % name)
+        if position != -1 and (found is None or position < found[0]):
+            found = (position, latitude, longitude)
+    return found[1:] if found else None
+
+
+def _cell_size(precision):
+    """
+    Return the `(height, width)` in degrees of the geohash cells of
+    `precision` characters.
+    """
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    latitudes, longitudes = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, value, bit, even = [], 0, 0, True
+    while len(geohash) < precision:
+        interval, coordinate = ((longitudes, longitude) if even
+                                else (latitudes, latitude))
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            geohash.append(GEOHASH_ALPHABET[value])
+            value, bit = 0, 0
+    return ''.join(geohash)
+
+
+def geohash_block(latitude, longitude, precision):
+    """
+    Return the geohash cells of `precision` characters around the point,
+    its own cell in the middle of a 3 x 3 block.
+    """
+    height, width = _cell_size(precision)
+    cells = set()
+    for row in (-1, 0, 1):
+        for column in (-1, 0, 1):
+            cell_latitude = max(-90.0, min(90.0, latitude + row * height))
+            cell_longitude = (longitude + column * width + 180) % 360 - 180
+            cells.add(encode_geohash(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
+
+
+def block_radius(latitude, precision):
+    """
+    Return the distance in km within which every point is inside the
+    geohash block of `precision` around a point at `latitude`.
+    """
+    height, width = _cell_size(precision)
+    widest = min(90.0, abs(latitude) + height)
+    return KM_PER_DEGREE * min(height,
+                               width * math.cos(math.radians(widest)))
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+    """
+    Return the great circle distance between two points in km.
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = (math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) *
+         math.sin(delta_lambda / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def register_sqlite_functions(sqlite_connection):
+    """
+    Make `distance` available to the SQL of a SQLite connection as
+    `gricapi_distance(latitude1, longitude1, latitude2, longitude2)`.
+    """
+    sqlite_connection.create_function('gricapi_distance', 4, distance)
+
+
+def _postgresql_knn(queryset, latitude, longitude, radius=None):
+    profile = 'gricapi_profile'
+    point = 'll_to_earth(%s.latitude, %s.longitude)' % (profile, profile)
+    where, params = [], []
+    if radius is not None:
+        where = ['earth_box(ll_to_earth(%%s, %%s), %%s) @> %s' % point,
+                 'earth_distance(ll_to_earth(%%s, %%s), %s) <= %%s' % point]
+        params = [latitude, longitude, radius * 1000] * 2
+    return queryset.filter(owner__profile__latitude__isnull=False).extra(
+        select={'distance_m': 'earth_distance(ll_to_earth(%%s, %%s), %s)'
+                              % point,
+                'knn': '%s <-> ll_to_earth(%%s, %%s)' % point},
+        select_params=[latitude, longitude, latitude, longitude],
+        where=where, params=params,
+        order_by=['knn'],
+    )
+
+
+def _nearest_postgresql(queryset, latitude, longitude, limit, radius):
+    rows = list(_postgresql_knn(queryset, latitude, longitude, radius)[:limit])
+    for row in rows:
+        row.distance = row.distance_m / 1000
+    return rows
+
+
+def _nearest_geohash(queryset, latitude, longitude, limit, radius):
+    queryset = queryset.filter(
+        owner__profile__latitude__isnull=False
+    ).annotate(distance=Func(
+        Value(latitude), Value(longitude), F('owner__profile__latitude'),
+        F('owner__profile__longitude'), function='gricapi_distance',
+        output_field=FloatField()))
+    if radius is not None:
+        queryset = queryset.filter(distance__lte=radius)
+    for precision in range(NEAREST_START_PRECISION, 0, -1):
+        covered = block_radius(latitude, precision)
+        if radius is not None and covered < radius and precision > 1:
+            continue
+        cells = Q()
+        for cell in geohash_block(latitude, longitude, precision):
+            # a range rather than LIKE, which SQLite cannot index
+            cells |= Q(owner__profile__geohash__gte=cell,
+                       owner__profile__geohash__lt=cell + '~')
+        rows = list(queryset.filter(cells).order_by('distance', 'pk')[:limit])
+        if radius is not None:
+            return rows
+        # rows beyond the block may be nearer than the last one found
+        if len(rows) >= limit and rows[-1].distance <= covered:
+            return rows
+    # the widest block, beyond which nothing is searched
+    return rows
+
+
+def nearest_produce(queryset, latitude, longitude, limit, radius=None):
+    """
+    Return up to `limit` produce of `queryset` whose owners live nearest
+    to the point, nearest first, each with its `distance` in km. With a
+    `radius` in km the farther ones are left out.
+    """
+    if connection.vendor == 'postgresql':
+        return _nearest_postgresql(
+            queryset, latitude, longitude, limit, radius)
+    return _nearest_geohash(queryset, latitude, longitude, limit, radius)
@@ -0,0 +1,67 @@
+"""
+Benchmark the API endpoints against the data in the database.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gricapi.benchmarks import SCENARIOS, Benchmark, compare
+
+
+class Command(BaseCommand):
+    help = ("Time list, retrieve, create and update requests on the "
+            "products, produce-category and shopping endpoints, and "
+            "report their latency percentiles, queries and allocations. "
+            "Seed the database first, e.g. with seed_marketplace.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Number of timed requests per scenario.')
+        parser.add_argument(
+            '--scenario', action='append', choices=list(SCENARIOS),
+            help='Run only this scenario, may be repeated.')
+        parser.add_argument(
+            '--save-baseline', metavar='PATH',
+            help='Write the results to this JSON file.')
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Fail when the results are worse than this JSON file.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Fraction a latency or allocation may exceed its '
+                 'baseline by.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('At least one iteration is needed.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        try:
+            results = Benchmark(
+                options['iterations'], options['scenario']).run()
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write('%-26s %9s %9s %9s %8s %10s' % (
+            'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'alloc KiB'))
+        for name, result in results.items():
+            self.stdout.write('%-26s %9.2f %9.2f %9.2f %8d %10.1f' % (
+                name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['queries'], result['alloc_kib']))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+            self.stdout.write('Saved the baseline to %s.'
+                              % options['save_baseline'])
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Slower than the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS(
+                'No regression against %s.' % options['baseline']))
@@ -0,0 +1,153 @@
+"""
+Compare WSGI workers and the ASGI handler serving slow clients.
+"""
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from gricapi.asgi import ASGIHandler, get_environ
+from gricapi.benchmarks import BENCHMARK_EMAIL, percentile
+from gricapi.models import User
+
+
+def get_scope(path, token):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http', 'method': 'GET', 'path': path, 'root_path': '',
+        'query_string': query.encode(), 'http_version': '1.1',
+        'scheme': 'http', 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'),
+                    (b'authorization', ('JWT %s' % token).encode())],
+    }
+
+
+def serve_wsgi(scope, clients, workers, latency, statuses):
+    """
+    Serve `clients` requests arriving together with `workers` threads,
+    each held by its client `latency` seconds to send the request and
+    again to read the response, as a synchronous worker is. Return the
+    time each client waited for its response.
+    """
+    handler = WSGIHandler()
+    start = time.perf_counter()
+
+    def start_response(status, headers, exc_info=None):
+        statuses.add(int(status.split(' ', 1)[0]))
+
+    def serve(_):
+        time.sleep(latency)
+        response = handler(get_environ(scope, io.BytesIO()), start_response)
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        time.sleep(latency)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(serve, range(clients)))
+
+
+def serve_asgi(scope, clients, threads, latency, statuses):
+    """
+    Serve the same clients with an `ASGIHandler` of `threads` threads,
+    the slow sending and reading awaited on the event loop.
+    """
+    handler = ASGIHandler(threads=threads)
+
+    def get_receive():
+        messages = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if not messages:
+                # the client stays until its response is sent
+                await asyncio.get_event_loop().create_future()
+            await asyncio.sleep(latency)
+            return messages.pop()
+        return receive
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.add(message['status'])
+        if (message['type'] == 'http.response.body' and
+                not message.get('more_body')):
+            await asyncio.sleep(latency)
+
+    async def serve(start):
+        await handler(dict(scope), get_receive(), send)
+        return time.perf_counter() - start
+
+    async def serve_all():
+        start = time.perf_counter()
+        return await asyncio.gather(*[serve(start) for _ in range(clients)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(serve_all())
+    finally:
+        loop.close()
+        handler.executor.shutdown()
+
+
+class Command(BaseCommand):
+    help = ("Serve concurrent slow clients a read-heavy endpoint with "
+            "synchronous WSGI workers, then with config.asgi using as "
+            "many threads, and compare their waits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=200,
+            help='Number of clients sending their request together.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of WSGI workers and of ASGI threads.')
+        parser.add_argument(
+            '--latency', type=float, default=0.2,
+            help='Seconds a client takes to send its request, and again '
+                 'to read the response.')
+        parser.add_argument(
+            '--path', default=None,
+            help='Path requested, the produce list by default.')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['workers'] < 1:
+            raise CommandError('At least one client and worker are needed.')
+        path = options['path'] or reverse('api:products-list')
+        # the threads serving the requests read the user committed
+        user, created = User.objects.get_or_create(email=BENCHMARK_EMAIL)
+        scope = get_scope(path, AccessToken.for_user(user))
+        hosts = list(settings.ALLOWED_HOSTS) + ['testserver']
+        try:
+            with override_settings(ALLOWED_HOSTS=hosts, DEBUG=False):
+                self.stdout.write('%d clients of %s, %.0f ms latency:' % (
+                    options['clients'], path, options['latency'] * 1000))
+                for name, serve in [('WSGI workers', serve_wsgi),
+                                    ('ASGI threads', serve_asgi)]:
+                    # both start from the same cold response cache
+                    cache.clear()
+                    statuses = set()
+                    waits = sorted(serve(
+                        scope, options['clients'], options['workers'],
+                        options['latency'], statuses))
+                    if statuses != {200}:
+                        raise CommandError('%s answered %s.' % (
+                            path, ', '.join(map(str, sorted(statuses)))))
+                    self.stdout.write(
+                        '  %d %-13s %8.2f s, %7.1f requests/s, p50 %7.1f '
+                        'ms, p95 %7.1f ms' % (
+                            options['workers'], name, waits[-1],
+                            len(waits) / waits[-1],
+                            percentile(waits, 0.50) * 1000,
+                            percentile(waits, 0.95) * 1000))
+        finally:
+            if created:
+                user.delete()
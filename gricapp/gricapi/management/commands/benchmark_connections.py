@@ -0,0 +1,68 @@
+"""
+Measure the time spent connecting to the database per request.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+POOLED_ENGINE = 'gricapi.backends.postgresql'
+
+
+def time_requests(settings_dict, count):
+    """
+    Return the mean time in seconds of `count` requests of one query on
+    a connection made from `settings_dict`, closed or kept between
+    requests as Django does.
+    """
+    backend = load_backend(settings_dict['ENGINE'])
+    connection = backend.DatabaseWrapper(settings_dict, 'benchmark')
+    start = time.perf_counter()
+    for _ in range(count):
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.close_if_unusable_or_obsolete()
+    duration = time.perf_counter() - start
+    connection.close()
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        pool.close_idle()
+    return duration / count
+
+
+class Command(BaseCommand):
+    help = ("Time requests running one query with a new connection each, "
+            "with a persistent connection (CONN_MAX_AGE) and, on "
+            "PostgreSQL, with the connection pool (DATABASE_POOL_SIZE).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of requests per setup.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        settings_dict = dict(connections[options['database']].settings_dict)
+        settings_dict.pop('POOL', None)
+        if settings_dict['ENGINE'] == POOLED_ENGINE:
+            settings_dict['ENGINE'] = 'django.db.backends.postgresql'
+        setups = [
+            ('new connection per request', dict(
+                settings_dict, CONN_MAX_AGE=0)),
+            ('persistent, CONN_MAX_AGE=600', dict(
+                settings_dict, CONN_MAX_AGE=600)),
+        ]
+        if connections[options['database']].vendor == 'postgresql':
+            setups.append(('pooled', dict(
+                settings_dict, CONN_MAX_AGE=0, ENGINE=POOLED_ENGINE,
+                POOL={'MAX_SIZE': 1})))
+
+        baseline = None
+        for name, setup in setups:
+            duration = time_requests(setup, options['requests'])
+            if baseline is None:
+                baseline = duration
+            self.stdout.write('%-30s %8.3f ms per request, %8.3f ms saved' % (
+                name, duration * 1000, (baseline - duration) * 1000))
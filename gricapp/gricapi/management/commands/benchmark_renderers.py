@@ -0,0 +1,88 @@
+"""
+Measure the cost of rendering API payloads to JSON.
+"""
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from gricapi import renderers
+from gricapi.models import User, Category, Produce
+from gricapi.renderers import FastJSONRenderer
+from gricapi.serializers import ProduceSerializer
+
+
+def produce_rows(count):
+    """
+    Return `count` produce as `ProduceSerializer` renders them, built
+    from unsaved instances so no database is needed.
+    """
+    now = timezone.now()
+    owner = User(email='farmer@example.com')
+    category = Category(category_name='Grains')
+    return ProduceSerializer([
+        Produce(id=index, slug='maize-%d-pro' % index, owner=owner,
+                produce_name='Maize %d' % index, produce_category=category,
+                stock=index % 90, measurement_unit='bags',
+                price_tag=Decimal('1250.50'),
+                product_description='Dry yellow maize, harvested in %d'
+                                    % (2000 + index % 20),
+                image_url='https://example.com/maize-%d.png' % index,
+                date_created=now - timedelta(minutes=index))
+        for index in range(count)
+    ], many=True).data
+
+
+def order_rows(count):
+    """
+    Return `count` orders of three items each as `.values()` rows, with
+    the `Decimal`, `UUID` and datetime values the encoders convert.
+    """
+    now = timezone.now()
+    return [{
+        'id': UUID(int=index),
+        'consumer': 'buyer@example.com',
+        'transaction_date': now - timedelta(minutes=index),
+        'paid': bool(index % 2),
+        'total_cost': Decimal('3751.50'),
+        'items': [{
+            'item_id': UUID(int=index * 3 + item),
+            'produce': 'Maize %d' % item,
+            'quantity_ordered': item + 1,
+            'price': Decimal('1250.50'),
+        } for item in range(3)],
+    } for index in range(count)]
+
+
+class Command(BaseCommand):
+    help = ("Time the JSON renderers on produce as the API lists them and "
+            "on orders holding Decimal, UUID and datetime values, in "
+            "milliseconds per 1,000 rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1000,
+            help='Number of rows rendered per run.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of runs, the fastest one is reported.')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        engine = 'orjson' if renderers.orjson is not None else 'json'
+        candidates = [
+            ('JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer (%s)' % engine, FastJSONRenderer()),
+        ]
+        for name, data in [('produce', produce_rows(rows)),
+                           ('orders', order_rows(rows))]:
+            self.stdout.write('%d %s:' % (rows, name))
+            for label, renderer in candidates:
+                best = min(timeit.repeat(
+                    lambda: renderer.render(data), number=1, repeat=repeat))
+                self.stdout.write('  %-28s %8.2f ms per 1,000 rows' % (
+                    label, best * 1000 * 1000 / rows))
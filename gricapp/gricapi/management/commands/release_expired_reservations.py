@@ -0,0 +1,40 @@
+"""
+Release the stock held by unpaid orders left pending for too long.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gricapi.models import Order
+
+
+class Command(BaseCommand):
+    help = ("Put back the stock reserved by unpaid orders not updated for "
+            "STOCK_RESERVATION_TIMEOUT minutes and mark them expired.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=settings.STOCK_RESERVATION_TIMEOUT,
+            help='Age after which a reservation expires.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of orders expired per transaction.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['minutes'])
+        expired = 0
+        while True:
+            batch = Order.objects.filter(
+                paid=False, order_status='pending',
+                update_transaction_date__lt=cutoff
+            ).order_by('pk')[:options['batch_size']]
+            count = Order.objects.filter(
+                pk__in=list(batch.values_list('pk', flat=True))
+            ).expire_reservations(cutoff)
+            expired += count
+            if not count:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            'Expired %d order(s).' % expired))
@@ -0,0 +1,49 @@
+"""
+Run the background tasks queued by gricapi.tasks.
+"""
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gricapi.tasks import work
+
+
+class Command(BaseCommand):
+    help = ("Run the queued background tasks in a pool of worker "
+            "processes, until stopped or, with --burst, until none is "
+            "due.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help='Number of tasks a worker claims at a time.')
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Seconds a worker waits when no task is due.')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Stop once no task is due.')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['batch_size'] < 1:
+            raise CommandError('At least one process and task are needed.')
+        arguments = (options['batch_size'], options['poll'],
+                     options['burst'])
+        if options['processes'] == 1:
+            results = [work(*arguments)]
+        else:
+            # the worker processes open their own connections
+            connections.close_all()
+            with multiprocessing.Pool(
+                    options['processes'], initializer=django.setup) as pool:
+                results = pool.starmap(
+                    work, [arguments] * options['processes'])
+        succeeded = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            'Ran %d task(s), %d failed.' % (succeeded + failed, failed)))
@@ -0,0 +1,53 @@
+"""
+Fill the database with a synthetic marketplace.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from gricapi.seeding import MarketplaceSeeder
+
+
+class Command(BaseCommand):
+    help = ("Generate users with their profile, categories, produce and "
+            "orders with their items. The same --seed on the same database "
+            "gives the same rows, whatever the --processes, and can only "
+            "be used once. 5.6M rows: --users=50000 --produce=2000000 "
+            "--orders=500000.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=15)
+        parser.add_argument('--produce', type=int, default=100000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument(
+            '--items-per-order', type=int, default=5,
+            help='Average number of items of an order.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows inserted per query.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of processes generating the rows.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['categories'] < 1:
+            raise CommandError('At least one user and category are needed.')
+        if options['orders'] and not options['produce']:
+            raise CommandError('Orders need produce.')
+        if options['items_per_order'] < 1:
+            raise CommandError('Orders have at least one item.')
+        if options['processes'] < 1:
+            raise CommandError('At least one process is needed.')
+        seeder = MarketplaceSeeder(
+            seed=options['seed'], batch_size=options['batch_size'],
+            processes=options['processes'],
+            log=lambda message: self.stdout.write('Inserted %s' % message))
+        if seeder.has_run():
+            raise CommandError(
+                'The database already holds the rows of --seed=%d.'
+                % options['seed'])
+        counts = seeder.run(
+            options['users'], options['categories'], options['produce'],
+            options['orders'], options['items_per_order'])
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded %d rows.' % sum(counts.values())))
@@ -0,0 +1,38 @@
+"""
+Backfill and verify the stored `Order.total_cost`.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from gricapi.models import Order
+
+
+class Command(BaseCommand):
+    help = ("Recompute Order.total_cost from the order items for the orders "
+            "where it is wrong. With --check only report them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only verify the totals, exit with an error if any is wrong.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of orders fixed per UPDATE.')
+
+    def handle(self, *args, **options):
+        wrong = list(
+            Order.objects.with_wrong_totals().values_list('pk', flat=True))
+        if options['check']:
+            if wrong:
+                raise CommandError(
+                    '%d order(s) have a wrong total_cost.' % len(wrong))
+            self.stdout.write(
+                self.style.SUCCESS('All order totals are right.'))
+            return
+
+        batch_size = options['batch_size']
+        fixed = 0
+        for start in range(0, len(wrong), batch_size):
+            fixed += Order.objects.filter(
+                pk__in=wrong[start:start + batch_size]).sync_totals()
+        self.stdout.write(self.style.SUCCESS(
+            'Fixed the total_cost of %d order(s).' % fixed))
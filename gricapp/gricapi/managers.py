@@ -1,6 +1,32 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import connections, models, transaction
+from django.db.models import (
+    F, OuterRef, Prefetch, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from .slugs import get_slug_base, unique_slugs
+
+# `OrderItem.status` of the items holding stock, and of those which gave
+# it back. Items saved one by one, e.g. from the admin, stay "pending"
+# and hold no stock.
+RESERVED = 'reserved'
+RELEASED = 'released'
+# `Order.order_status` of unpaid orders whose reservations timed out
+EXPIRED = 'expired'
+# `Task.status` of the tasks waiting for a worker, of those leased by a
+# worker until their `run_at`, and of those out of attempts
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -33,3 +59,335 @@ class CustomUserManager(BaseUserManager):
         if extra_fields.get('is_superuser') is not True:
             raise ValueError(_('Superuser must have is_superuser=True.'))
         return self.create_user(email, password, **extra_fields)
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a produce has less stock than an order asks for.
+    """
+
+    def __init__(self, produce_id):
+        super().__init__(produce_id)
+        self.produce_id = produce_id
+
+
+# Sent once a transaction updating produce in bulk, bypassing their
+# post_save signal, commits, with the primary keys of the produce as `pks`.
+bulk_updated = Signal(providing_args=['pks'])
+
+
+class ProduceQuerySet(models.QuerySet):
+    """
+    Queryset for produce moving stock with conditional UPDATEs, so
+    concurrent orders never oversell nor lose an update.
+
+    `quantities` map produce primary keys to quantities. Rows are updated
+    in primary key order so concurrent transactions do not deadlock.
+    """
+
+    def reserve(self, quantities):
+        """
+        Take `quantities` out of stock with one `UPDATE ... WHERE stock >=
+        quantity` per produce, all or nothing: raises `InsufficientStock`
+        for the first produce short of stock and rolls the others back.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            for pk, quantity in sorted(quantities.items()):
+                updated = self.filter(pk=pk, stock__gte=quantity).update(
+                    stock=F('stock') - quantity, date_modified=now)
+                if not updated:
+                    raise InsufficientStock(pk)
+        self._send_bulk_updated(list(quantities))
+
+    def release(self, quantities):
+        """
+        Put `quantities` back in stock with one UPDATE per produce.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            for pk, quantity in sorted(quantities.items()):
+                self.filter(pk=pk).update(
+                    stock=F('stock') + quantity, date_modified=now)
+        self._send_bulk_updated(list(quantities))
+
+    def reassign_category(self, source, target, chunk_size=None):
+        """
+        Move the produce of the `source` category to `target` with a
+        single UPDATE, or with UPDATEs of `chunk_size` rows each committed
+        on its own so a large category never holds its rows locked for
+        long. Returns the number of produce moved.
+        """
+        rows = self.filter(produce_category=source)
+        moved = 0
+        while True:
+            with transaction.atomic():
+                pks = rows.order_by('pk').values_list('pk', flat=True)
+                pks = list(pks if chunk_size is None else pks[:chunk_size])
+                if not pks:
+                    return moved
+                moved += self.filter(pk__in=pks).update(
+                    produce_category=target, date_modified=timezone.now())
+                self._send_bulk_updated(pks)
+            if chunk_size is None:
+                return moved
+
+    def bulk_import(self, rows, batch_size):
+        """
+        Insert the unsaved produce `rows` with one INSERT per batch of
+        `batch_size`, giving each a unique slug first with one query per
+        batch, as `Produce.save()` would one by one.
+        """
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            slugs = unique_slugs(self.model, [
+                get_slug_base(row, row.produce_name, 'pro') for row in batch])
+            for row, slug in zip(batch, slugs):
+                row.slug = slug
+            self.bulk_create(batch)
+        # new rows change the lists only, which `pks` cannot name
+        transaction.on_commit(
+            lambda: bulk_updated.send(sender=self.model, pks=[]))
+        return rows
+
+    def _send_bulk_updated(self, pks):
+        if pks:
+            transaction.on_commit(
+                lambda: bulk_updated.send(sender=self.model, pks=pks))
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Queryset for orders with helpers for the read endpoints.
+    """
+
+    def with_totals(self):
+        """
+        Annotate each order with the sum of its items' price as
+        `items_total`, computed by the database in the same query.
+        Used to verify the stored `total_cost`.
+        """
+        return self.annotate(items_total=Coalesce(
+            Sum('items__price'), Value(0),
+            output_field=models.DecimalField(max_digits=12,
+                                             decimal_places=2)))
+
+    def with_wrong_totals(self):
+        """
+        Return the orders whose stored `total_cost` disagrees with the
+        sum of their items.
+        """
+        return self.with_totals().exclude(total_cost=F('items_total'))
+
+    def sync_totals(self):
+        """
+        Recompute `total_cost` from the items of every order in the
+        queryset with a single UPDATE, returning the number of orders.
+        Like every write of an order, it moves `update_transaction_date`,
+        which its ETag and Last-Modified are built from.
+        """
+        item_model = self.model._meta.get_field('items').related_model
+        totals = item_model.objects.filter(order=OuterRef('pk')).values(
+            'order').annotate(total=Sum('price')).values('total')
+        return self.update(total_cost=Coalesce(
+            Subquery(totals), Value(0),
+            output_field=models.DecimalField(max_digits=12,
+                                             decimal_places=2)),
+            update_transaction_date=timezone.now())
+
+    def release_reservations(self):
+        """
+        Put the stock reserved by the unpaid orders of the queryset back
+        and mark their items released, returning the number of items.
+
+        The orders and their reserved items are locked first, so a
+        concurrent release of the same order waits for this one and then
+        finds nothing left to put back.
+        """
+        item_model = self.model._meta.get_field('items').related_model
+        with transaction.atomic():
+            orders = list(self.select_for_update().filter(
+                paid=False).order_by('pk').values_list('pk', flat=True))
+            items = list(item_model.objects.select_for_update().filter(
+                order__in=orders, status=RESERVED
+            ).order_by('pk').values_list(
+                'pk', 'order', 'produce', 'quantity_ordered'))
+            quantities = Counter()
+            for _pk, _order, produce, quantity in items:
+                quantities[produce] += quantity
+            item_model._meta.get_field(
+                'produce').related_model.objects.release(quantities)
+            self.model.objects.filter(
+                pk__in={order for _, order, _, _ in items}
+            ).update(update_transaction_date=timezone.now())
+            return item_model.objects.filter(
+                pk__in=[pk for pk, _, _, _ in items]).update(status=RELEASED)
+
+    def expire_reservations(self, cutoff):
+        """
+        Release the reservations of the unpaid, pending orders of the
+        queryset not updated since `cutoff` and mark them expired,
+        returning the number of orders.
+        """
+        with transaction.atomic():
+            pks = list(self.select_for_update().filter(
+                paid=False, order_status='pending',
+                update_transaction_date__lt=cutoff
+            ).values_list('pk', flat=True))
+            expired = self.model.objects.filter(pk__in=pks)
+            expired.release_reservations()
+            return expired.update(order_status=EXPIRED,
+                                  update_transaction_date=timezone.now())
+
+    def with_items(self):
+        """
+        Fetch the consumer in the same query and all items, along with
+        their produce, in a single extra query, items in the order they
+        were added.
+        """
+        item_model = self.model._meta.get_field('items').related_model
+        return self.select_related('consumer').prefetch_related(
+            Prefetch('items', queryset=item_model.objects.select_related(
+                'produce').order_by('pk'))
+        )
+
+
+class OrderItemQuerySet(models.QuerySet):
+    """
+    Queryset for order items writing an order's lines in bulk.
+
+    `items` are dicts of `OrderItem` field values, as validated by the
+    `ItemSerializer`, whose `produce` is already a `Produce` instance so
+    prices are computed in memory. The order's stored total is adjusted
+    by the difference written.
+    """
+
+    def _get_produce_model(self):
+        return self.model._meta.get_field('produce').related_model
+
+    def bulk_add(self, order, items):
+        """
+        Reserve the stock of all `items` and insert them for `order` with
+        a single query.
+        """
+        rows = [self.model(order=order, status=RESERVED, **item)
+                for item in items]
+        quantities = Counter()
+        for row in rows:
+            row.price = row.get_price()
+            quantities[row.produce_id] += row.quantity_ordered
+        self._get_produce_model().objects.reserve(quantities)
+        rows = self.bulk_create(rows)
+        order.add_to_total(sum(row.price for row in rows))
+        return rows
+
+    def bulk_replace(self, order, items):
+        """
+        Make `items` the lines of `order`, only writing the difference:
+        lines matched by produce are updated when their quantity or
+        price changed, unmatched lines are deleted and new ones inserted.
+        Only the difference in quantity of each produce is reserved or
+        released.
+        """
+        existing = {}
+        reserved = Counter()
+        # the order is locked by the caller, see OrderCreateSerializer
+        for row in self.select_for_update().filter(
+                order=order).order_by('pk'):
+            existing.setdefault(row.produce_id, []).append(row)
+            if row.status == RESERVED:
+                reserved[row.produce_id] += row.quantity_ordered
+
+        created, changed = [], []
+        wanted = Counter()
+        amount = 0
+        for item in items:
+            row = self.model(order=order, status=RESERVED, **item)
+            row.price = row.get_price()
+            wanted[row.produce_id] += row.quantity_ordered
+            matches = existing.get(row.produce_id)
+            if not matches:
+                created.append(row)
+                amount += row.price
+                continue
+            current = matches.pop(0)
+            if (current.quantity_ordered, current.price, current.status) != (
+                    row.quantity_ordered, row.price, row.status):
+                amount += row.price - current.price
+                current.quantity_ordered = row.quantity_ordered
+                current.price = row.price
+                current.status = row.status
+                changed.append(current)
+
+        produce_objects = self._get_produce_model().objects
+        produce_objects.release(reserved - wanted)
+        produce_objects.reserve(wanted - reserved)
+
+        removed = [row.pk for rows in existing.values() for row in rows]
+        amount -= sum(row.price for rows in existing.values() for row in rows)
+        if removed:
+            self.filter(pk__in=removed).delete()
+        if changed:
+            self.bulk_update(changed, ['quantity_ordered', 'price', 'status'])
+        if created:
+            self.bulk_create(created)
+        order.add_to_total(amount)
+        return created, changed, removed
+
+
+class TaskQuerySet(models.QuerySet):
+    """
+    Queryset for the background tasks queued by `gricapi.tasks`.
+    """
+
+    def abandoned(self, now=None):
+        """
+        Return the running tasks whose lease expired by `now`, their
+        worker having died, which are out of attempts.
+        """
+        return self.filter(
+            status=RUNNING, run_at__lte=now or timezone.now(),
+            attempts__gte=settings.TASKS_MAX_ATTEMPTS)
+
+    def due(self, now=None):
+        """
+        Return the queued tasks due by `now`, and the running ones whose
+        lease expired, their worker having died, with attempts left,
+        oldest first.
+        """
+        return self.filter(
+            Q(status=QUEUED) | Q(
+                status=RUNNING,
+                attempts__lt=settings.TASKS_MAX_ATTEMPTS),
+            run_at__lte=now or timezone.now()
+        ).order_by('run_at', 'pk')
+
+    def claim(self, limit, lease):
+        """
+        Lease up to `limit` due tasks for `lease` seconds to this worker
+        and return them. Workers claiming together never get the same
+        task: rows locked by another worker are skipped where the
+        database supports it, otherwise each task is only claimed if it
+        was not changed since it was read. The abandoned tasks out of
+        attempts are marked failed instead of being run again.
+        """
+        now = timezone.now()
+        self.abandoned(now).update(
+            status=FAILED,
+            last_error='The worker died running the last attempt.')
+        changes = {'status': RUNNING, 'attempts': F('attempts') + 1,
+                   'run_at': now + timedelta(seconds=lease)}
+        if connections[self.db].features.has_select_for_update_skip_locked:
+            with transaction.atomic(using=self.db):
+                pks = list(self.due(now).select_for_update(
+                    skip_locked=True).values_list('pk', flat=True)[:limit])
+                self.model.objects.filter(pk__in=pks).update(**changes)
+        else:
+            pks = [
+                pk for pk, status, run_at in self.due(now).values_list(
+                    'pk', 'status', 'run_at')[:limit]
+                if self.model.objects.filter(
+                    pk=pk, status=status, run_at=run_at).update(**changes)
+            ]
+        return list(self.model.objects.filter(pk__in=pks).order_by(
+            'run_at', 'pk'))
@@ -0,0 +1,282 @@
+"""
+Request instrumentation.
+
+`RequestMetricsMiddleware` times every request, the SQL it runs, the
+serialization of its data, timed by the views with `serialize_timer`,
+and the rendering of its body, and sends them back in a `Server-Timing`
+header.
+For the routes of the gricapi router the figures are also recorded in
+process-level histograms labelled with the route's `basename` and
+action, which `render_metrics()` writes in the Prometheus text format.
+
+A request running the same SQL, parameters aside, more than
+`API_N_PLUS_ONE_THRESHOLD` times is logged as a likely N+1 query.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import get_cache_stats
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+PLACEHOLDERS_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class Histogram:
+    """
+    Counts observations per label values in cumulative `buckets`.
+    """
+
+    def __init__(self, name, documentation, buckets, labels):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            counts = self._values.setdefault(
+                label_values, [[0] * len(self.buckets), 0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def collect(self):
+        yield '# HELP %s %s' % (self.name, self.documentation)
+        yield '# TYPE %s histogram' % self.name
+        with self._lock:
+            values = sorted(
+                (key, (list(buckets), total, count))
+                for key, (buckets, total, count) in self._values.items())
+        for label_values, (buckets, total, count) in values:
+            labels = _format_labels(zip(self.labels, label_values))
+            for bound, bucket in zip(self.buckets, buckets):
+                yield '%s_bucket{%s,le="%s"} %d' % (
+                    self.name, labels, bound, bucket)
+            yield '%s_bucket{%s,le="+Inf"} %d' % (self.name, labels, count)
+            yield '%s_sum{%s} %s' % (self.name, labels, repr(total))
+            yield '%s_count{%s} %d' % (self.name, labels, count)
+
+
+class Counters:
+    """
+    Counts events per label values.
+    """
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values):
+        with self._lock:
+            self._values[label_values] += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def collect(self):
+        yield '# HELP %s %s' % (self.name, self.documentation)
+        yield '# TYPE %s counter' % self.name
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, count in values:
+            yield '%s{%s} %d' % (
+                self.name, _format_labels(zip(self.labels, label_values)),
+                count)
+
+
+def _format_labels(pairs):
+    return ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"')) for name, value in pairs)
+
+
+LABELS = ('basename', 'action')
+request_duration = Histogram(
+    'gricapi_request_duration_seconds', 'Time spent answering a request.',
+    DURATION_BUCKETS, LABELS)
+db_duration = Histogram(
+    'gricapi_db_duration_seconds', 'Time spent in SQL queries per request.',
+    DURATION_BUCKETS, LABELS)
+serialize_duration = Histogram(
+    'gricapi_serialize_duration_seconds',
+    'Time spent serializing the response data.', DURATION_BUCKETS, LABELS)
+render_duration = Histogram(
+    'gricapi_render_duration_seconds',
+    'Time spent rendering the response body.', DURATION_BUCKETS, LABELS)
+request_queries = Histogram(
+    'gricapi_request_queries', 'SQL queries run per request.',
+    QUERY_BUCKETS, LABELS)
+repeated_queries = Counters(
+    'gricapi_repeated_queries_total',
+    'Requests running the same SQL more than API_N_PLUS_ONE_THRESHOLD '
+    'times.', LABELS)
+METRICS = (request_duration, db_duration, serialize_duration,
+           render_duration, request_queries, repeated_queries)
+
+
+def get_sql_shape(sql):
+    """
+    Return `sql` with its parameters and numbers masked, so queries which
+    only differ by their values have the same shape.
+    """
+    return NUMBER_RE.sub('N', PLACEHOLDERS_RE.sub('%s', sql))
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting the queries of a request, their
+    time and their shapes.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[get_sql_shape(sql)] += 1
+
+
+@contextmanager
+def serialize_timer(request):
+    """
+    Add the time spent in the block to the serialization time of
+    `request`, a Django or REST framework request.
+    """
+    request = getattr(request, '_request', request)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # only requests going through the middleware are timed
+        if hasattr(request, 'serialize_duration'):
+            request.serialize_duration += time.perf_counter() - start
+
+
+def get_route_labels(request):
+    """
+    Return the `(basename, action)` of the router route `request` was
+    resolved to, or None for the other views.
+    """
+    match = getattr(request, 'resolver_match', None)
+    view = getattr(match, 'func', None)
+    basename = getattr(view, 'initkwargs', {}).get('basename')
+    if basename is None:
+        return None
+    actions = getattr(view, 'actions', None) or {}
+    return basename, actions.get(request.method.lower(), '')
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the metrics of every request and adds the `Server-Timing`
+    header, see the module docstring.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.serialize_duration = 0.0
+        request.render_timing = [None, None]
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        render_start, render_end = request.render_timing
+        render = (render_end - render_start
+                  if render_end is not None else 0.0)
+        timings = OrderedDict([
+            ('db', recorder.duration),
+            ('serialize', request.serialize_duration),
+            ('render', render),
+            ('total', duration),
+        ])
+        response['Server-Timing'] = ', '.join(
+            '%s;dur=%.1f' % (name, value * 1000)
+            for name, value in timings.items())
+
+        labels = get_route_labels(request)
+        if labels is not None:
+            self.record(request, labels, recorder, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of the body, which follows this hook.
+        """
+        timing = request.render_timing
+        timing[0] = time.perf_counter()
+
+        def rendered(response):
+            timing[1] = time.perf_counter()
+        response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, labels, recorder, timings):
+        request_duration.observe(labels, timings['total'])
+        db_duration.observe(labels, timings['db'])
+        serialize_duration.observe(labels, timings['serialize'])
+        render_duration.observe(labels, timings['render'])
+        request_queries.observe(labels, recorder.count)
+
+        threshold = settings.API_N_PLUS_ONE_THRESHOLD
+        shape, count = (recorder.shapes.most_common(1) or [(None, 0)])[0]
+        if count > threshold:
+            repeated_queries.inc(labels)
+            logger.warning(
+                'Possible N+1 queries: %s %s ran the same query %d times: '
+                '%s', request.method, request.path, count, shape)
+
+
+def render_metrics():
+    """
+    Return every metric of this process in the Prometheus text format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.collect())
+    lines.append('# HELP gricapi_cache_requests_total Response cache '
+                 'lookups.')
+    lines.append('# TYPE gricapi_cache_requests_total counter')
+    for namespace, stats in sorted(get_cache_stats().items()):
+        for result, key in [('hit', 'hits'), ('miss', 'misses')]:
+            lines.append(
+                'gricapi_cache_requests_total{namespace="%s",result="%s"} %d'
+                % (namespace, result, stats[key]))
+    return '\n'.join(lines) + '\n'
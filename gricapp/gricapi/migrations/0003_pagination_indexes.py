@@ -0,0 +1,21 @@
+# Generated by Django 2.2 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0002_auto_20201017_1358'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-transaction_date', '-uuidmodel_ptr'], name='order_transaction_pkid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['-date_created', '-id'], name='produce_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2 on 2026-10-18 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0003_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', '-transaction_date'], name='order_consumer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'status'], name='orderitem_order_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['produce_category', 'price_tag'], name='produce_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['owner', '-date_created'], name='produce_owner_created_idx'),
+        ),
+    ]
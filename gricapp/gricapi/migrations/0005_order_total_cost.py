@@ -0,0 +1,35 @@
+# Generated by Django 2.2 on 2026-10-18 01:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_cost(apps, schema_editor):
+    Order = apps.get_model('gricapi', 'Order')
+    OrderItem = apps.get_model('gricapi', 'OrderItem')
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).values(
+        'order').annotate(total=Sum('price')).values('total')
+    Order.objects.update(total_cost=Coalesce(
+        Subquery(totals), Value(0),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0004_marketplace_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total_cost', 'uuidmodel_ptr'], name='order_total_cost_idx'),
+        ),
+        migrations.RunPython(backfill_total_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2 on 2026-10-18 01:19
+
+from django.db import migrations, models
+from django.template.defaultfilters import slugify
+
+
+def backfill_slugs(model, name_field, marker):
+    """
+    Give every row a distinct slug containing `marker`. Rows saved before
+    slugs were generated ahead of the insert have an empty one, and the
+    old time based slugs could repeat.
+    """
+    rows = list(model.objects.order_by('pk').values_list(
+        'pk', 'slug', name_field))
+    taken = set()
+    pending = []
+    for pk, slug, name in rows:
+        if slug and marker in slug and slug not in taken:
+            taken.add(slug)
+        else:
+            pending.append((pk, name))
+
+    changed = []
+    for pk, name in pending:
+        base = slugify('%s-%s' % (name, marker))[:189]
+        slug, suffix = base, 1
+        while slug in taken:
+            suffix += 1
+            slug = '%s-%d' % (base, suffix)
+        taken.add(slug)
+        changed.append(model(pk=pk, slug=slug))
+    model.objects.bulk_update(changed, ['slug'], batch_size=500)
+
+
+def backfill_produce_and_category_slugs(apps, schema_editor):
+    backfill_slugs(apps.get_model('gricapi', 'Produce'), 'produce_name', 'pro')
+    backfill_slugs(
+        apps.get_model('gricapi', 'Category'), 'category_name', 'cat')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0005_order_total_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_produce_and_category_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='produce',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True),
+        ),
+    ]
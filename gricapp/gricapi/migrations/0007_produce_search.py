@@ -0,0 +1,114 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'ALTER TABLE gricapi_produce ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION gricapi_produce_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english',
+                                  coalesce(NEW.produce_name, '')), 'A') ||
+            setweight(to_tsvector('english',
+                                  coalesce(NEW.product_description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER gricapi_produce_search_vector_update
+    BEFORE INSERT OR UPDATE OF produce_name, product_description
+    ON gricapi_produce
+    FOR EACH ROW EXECUTE PROCEDURE gricapi_produce_search_vector()
+    """,
+    # fire the trigger once for the existing rows
+    'UPDATE gricapi_produce SET produce_name = produce_name',
+    'CREATE INDEX produce_search_vector_idx ON gricapi_produce '
+    'USING gin (search_vector)',
+    'CREATE INDEX produce_name_trgm_idx ON gricapi_produce '
+    'USING gin (produce_name gin_trgm_ops)',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX produce_name_trgm_idx',
+    'DROP INDEX produce_search_vector_idx',
+    'DROP TRIGGER gricapi_produce_search_vector_update ON gricapi_produce',
+    'DROP FUNCTION gricapi_produce_search_vector()',
+    'ALTER TABLE gricapi_produce DROP COLUMN search_vector',
+]
+
+# SQLite drops these triggers whenever a later migration rebuilds
+# gricapi_produce to alter a column, such a migration must recreate them.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE gricapi_produce_fts USING fts5(
+        produce_name, product_description,
+        content='gricapi_produce', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3')
+    """,
+    """
+    CREATE TRIGGER gricapi_produce_fts_insert AFTER INSERT ON gricapi_produce
+    BEGIN
+        INSERT INTO gricapi_produce_fts(
+            rowid, produce_name, product_description)
+        VALUES (new.id, new.produce_name, new.product_description);
+    END
+    """,
+    """
+    CREATE TRIGGER gricapi_produce_fts_delete AFTER DELETE ON gricapi_produce
+    BEGIN
+        INSERT INTO gricapi_produce_fts(
+            gricapi_produce_fts, rowid, produce_name, product_description)
+        VALUES ('delete', old.id, old.produce_name, old.product_description);
+    END
+    """,
+    """
+    CREATE TRIGGER gricapi_produce_fts_update
+    AFTER UPDATE OF produce_name, product_description ON gricapi_produce
+    WHEN old.produce_name IS NOT new.produce_name
+        OR old.product_description IS NOT new.product_description
+    BEGIN
+        INSERT INTO gricapi_produce_fts(
+            gricapi_produce_fts, rowid, produce_name, product_description)
+        VALUES ('delete', old.id, old.produce_name, old.product_description);
+        INSERT INTO gricapi_produce_fts(
+            rowid, produce_name, product_description)
+        VALUES (new.id, new.produce_name, new.product_description);
+    END
+    """,
+    "INSERT INTO gricapi_produce_fts(gricapi_produce_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER gricapi_produce_fts_update',
+    'DROP TRIGGER gricapi_produce_fts_delete',
+    'DROP TRIGGER gricapi_produce_fts_insert',
+    'DROP TABLE gricapi_produce_fts',
+]
+
+
+def run_statements(statements):
+    """
+    Return a RunPython operation executing the statements of the
+    database in use, if there are any for it.
+    """
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0006_produce_unique_slug'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD,
+                            'sqlite': SQLITE_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD,
+                            'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
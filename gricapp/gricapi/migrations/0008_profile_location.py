@@ -0,0 +1,71 @@
+# Generated by Django 2.2 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+from gricapi.geo import encode_geohash, geocode
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS cube',
+    'CREATE EXTENSION IF NOT EXISTS earthdistance',
+    'CREATE INDEX profile_earth_idx ON gricapi_profile '
+    'USING gist (ll_to_earth(latitude, longitude))',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX profile_earth_idx',
+]
+
+
+def geocode_profiles(apps, schema_editor):
+    Profile = apps.get_model('gricapi', 'Profile')
+    located = []
+    for profile in Profile.objects.exclude(address=None).exclude(address=''):
+        location = geocode(profile.address)
+        if location is not None:
+            profile.latitude, profile.longitude = location
+            profile.geohash = encode_geohash(*location)
+            located.append(profile)
+    Profile.objects.bulk_update(
+        located, ['latitude', 'longitude', 'geohash'], batch_size=500)
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gricapi', '0007_produce_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['geohash'], name='profile_geohash_idx'),
+        ),
+        migrations.RunPython(
+            run_statements(POSTGRESQL_FORWARD),
+            run_statements(POSTGRESQL_BACKWARD),
+        ),
+        migrations.RunPython(geocode_profiles, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework import mixins, status
+from rest_framework import mixins, serializers, status
+
+from .exports import csv_lines, iterate_chunks, ndjson_lines
+from .pagination import KeysetPagination
 
 
 class UpdateModelMixin(mixins.UpdateModelMixin):
@@ -23,7 +36,7 @@ class UpdateModelMixin(mixins.UpdateModelMixin):
         # pylint: enable=protected-access
         read_serializer = self.get_read_serializer(instance)
 
-        return Response(read_serializer.data)
+        return Response(self.serialize(lambda: read_serializer.data))
 
 
 class CreateModelMixin(mixins.CreateModelMixin):
@@ -34,29 +47,276 @@ class CreateModelMixin(mixins.CreateModelMixin):
         self.perform_create(write_serializer)
 
         read_serializer = self.get_read_serializer(write_serializer.instance)
-        headers = self.get_success_headers(read_serializer.data)
+        data = self.serialize(lambda: read_serializer.data)
+        headers = self.get_success_headers(data)
 
-        return Response(read_serializer.data,
+        return Response(data,
                         status=status.HTTP_201_CREATED, headers=headers)
 
 
-class ListModelMixin(mixins.ListModelMixin):
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def _get_not_modified_response(request, etag, last_modified):
+    """
+    Return a 304 (or 412) response when the request's preconditions are
+    met by the validators, `None` when the body has to be sent.
+    """
+    timestamp = None
+    if last_modified is not None:
+        timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        _set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalMixin:
+    """
+    Compute strong `ETag` and `Last-Modified` validators from the view's
+    `last_modified_field`, a column updated on every change of a row,
+    reading only that column rather than serializing the rows. The
+    `related_modified_fields` are the modification columns of related
+    rows embedded in the body, such as the produce named by the items of
+    an order; the latest of them counts as a change of the row.
+
+    Changes to related rows without such a column, such as the name of a
+    produce's category, are not reflected in the validators.
+    """
+    last_modified_field = None
+    related_modified_fields = ()
+
+    def make_etag(self, *parts):
+        parts = (self.get_read_serializer_class().__name__,
+                 settings.API_CACHE_VERSION) + parts
+        digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+        return quote_etag(digest)
+
+    def get_validator_queryset(self, queryset, *fields):
+        queryset = queryset.select_related(None).prefetch_related(None).only(
+            self.last_modified_field, *fields)
+        return queryset.annotate(**{
+            'related_modified_%d' % index: Max(field)
+            for index, field in enumerate(self.related_modified_fields)})
+
+    def get_last_modified(self, row):
+        """
+        Return the latest of the `last_modified_field` of a row of the
+        validator queryset and of its related rows.
+        """
+        dates = [getattr(row, self.last_modified_field)] + [
+            getattr(row, 'related_modified_%d' % index)
+            for index in range(len(self.related_modified_fields))]
+        return max(date for date in dates if date is not None)
+
+
+class ListModelMixin(ConditionalMixin, mixins.ListModelMixin):
+    """
+    List a queryset page by page with `KeysetPagination`, ordered by the
+    view's `cursor_ordering`.
+
+    When a filter backend returns facets from `get_facets()`, the page is
+    sent as `{"results": [...], "facets": {...}}` instead of a plain list.
+    """
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-pk',)
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def get_facets(self, queryset):
+        """
+        Return the facets the filter backends compute for the unfiltered
+        `queryset`, or None when no backend returned any.
+        """
+        facets = None
+        for backend in list(self.filter_backends):
+            get_facets = getattr(backend(), 'get_facets', None)
+            if get_facets is None:
+                continue
+            backend_facets = get_facets(self.request, queryset, self)
+            if backend_facets is not None:
+                facets = dict(facets or {}, **backend_facets)
+        return facets
+
+    def get_list_validators(self, queryset, *parts):
+        """
+        Return the `(etag, None)` of the page requested, fetching only the
+        primary key, ordering and last modified columns. Extra `parts` of
+        the body not derived from the page go into the etag.
+
+        Lists have no Last-Modified: a row deleted or moved off the page
+        changes the page without raising the latest date on it.
+        """
+        if self.last_modified_field is None:
+            return None
+        queryset = self.get_validator_queryset(queryset, *[
+            name.lstrip('-') for name in self.get_cursor_ordering()])
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+        versions = [(row.pk, self.get_last_modified(row)) for row in page]
+        query = sorted(self.request.query_params.lists())
+        return self.make_etag(query, versions, *parts), None
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.get_queryset()
+        facets = self.get_facets(queryset)
+        queryset = self.filter_queryset(queryset)
 
+        validators = self.get_list_validators(queryset, facets)
+        if validators is not None:
+            not_modified = _get_not_modified_response(request, *validators)
+            if not_modified is not None:
+                return not_modified
+
+        reader = self.get_row_reader()
+        if reader is not None:
+            queryset = reader.values(queryset, *[
+                name.lstrip('-') for name in self.get_cursor_ordering()])
         page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        if reader is not None:
+            data = self.serialize(lambda: reader.render(rows))
+        else:
+            data = self.serialize(
+                lambda: self.get_read_serializer(rows, many=True).data)
         if page is not None:
-            serializer = self.get_read_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+
+        if facets is not None:
+            response.data = {'results': response.data, 'facets': facets}
+        if validators is not None:
+            _set_validators(response, *validators)
+        return response
 
-        serializer = self.get_read_serializer(queryset, many=True)
-        return Response(serializer.data)
 
+class RetrieveModelMixin(ConditionalMixin, mixins.RetrieveModelMixin):
 
-class RetrieveModelMixin(mixins.RetrieveModelMixin):
+    def get_object_validators(self):
+        """
+        Return the `(etag, last_modified)` of the requested object,
+        fetching only its primary key and last modified columns.
+        """
+        if self.last_modified_field is None:
+            return None
+        queryset = self.get_validator_queryset(
+            self.filter_queryset(self.get_queryset()))
+        obj = get_object_or_404(queryset, **self.get_lookup_filter())
+        self.check_object_permissions(self.request, obj)
+        last_modified = self.get_last_modified(obj)
+        return self.make_etag(obj.pk, last_modified), last_modified
 
     def retrieve(self, request, *args, **kwargs):
+        validators = self.get_object_validators()
+        if validators is not None:
+            not_modified = _get_not_modified_response(request, *validators)
+            if not_modified is not None:
+                return not_modified
+
         instance = self.get_object()
         serializer = self.get_read_serializer(instance)
-        return Response(serializer.data)
+        response = Response(self.serialize(lambda: serializer.data))
+
+        if validators is not None:
+            _set_validators(response, *validators)
+        return response
+
+
+class CacheResponseMixin:
+    """
+    Serve `list` and `retrieve` from the view's `response_cache`, a
+    `gricapi.cache.ResponseCache`. Must come before the list and retrieve
+    mixins so permissions are checked before the cache is read.
+
+    Detail entries are keyed by primary key alone, so a retrieve with
+    query parameters, which the filter backends may use to exclude the
+    object, is never cached.
+    """
+    response_cache = None
+
+    def list(self, request, *args, **kwargs):
+        get_response = partial(super().list, request, *args, **kwargs)
+        if self.response_cache is None:
+            return get_response()
+        key = self.response_cache.list_key(request.query_params)
+        return self.response_cache.fetch(request, key, get_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        if self.response_cache is None or request.query_params:
+            return get_response()
+        lookup = self.get_lookup_filter()
+        pk = lookup.get(self.lookup_field)
+        accept = None
+        if pk is None:
+            pk = self.response_cache.resolve_slug(self.get_queryset(), lookup)
+            if pk is None:
+                return get_response()
+            accept = partial(self.response_cache.matches_slug, pk, lookup)
+        key = self.response_cache.detail_key(pk)
+        return self.response_cache.fetch(request, key, get_response, accept)
+
+
+class ExportMixin:
+    """
+    Add an `export` action streaming every row of the filtered queryset,
+    rendered by the read serializer, as CSV (`?type=csv`, the default) or
+    NDJSON (`?type=ndjson`). Rows are read `API_EXPORT_CHUNK_SIZE` at a
+    time, so memory use does not grow with the export.
+    """
+    export_content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get_export_header(self):
+        """
+        Return the CSV columns, the fields of the read serializer.
+        """
+        return list(self.get_read_serializer().fields)
+
+    def get_export_rows(self, record):
+        """
+        Return the CSV rows of a serialized record.
+        """
+        return [record]
+
+    def get_export_records(self, queryset):
+        reader = self.get_row_reader()
+        if reader is not None:
+            queryset = reader.values(queryset)
+        for chunk in iterate_chunks(queryset, settings.API_EXPORT_CHUNK_SIZE):
+            if reader is not None:
+                records = reader.render(chunk)
+            else:
+                records = self.get_read_serializer(chunk, many=True).data
+            for record in records:
+                yield record
+
+    @action(detail=False)
+    def export(self, request):
+        export_type = serializers.ChoiceField(
+            choices=list(self.export_content_types)).run_validation(
+                request.query_params.get('type', 'csv'))
+        records = self.get_export_records(
+            self.filter_queryset(self.get_queryset()))
+        if export_type == 'ndjson':
+            lines = ndjson_lines(records)
+        else:
+            lines = csv_lines(
+                self.get_export_header(),
+                (row for record in records
+                 for row in self.get_export_rows(record)))
+        response = StreamingHttpResponse(
+            lines, content_type=self.export_content_types[export_type])
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+            self.basename, export_type)
+        return response
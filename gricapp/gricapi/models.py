@@ -1,18 +1,25 @@
 """
 Models for GricApp
 """
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.urls import reverse
-from .managers import CustomUserManager
-from django.template.defaultfilters import slugify
-from django.utils import timezone
+from .managers import (
+    CustomUserManager, ProduceQuerySet, OrderQuerySet, OrderItemQuerySet,
+    TaskQuerySet, QUEUED, RUNNING, FAILED
+)
+from .geo import encode_geohash, geocode
+from .slugs import get_slug_base, unique_slug
 from uuid import uuid4
 from django.contrib.auth.models import Group
 
 
+SLUG_ATTEMPTS = 3
+
+
 class UUIDModel(models.Model):
     pkid = models.BigAutoField(primary_key=True, editable=False)
     id = models.UUIDField(default=uuid4, editable=False, unique=True)
@@ -56,12 +63,33 @@ class Profile(models.Model):
     phone_number = models.BigIntegerField(blank=True, null=True)
     is_farmer = models.BooleanField(default=False)
     is_investor = models.BooleanField(default=False)
+    # geocoded from the address on save, see gricapi.geo
+    latitude = models.FloatField(blank=True, null=True, editable=False)
+    longitude = models.FloatField(blank=True, null=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # "near me" queries on SQLite, PostgreSQL uses a GiST index
+            models.Index(fields=['geohash'], name='profile_geohash_idx'),
+        ]
 
     def __str__(self):
         if self.is_farmer:
             return "{} is a farmer".format(self.user)
         return "{}".format(self.user)
 
+    # pylint: disable=arguments-differ,signature-differs
+    def save(self, *args, **kwargs):
+        location = geocode(self.address)
+        if location is None:
+            self.latitude = self.longitude = None
+            self.geohash = ''
+        else:
+            self.latitude, self.longitude = location
+            self.geohash = encode_geohash(*location)
+        super(Profile, self).save(*args, **kwargs)
+
 
 class Category(models.Model):
     """ Category of produce """
@@ -83,15 +111,10 @@ class Category(models.Model):
 
     # pylint: disable=arguments-differ,signature-differs
     def save(self, *args, **kwargs):
+        base = get_slug_base(self, self.category_name, 'cat')
+        if base is not None:
+            self.slug = unique_slug(self, base)
         super(Category, self).save(*args, **kwargs)
-        if not self.slug:
-            strftime = "".join(str(timezone.now()).split("."))
-            new_string = "%s-cat-%s" % (self.category_name, strftime[11:-3])
-            self.slug = slugify(new_string)
-        elif "cat" not in self.slug:
-            strftime = "".join(str(timezone.now()).split("."))
-            new_string = "%s-cat-%s" % (self.category_name, strftime[11:-3])
-            self.slug = slugify(new_string)
 
 
 class Produce(models.Model):
@@ -109,7 +132,7 @@ class Produce(models.Model):
         on_delete=models.CASCADE,
         related_name="products"
     )
-    slug = models.SlugField(max_length=200, db_index=True)
+    slug = models.SlugField(max_length=200, unique=True)
     stock = models.PositiveIntegerField(blank=True, default=0)
     measurement_unit = models.CharField(max_length=25, default="bags",
                                         choices=MEASUREMENT_UNITS)
@@ -123,6 +146,21 @@ class Produce(models.Model):
     image_url = models.URLField(blank=True, null=True)
     product_description = models.TextField(blank=True, null=True)
 
+    objects = ProduceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the catalog, newest first
+            models.Index(fields=['-date_created', '-id'],
+                         name='produce_created_id_idx'),
+            # browsing a category by price
+            models.Index(fields=['produce_category', 'price_tag'],
+                         name='produce_category_price_idx'),
+            # a farmer's listings, newest first
+            models.Index(fields=['owner', '-date_created'],
+                         name='produce_owner_created_idx'),
+        ]
+
     def get_absolute_url(self):
         return reverse('api:products-detail', args=[str(self.id)])
 
@@ -132,15 +170,24 @@ class Produce(models.Model):
 
     # pylint: disable=arguments-differ,signature-differs
     def save(self, *args, **kwargs):
-        super(Produce, self).save(*args, **kwargs)
-        if not self.slug:
-            strftime = "".join(str(timezone.now()).split("."))
-            new_string = "%s-pro-%s" % (self.produce_name, strftime[11:-3])
-            self.slug = slugify(new_string)
-        elif "pro" not in self.slug:
-            strftime = "".join(str(timezone.now()).split("."))
-            new_string = "%s-pro-%s" % (self.produce_name, strftime[11:-3])
-            self.slug = slugify(new_string)
+        base = get_slug_base(self, self.produce_name, 'pro')
+        if base is None:
+            super(Produce, self).save(*args, **kwargs)
+            return
+        self.slug = unique_slug(self, base)
+        attempts = SLUG_ATTEMPTS
+        while True:
+            try:
+                with transaction.atomic():
+                    super(Produce, self).save(*args, **kwargs)
+                return
+            except IntegrityError:
+                # a concurrent insert may have taken the slug first
+                attempts -= 1
+                taken = self.slug
+                self.slug = unique_slug(self, base)
+                if not attempts or self.slug == taken:
+                    raise
 
 
 class Order(UUIDModel):
@@ -153,14 +200,59 @@ class Order(UUIDModel):
         on_delete=models.CASCADE
     )
     order_status = models.CharField(max_length=26, default="pending")
+    # Sum of the items' price, kept up to date by the item writes with
+    # F() expressions, see `add_to_total`. Never saved from an instance.
+    total_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the orders, newest first. The primary
+            # key is the parent link to UUIDModel, which holds `pkid`.
+            models.Index(fields=['-transaction_date', '-uuidmodel_ptr'],
+                         name='order_transaction_pkid_idx'),
+            # a consumer's order history, newest first
+            models.Index(fields=['consumer', '-transaction_date'],
+                         name='order_consumer_date_idx'),
+            # sorting and filtering orders by value
+            models.Index(fields=['total_cost', 'uuidmodel_ptr'],
+                         name='order_total_cost_idx'),
+        ]
 
     def __str__(self):
         return "{}".format(self.id)
 
-    @property
-    def total_cost(self):
-        cost = sum(item.price for item in self.items.all())
-        return cost
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Order, cls).from_db(db, field_names, values)
+        # lets the signal receivers tell when an order becomes paid
+        instance.paid_when_loaded = instance.__dict__.get('paid')
+        return instance
+
+    # pylint: disable=arguments-differ,signature-differs
+    def save(self, *args, **kwargs):
+        # Leave `total_cost` out of updates so a stale instance never
+        # overwrites the increments applied by `add_to_total`.
+        if not (self._state.adding or kwargs.get('force_insert') or
+                kwargs.get('update_fields') is not None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'total_cost'
+            ]
+        super(Order, self).save(*args, **kwargs)
+
+    def add_to_total(self, amount):
+        """
+        Add `amount` to the stored total in a single UPDATE and reload it,
+        along with the modification date the ETag is built from.
+        """
+        if amount:
+            Order.objects.filter(pk=self.pk).update(
+                total_cost=models.F('total_cost') + amount,
+                update_transaction_date=timezone.now())
+        self.refresh_from_db(fields=['total_cost', 'update_transaction_date'])
 
 
 class OrderItem(models.Model):
@@ -174,10 +266,71 @@ class OrderItem(models.Model):
     status = models.CharField(
         default="pending", max_length=30)
 
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'status'],
+                         name='orderitem_order_status_idx'),
+        ]
+
     def __str__(self):
         return "Item{}".format(self.item_id)
 
+    def get_price(self):
+        return self.quantity_ordered * self.produce.price_tag
+
     # pylint: disable=arguments-differ,signature-differs
+    @transaction.atomic
     def save(self, *args, **kwargs):
-        self.price = self.quantity_ordered * self.produce.price_tag
+        self.price = self.get_price()
+        previous = 0
+        if not self._state.adding:
+            previous = OrderItem.objects.filter(pk=self.pk).values_list(
+                'price', flat=True).first() or 0
         super(OrderItem, self).save(*args, **kwargs)
+        Order.objects.filter(pk=self.order_id).update(
+            total_cost=models.F('total_cost') + self.price - previous,
+            update_transaction_date=timezone.now())
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        Order.objects.filter(pk=self.order_id).update(
+            total_cost=models.F('total_cost') - self.price,
+            update_transaction_date=timezone.now())
+        return super(OrderItem, self).delete(*args, **kwargs)
+
+
+class Task(models.Model):
+    """
+    Background task queued by `gricapi.tasks.enqueue`, run by the
+    run_workers command.
+    """
+    STATUSES = (
+        (QUEUED, 'queued'),
+        (RUNNING, 'running'),
+        (FAILED, 'failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    # keyword arguments of the task, as JSON
+    payload = models.TextField(default='{}')
+    status = models.CharField(max_length=10, default=QUEUED,
+                              choices=STATUSES)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a queued task is due, or when the lease of a running one ends
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the workers polling for due tasks
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return "{} {}".format(self.name, self.pk)
@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on the position of the last row of a page instead of an
+    offset, so fetching any page costs the same index seek.
+
+    The view declares a total ordering with `cursor_ordering`, e.g.
+    `('-date_created', '-id')`, or `get_cursor_ordering()`, which should
+    be backed by an index.
+    The response body stays a plain list; the cursor of the next page is
+    advertised in a `Link: <url>; rel="next"` header.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+        self.next_position = None
+        self.request = None
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_cursor_ordering'):
+            return view.get_cursor_ordering()
+        return getattr(view, 'cursor_ordering', ('-pk',))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        return urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, queryset, ordering):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            position = json.loads(urlsafe_b64decode(encoded + padding))
+            if len(position) != len(ordering):
+                raise ValueError(encoded)
+            return [
+                self.get_field(queryset.model, name).to_python(value)
+                for name, value in zip(ordering, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field(self, model, name):
+        name = name.lstrip('-')
+        if name == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(name)
+
+    def get_position(self, instance, ordering, model=None):
+        """
+        Return the cursor position of `instance`, a model instance or a
+        `.values()` row of `model` holding the ordering columns.
+        """
+        if isinstance(instance, dict):
+            instance = SimpleNamespace(**{
+                self.get_field(model, name).attname: instance[name.lstrip('-')]
+                for name in ordering
+            })
+        else:
+            model = type(instance)
+        return [
+            self.get_field(model, name).value_to_string(instance)
+            for name in ordering
+        ]
+
+    def filter_after(self, queryset, ordering, position):
+        """
+        Keep the rows that sort strictly after `position`, comparing the
+        ordering columns lexicographically.
+        """
+        conditions = []
+        for index, name in enumerate(ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition = {
+                previous.lstrip('-'): value
+                for previous, value in zip(ordering[:index], position)
+            }
+            condition['%s__%s' % (field, lookup)] = position[index]
+            conditions.append(Q(**condition))
+        return queryset.filter(reduce(lambda left, right: left | right,
+                                      conditions))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = tuple(self.get_ordering(view))
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(queryset, ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = self.filter_after(queryset, ordering, position)
+
+        # fetch one extra row to find out whether there is a next page
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = self.get_position(
+                page[-1], ordering, queryset.model)
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link is not None:
+            headers['Link'] = '<%s>; rel="next"' % next_link
+        return Response(data, headers=headers)
@@ -0,0 +1,52 @@
+"""
+Parsers of request bodies.
+"""
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    Parses JSON with orjson when it is installed and the body is UTF-8,
+    like `JSONParser` otherwise.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError('JSON parse error - %s' % error)
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a CSV body, whose first line names the columns, into a list of
+    dicts. Empty cells are left out so they read as missing values.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            lines = codecs.getreader(encoding)(stream)
+            return [
+                {name: value for name, value in row.items()
+                 if name is not None and value not in (None, '')}
+                for row in csv.DictReader(lines)
+            ]
+        except (csv.Error, UnicodeDecodeError) as error:
+            raise ParseError('CSV parse error - %s' % error)
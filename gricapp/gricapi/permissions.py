@@ -2,22 +2,61 @@ from django.contrib.auth.models import Group
 from gricapi.models import Order, Produce
 from rest_framework import permissions
 
+# Process-level map of group name -> group id. `User.groups` is a plain
+# ForeignKey, so once the ids are known a membership check is a simple
+# comparison against `user.groups_id` and needs no query at all.
+# Cleared by `gricapi.signals` whenever a Group is saved or deleted.
+_group_ids = None
 
-def _is_in_group(user, group_name):
+
+def get_group_ids():
+    """
+    Return the cached `{group name: id}` map, loading it on first use.
+    """
+    global _group_ids  # pylint: disable=global-statement
+    group_ids = _group_ids
+    if group_ids is None:
+        group_ids = dict(Group.objects.values_list('name', 'id'))
+        _group_ids = group_ids
+    return group_ids
+
+
+def clear_group_cache(**kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the cached group ids, usable directly as a signal receiver.
+    """
+    global _group_ids  # pylint: disable=global-statement
+    _group_ids = None
+
+
+def _get_group_names(request):
+    """
+    Takes a request and returns the names of the groups its user
+    belongs to, resolving them once and memoizing them on the request.
+    """
+    group_names = getattr(request, '_group_names', None)
+    if group_names is None:
+        group_id = getattr(request.user, 'groups_id', None)
+        group_names = frozenset(
+            name for name, pk in get_group_ids().items()
+            if group_id is not None and pk == group_id
+        )
+        request._group_names = group_names  # pylint: disable=protected-access
+    return group_names
+
+
+def _is_in_group(request, group_name):
     """
-    Takes a user and a group name, and returns `True`
-    if the user is in that group.
+    Takes a request and a group name, and returns `True`
+    if the request user is in that group.
     """
-    try:
-        return Group.objects.get(name=group_name).user_set.filter(
-            id=user.id).exists()
-    except Group.DoesNotExist:
-        return None
+    return group_name in _get_group_names(request)
 
 
-def _has_group_permission(user, required_groups):
+def _has_group_permission(request, required_groups):
     return (
-        any([_is_in_group(user, group_name) for group_name in required_groups])
+        any([_is_in_group(request, group_name)
+             for group_name in required_groups])
     )
 
 
@@ -27,12 +66,12 @@ class IsAdminUser(permissions.BasePermission):
 
     def has_permission(self, request, view):
         has_group_permission = _has_group_permission(
-            request.user, self.required_groups)
+            request, self.required_groups)
         return request.user and has_group_permission
 
     def has_object_permission(self, request, view, obj):
         has_group_permission = _has_group_permission(
-            request.user, self.required_groups)
+            request, self.required_groups)
         return request.user and has_group_permission
 
 
@@ -41,7 +80,7 @@ class IsAdminOrAnonymousUser(permissions.BasePermission):
 
     def has_permission(self, request, view):
         has_group_permission = _has_group_permission(
-            request.user, self.required_groups)
+            request, self.required_groups)
         return request.user and has_group_permission
 
 
@@ -52,11 +91,11 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         """Return True if permission is granted to the owner."""
         has_group_permission = _has_group_permission(
-            request.user, self.required_groups)
+            request, self.required_groups)
 
         if isinstance(obj, Order):
-            return obj.consumer == request.user or has_group_permission
+            return obj.consumer_id == request.user.pk or has_group_permission
         if isinstance(obj, Produce):
-            return obj.owner == request.user or has_group_permission
+            return obj.owner_id == request.user.pk or has_group_permission
 
         return obj == request.user
@@ -0,0 +1,149 @@
+"""
+A pool of database connections shared by the threads of a process.
+
+Opening a PostgreSQL connection costs a TCP handshake, authentication
+and the start of a backend process, often more than the queries of a
+small request. The pool keeps the connections handed back to it and
+hands them out again, most recently used first so the least used ones
+grow idle and are closed after `max_idle` seconds.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolExhausted(Exception):
+    """
+    Raised when no connection was handed back within the timeout while
+    the pool holds its maximum number of connections.
+    """
+
+
+class ConnectionPool:
+    """
+    Holds up to `max_size` connections opened by `connect()`.
+
+    `check(connection)` tells whether an idle connection still works
+    before it is handed out again, `reset(connection)` whether one
+    handed back can be kept, after cleaning it up. Either returning
+    False or raising gets the connection closed.
+    """
+
+    def __init__(self, connect, max_size, max_idle=300, timeout=10,
+                 check=None, reset=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        # (connection, time it was handed back), the most recent last
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _expire(self):
+        expired = []
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            expired.append(self._idle.popleft()[0])
+        self._size -= len(expired)
+        return expired
+
+    def acquire(self):
+        """
+        Return an idle connection, or a new one while the pool is not
+        full, waiting up to `timeout` seconds for one to be handed back
+        otherwise.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            connection, new = None, False
+            with self._condition:
+                expired = self._expire()
+                if self._idle:
+                    connection = self._idle.pop()[0]
+                elif self._size < self.max_size:
+                    self._size += 1
+                    new = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhausted(
+                            'No database connection was available within '
+                            '%s seconds, all %d are in use.'
+                            % (self.timeout, self.max_size))
+                    self._condition.wait(remaining)
+            for stale in expired:
+                _close(stale)
+            if new:
+                return self._open()
+            if connection is not None:
+                if self._call(self.check, connection):
+                    return connection
+                self.discard(connection)
+
+    def _open(self):
+        try:
+            return self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection):
+        """
+        Hand `connection` back to the pool.
+        """
+        if not self._call(self.reset, connection):
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        """
+        Close `connection` and make room for a new one.
+        """
+        _close(connection)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def close_idle(self):
+        """
+        Close the idle connections.
+        """
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            _close(connection)
+
+    @staticmethod
+    def _call(function, connection):
+        if function is None:
+            return True
+        try:
+            return function(connection)
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:  # pylint: disable=broad-except
+        pass
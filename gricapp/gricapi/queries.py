@@ -0,0 +1,106 @@
+"""
+Query planning for the read endpoints.
+
+Derives `select_related` and `prefetch_related` lookups from the fields
+a serializer declares, so a listing fetches every relation it renders
+in a fixed number of queries.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+
+# serializer class -> plan, see `_build_plan`
+_plans = {}
+
+
+def _build_plan(serializer, model):
+    """
+    Walk the serializer fields and return a plan as a tuple of
+    `(select_related, prefetches)` where `prefetches` holds
+    `(lookup, related model, nested plan)` entries.
+    """
+    select_related = []
+    prefetches = []
+    for field in serializer.fields.values():
+        if field.write_only or len(field.source_attrs) != 1:
+            continue
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        elif isinstance(field, ManyRelatedField):
+            nested = field.child_relation
+        else:
+            nested = field
+        related_model = model_field.related_model
+
+        many = model_field.many_to_many or model_field.one_to_many
+        if isinstance(nested, serializers.BaseSerializer):
+            nested_plan = _build_plan(nested, related_model)
+        elif isinstance(nested, PrimaryKeyRelatedField) and not many:
+            # the primary key is read from the local column
+            continue
+        else:
+            nested_plan = ((), ())
+
+        if many:
+            prefetches.append((source, related_model, nested_plan))
+        else:
+            nested_select, nested_prefetches = nested_plan
+            select_related.append(source)
+            select_related.extend(
+                '%s__%s' % (source, lookup) for lookup in nested_select)
+            prefetches.extend(
+                ('%s__%s' % (source, lookup), related, plan)
+                for lookup, related, plan in nested_prefetches)
+    return tuple(select_related), tuple(prefetches)
+
+
+def get_plan(serializer_class, model):
+    """
+    Return the cached plan for rendering `model` with `serializer_class`.
+    """
+    key = (serializer_class, model)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _build_plan(serializer_class(), model)
+        _plans[key] = plan
+    return plan
+
+
+def _related_queryset(model):
+    """
+    Return the rows of `model` a prefetch reads, in a stable order.
+    """
+    queryset = model._default_manager.all()
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    return queryset
+
+
+def _apply_plan(queryset, plan):
+    select_related, prefetches = plan
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*[
+            Prefetch(lookup, queryset=_apply_plan(
+                _related_queryset(related), nested_plan))
+            for lookup, related, nested_plan in prefetches
+        ])
+    return queryset
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Return `queryset` with every relation rendered by `serializer_class`
+    joined or prefetched.
+    """
+    return _apply_plan(queryset, get_plan(serializer_class, queryset.model))
@@ -0,0 +1,171 @@
+"""
+Fast read serialization.
+
+Compiles a read serializer into a `RowReader` which renders the rows of
+a `.values()` queryset straight into the serializer's output, without
+building model instances nor running the serializer per row. Related
+lists, such as the items of an order, are read with one more `.values()`
+query each.
+
+Serializers with fields that do not map onto columns, e.g. method
+fields, nested objects or hyperlinks, are not compiled and keep being
+rendered by the serializer.
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField, SlugRelatedField
+
+# (serializer class, model) -> reader or None, see `get_reader`
+_readers = {}
+
+
+class RowReader:
+    """
+    Renders `.values()` rows of `model` as the serializer it was compiled
+    from would render the instances.
+
+    `fields` holds a `(name, key, convert, nested)` entry per serialized
+    field: the value of the `key` column, passed through `convert` unless
+    it is None or `convert` is, or with a `nested` `(related field name,
+    reader)` pair the rows of the related model pointing to the row.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+
+    def get_columns(self):
+        columns = ['pk']
+        for _, key, _, nested in self.fields:
+            if nested is None and key not in columns:
+                columns.append(key)
+        return columns
+
+    def values(self, queryset, *extra):
+        """
+        Return `queryset` as the `.values()` rows `render()` takes, with
+        the `extra` columns, e.g. those of its ordering, as well.
+        """
+        columns = self.get_columns()
+        columns += [name for name in extra if name not in columns]
+        return queryset.select_related(None).prefetch_related(None).values(
+            *columns)
+
+    def render(self, rows):
+        rows = list(rows)
+        related = [
+            self.read_related(nested, [row['pk'] for row in rows])
+            if nested is not None else None
+            for _, _, _, nested in self.fields
+        ]
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for (name, key, convert, nested), groups in zip(self.fields,
+                                                            related):
+                if nested is not None:
+                    item[name] = groups.get(row['pk'], [])
+                    continue
+                value = row[key]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+    def read_related(self, nested, pks):
+        """
+        Return the rendered rows of the nested model pointing to `pks`
+        grouped by the row they point to, in the order the related
+        manager lists them.
+        """
+        field_name, reader = nested
+        groups = {}
+        if not pks:
+            return groups
+        queryset = reader.model._default_manager.filter(
+            **{'%s__in' % field_name: pks})
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        rows = list(reader.values(queryset, field_name))
+        for row, item in zip(rows, reader.render(rows)):
+            groups.setdefault(row[field_name], []).append(item)
+        return groups
+
+
+def _get_converter(field, model_field):
+    """
+    Return the function turning a column value into the field's output,
+    or None when the value is output as is.
+    """
+    if isinstance(field, serializers.ReadOnlyField):
+        return None
+    if (type(field).to_representation is
+            serializers.CharField.to_representation and
+            isinstance(model_field, (models.CharField, models.TextField))):
+        # str() of a string
+        return None
+    return field.to_representation
+
+
+def _compile(serializer, model):
+    """
+    Return the `RowReader` of `serializer` for `model`, or None when a
+    field cannot be read from a column.
+    """
+    fields = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if len(field.source_attrs) != 1:
+            return None
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+
+        if isinstance(field, serializers.ListSerializer):
+            if not model_field.one_to_many:
+                return None
+            reader = _compile(field.child, model_field.related_model)
+            if reader is None:
+                return None
+            nested = (model_field.field.name, reader)
+            fields.append((name, None, None, nested))
+        elif isinstance(field, serializers.BaseSerializer):
+            return None
+        elif model_field.is_relation:
+            if not (model_field.many_to_one or
+                    model_field.one_to_one and model_field.concrete):
+                return None
+            if isinstance(field, SlugRelatedField) and \
+                    '.' not in field.slug_field:
+                key = '%s__%s' % (source, field.slug_field)
+            elif type(field) is PrimaryKeyRelatedField and \
+                    field.pk_field is None:
+                key = source
+            else:
+                return None
+            fields.append((name, key, None, None))
+        elif isinstance(field, serializers.SerializerMethodField) or \
+                not model_field.concrete:
+            return None
+        else:
+            fields.append(
+                (name, source, _get_converter(field, model_field), None))
+    return RowReader(model, fields)
+
+
+def get_reader(serializer_class, model):
+    """
+    Return the cached `RowReader` rendering `model` like
+    `serializer_class`, or None when the serializer cannot be compiled.
+    """
+    key = (serializer_class, model)
+    if key not in _readers:
+        _readers[key] = _compile(serializer_class(), model)
+    return _readers[key]
@@ -0,0 +1,38 @@
+"""
+Renderers of response bodies.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# converts what orjson does not, e.g. Decimal to float like DRF
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders JSON with orjson when it is installed, which writes
+    datetimes, UUIDs and dicts in C and falls back on DRF's encoder for
+    the other types, e.g. `Decimal` values. Without orjson, or when the
+    output is indented or ASCII only, renders like `JSONRenderer`.
+
+    The output is the same as `JSONRenderer`'s but for the formatting of
+    some floats, e.g. `1e16` rather than `1e+16`.
+    """
+    options = orjson and orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or
+                not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=_encoder.default,
+                           option=self.options)
+        # escaped by JSONRenderer too, for JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,88 @@
+"""
+Full-text search over produce names and descriptions.
+
+On PostgreSQL a trigger keeps a weighted `search_vector` tsvector column
+of `gricapi_produce` up to date, indexed with GIN, and queries falling
+through full-text search (e.g. misspelt names) are matched by trigram
+similarity of the name. On SQLite the same columns are mirrored into an
+FTS5 table by triggers. Both are created by migration 0007, so rows
+written in bulk are searchable as well.
+"""
+import re
+
+from django.db import connection
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'gricapi_produce_fts'
+# bm25 weights of produce_name and product_description
+FTS_WEIGHTS = (4.0, 1.0)
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r'[^\W_]+')
+
+
+def parse_terms(query):
+    """
+    Split `query` into at most `MAX_TERMS` lowercase words, dropping
+    everything the search syntax of either backend could interpret.
+    """
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def _postgresql_matches(queryset, terms):
+    table = queryset.model._meta.db_table
+    tsquery = ' & '.join('%s:*' % term for term in terms)
+    return queryset.extra(
+        select={'rank': 'ts_rank_cd(%s.search_vector, '
+                        'to_tsquery(%%s, %%s))' % table},
+        select_params=[SEARCH_CONFIG, tsquery],
+        where=['%s.search_vector @@ to_tsquery(%%s, %%s)' % table],
+        params=[SEARCH_CONFIG, tsquery],
+    ).order_by('-rank', '-pk')
+
+
+def _postgresql_similar(queryset, query):
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        select={'rank': 'similarity(%s.produce_name, %%s)' % table},
+        select_params=[query],
+        where=['%s.produce_name %%%% %%s' % table],
+        params=[query],
+    ).order_by('-rank', '-pk')
+
+
+def _sqlite_matches(queryset, terms):
+    table = queryset.model._meta.db_table
+    match = ' '.join('"%s"*' % term for term in terms)
+    # bm25 is lower for better matches, negate it to sort like ts_rank
+    return queryset.extra(
+        select={'rank': '-bm25(%s, %s, %s)' % ((FTS_TABLE,) + FTS_WEIGHTS)},
+        tables=[FTS_TABLE],
+        where=['%s.rowid = %s.id' % (FTS_TABLE, table),
+               '%s MATCH %%s' % FTS_TABLE],
+        params=[match],
+    ).order_by('-rank', '-pk')
+
+
+def _substring_matches(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(produce_name__icontains=term)
+    return queryset.order_by('-pk')
+
+
+def search_produce(queryset, query, limit):
+    """
+    Return up to `limit` produce of `queryset` matching every word of
+    `query` as a prefix, best ranked first.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        results = list(_postgresql_matches(queryset, terms)[:limit])
+        if not results:
+            results = list(_postgresql_similar(queryset, query)[:limit])
+        return results
+    if connection.vendor == 'sqlite':
+        return list(_sqlite_matches(queryset, terms)[:limit])
+    return list(_substring_matches(queryset, terms)[:limit])
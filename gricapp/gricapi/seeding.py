@@ -0,0 +1,394 @@
+"""
+Synthetic marketplace data for benchmarks and scale tests.
+
+Rows are generated in chunks of `CHUNK_SIZE`, each from its own random
+generator seeded with the seed of the run, the kind of row and the
+chunk number, so the rows only depend on the arguments of the run, not
+on the batch size or on the number of processes generating them; dates
+are spread back from the start of the run. The chunks are converted to
+database values where they are generated, optionally in a pool of
+worker processes, and written in order by the main process with
+multi-row INSERTs, so neither model instances nor signals are involved
+and columns such as `date_created` keep the values generated here.
+Primary keys are allocated after the largest existing one and the
+sequences reset afterwards, so rows can point to each other without
+reading them back. The emails, slugs and UUIDs of a seed would collide
+with those of a previous run, so a seed is only used once per database.
+
+The marketplace is skewed like a real one: a quarter of the users are
+farmers, a few of whom own most of the produce, the popular towns,
+categories, produce and buyers get most of the rows, and most orders
+hold a few items.
+"""
+import math
+import multiprocessing
+import random
+from collections import OrderedDict, deque
+from datetime import timedelta
+from decimal import Decimal
+from uuid import UUID
+
+import django
+from django.contrib.auth.models import Group
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from .geo import GAZETTEER, encode_geohash
+from .models import (
+    User, Profile, Category, Produce, UUIDModel, Order, OrderItem
+)
+
+CATEGORIES = ('Grains', 'Tubers', 'Legumes', 'Vegetables', 'Fruits',
+              'Nuts', 'Spices', 'Livestock', 'Poultry', 'Fish', 'Dairy',
+              'Oil seeds', 'Beverages', 'Fibres', 'Herbs')
+CROPS = ('Maize', 'Rice', 'Sorghum', 'Millet', 'Cassava', 'Yam', 'Cocoyam',
+         'Beans', 'Cowpea', 'Groundnut', 'Tomato', 'Pepper', 'Onion',
+         'Okra', 'Mango', 'Orange', 'Pineapple', 'Plantain', 'Cashew',
+         'Ginger', 'Sesame', 'Soybean', 'Cocoa', 'Coffee', 'Cotton')
+VARIETIES = ('Yellow', 'White', 'Red', 'Sweet', 'Dry', 'Fresh', 'Organic',
+             'Premium', 'Local', 'Improved')
+UNITS = ('bags', 'tonnes', 'units')
+STREETS = ('Market Road', 'Farm Lane', 'Station Road', 'Church Street',
+           'Old Mill Road', 'River Close')
+# seconds over which the generated rows are spread, back from now
+HISTORY = 365 * 24 * 3600
+# rows generated per task, the unit of work of the worker processes
+CHUNK_SIZE = 10000
+# one user in FARMER_EVERY is a farmer
+FARMER_EVERY = 4
+
+# the types of fields whose Python values the drivers take as they are
+PLAIN_TYPES = {'AutoField', 'BigAutoField', 'BigIntegerField', 'BooleanField',
+               'CharField', 'FloatField', 'IntegerField',
+               'PositiveIntegerField', 'SlugField', 'TextField'}
+
+# the fields written, in the order the generators give their values
+COLUMNS = OrderedDict([
+    (User, ('id', 'password', 'email', 'first_name', 'last_name',
+            'date_joined', 'groups_id')),
+    (Profile, ('user_id', 'gender', 'address', 'phone_number', 'is_farmer',
+               'is_investor', 'latitude', 'longitude', 'geohash')),
+    (Category, ('id', 'category_name', 'slug')),
+    (Produce, ('id', 'produce_name', 'slug', 'produce_category_id',
+               'owner_id', 'stock', 'measurement_unit', 'price_tag',
+               'date_created', 'date_modified', 'product_description')),
+    (UUIDModel, ('pkid', 'id')),
+    (Order, ('uuidmodel_ptr_id', 'transaction_date',
+             'update_transaction_date', 'paid', 'consumer_id',
+             'total_cost')),
+    (OrderItem, ('item_id', 'order_id', 'produce_id', 'quantity_ordered',
+                 'price')),
+])
+
+
+class Table:
+    """
+    Multi-row INSERTs into the table of `model` of the fields named by
+    `attnames`. The other fields, but the primary key, take their
+    default, computed once for all the rows.
+    """
+
+    def __init__(self, model, attnames):
+        fields = OrderedDict(
+            (field.attname, field)
+            for field in model._meta.local_concrete_fields)
+        self.model = model
+        given = [fields[attname] for attname in attnames]
+        defaults = [field for attname, field in fields.items()
+                    if attname not in attnames and not field.primary_key]
+        self.converters = [_get_converter(field) for field in given]
+        self.defaults = tuple(
+            field.get_db_prep_save(field.get_default(), connection)
+            for field in defaults)
+        self.columns = [field.column for field in given + defaults]
+
+    def prepare(self, *values):
+        """
+        Return the database values of a row given the values of the
+        fields, in `attnames` order.
+        """
+        return tuple(
+            value if convert is None else convert(value, connection)
+            for convert, value in zip(self.converters, values)
+        ) + self.defaults
+
+    def insert(self, rows, batch_size=1000):
+        """
+        Insert `rows` of database values with one INSERT per
+        `batch_size` rows.
+        """
+        width = len(self.columns)
+        max_params = connection.features.max_query_params
+        if max_params:
+            batch_size = max(1, min(batch_size, max_params // width))
+        quote = connection.ops.quote_name
+        prefix = 'INSERT INTO %s (%s) VALUES ' % (
+            quote(self.model._meta.db_table),
+            ', '.join(quote(column) for column in self.columns))
+        placeholders = '(%s)' % ', '.join(['%s'] * width)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    prefix + ', '.join([placeholders] * len(batch)),
+                    [value for row in batch for value in row])
+
+
+def _get_converter(field):
+    """
+    Return the function turning a value of `field` into a database
+    value, or None when the value is written as is.
+    """
+    target = field
+    while target.is_relation:
+        target = target.target_field
+    if target.get_internal_type() in PLAIN_TYPES:
+        return None
+    return field.get_db_prep_save
+
+
+_tables = {}
+
+
+def get_table(model):
+    table = _tables.get(model)
+    if table is None:
+        table = _tables[model] = Table(model, COLUMNS[model])
+    return table
+
+
+def skewed(generator, count, exponent):
+    """
+    Return an index below `count`, the lower ones the likelier: with an
+    `exponent` of 3 the first 10% of the indexes get 46% of the draws.
+    """
+    return int(count * generator.random() ** exponent)
+
+
+def produce_price(seed, index):
+    """
+    Return the price of the `index`-th produce, log-uniform from 1 to
+    10,000. It is derived from the index rather than drawn, so the
+    chunks of orders know it.
+    """
+    fraction = (index + seed * 7919) * 2654435761 % 2 ** 32 / 2 ** 32
+    return Decimal(int(10 ** (2 + 4 * fraction))) / 100
+
+
+_slugs = {}
+
+
+def _slugify(name):
+    slug = _slugs.get(name)
+    if slug is None:
+        slug = _slugs[name] = slugify(name)
+    return slug
+
+
+class Plan:
+    """
+    The arguments of a run and the first primary key of every model,
+    all the chunks need to generate their rows.
+    """
+
+    def __init__(self, seed, counts, items_per_order, group):
+        self.seed = seed
+        self.now = timezone.now()
+        self.counts = counts
+        self.items_per_order = items_per_order
+        self.group = group
+        self.first = {kind: _next_pk(model) for kind, model in [
+            ('users', User), ('categories', Category),
+            ('produce', Produce), ('orders', UUIDModel)]}
+
+
+def _next_pk(model):
+    return (model._default_manager.aggregate(
+        largest=Max('pk'))['largest'] or 0) + 1
+
+
+def _past(plan, generator):
+    return plan.now - timedelta(seconds=generator.randrange(HISTORY))
+
+
+def _generate_users(plan, generator, start, stop):
+    users, profiles = get_table(User), get_table(Profile)
+    user_rows, profile_rows = [], []
+    for index in range(start, stop):
+        pk = plan.first['users'] + index
+        is_farmer = index % FARMER_EVERY == 0
+        town, latitude, longitude = GAZETTEER[
+            skewed(generator, len(GAZETTEER), 2)]
+        user_rows.append(users.prepare(
+            # unusable, seeded users cannot log in
+            pk, '!', 'seed%d.user%d@example.com' % (plan.seed, index),
+            'Farmer' if is_farmer else 'Buyer', str(index),
+            _past(plan, generator), plan.group))
+        profile_rows.append(profiles.prepare(
+            pk, generator.choice('MF'), '%d %s, %s' % (
+                generator.randint(1, 200), generator.choice(STREETS),
+                town.title()),
+            2348000000000 + generator.randrange(10 ** 9), is_farmer,
+            generator.random() < 0.05, latitude, longitude,
+            encode_geohash(latitude, longitude)))
+    return [(User, user_rows), (Profile, profile_rows)]
+
+
+def _generate_categories(plan, generator, start, stop):
+    categories = get_table(Category)
+    rows = []
+    for index in range(start, stop):
+        name = CATEGORIES[index % len(CATEGORIES)]
+        if index >= len(CATEGORIES):
+            name += ' %d' % (index // len(CATEGORIES))
+        rows.append(categories.prepare(
+            plan.first['categories'] + index, name,
+            '%s-cat-%d' % (_slugify(name), plan.seed * 10 ** 6 + index + 2)))
+    return [(Category, rows)]
+
+
+def _generate_produce(plan, generator, start, stop):
+    produce = get_table(Produce)
+    farmers = math.ceil(plan.counts['users'] / FARMER_EVERY)
+    rows = []
+    for index in range(start, stop):
+        name = '%s %s' % (generator.choice(VARIETIES),
+                          generator.choice(CROPS))
+        created = _past(plan, generator)
+        stock = (0 if generator.random() < 0.1 else
+                 min(int(generator.paretovariate(1.2) * 10), 10 ** 5))
+        rows.append(produce.prepare(
+            plan.first['produce'] + index, name,
+            # the suffix keeps seeded slugs unique, as `unique_slug` would
+            '%s-pro-%d' % (_slugify(name), plan.seed * 10 ** 9 + index + 2),
+            plan.first['categories'] + skewed(
+                generator, plan.counts['categories'], 2),
+            plan.first['users'] + FARMER_EVERY * skewed(
+                generator, farmers, 2),
+            stock, generator.choice(UNITS),
+            produce_price(plan.seed, index), created, created,
+            'Lot %d of %s.' % (index, name.lower())))
+    return [(Produce, rows)]
+
+
+def _generate_orders(plan, generator, start, stop):
+    uuids, orders, items = (
+        get_table(UUIDModel), get_table(Order), get_table(OrderItem))
+    uuid_rows, order_rows, item_rows = [], [], []
+    extra_items = plan.items_per_order - 1
+    for index in range(start, stop):
+        pk = plan.first['orders'] + index
+        count = 1
+        if extra_items:
+            count += min(round(generator.expovariate(1 / extra_items)),
+                         extra_items * 10)
+        total = Decimal(0)
+        for _ in range(count):
+            produce = skewed(generator, plan.counts['produce'], 3)
+            quantity = 1 + int(generator.expovariate(0.25))
+            price = produce_price(plan.seed, produce) * quantity
+            total += price
+            item_rows.append(items.prepare(
+                UUID(int=generator.getrandbits(128)), pk,
+                plan.first['produce'] + produce, quantity, price))
+        date = _past(plan, generator)
+        uuid_rows.append(uuids.prepare(
+            pk, UUID(int=generator.getrandbits(128))))
+        order_rows.append(orders.prepare(
+            pk, date, date, generator.random() < 0.6,
+            plan.first['users'] + skewed(generator, plan.counts['users'], 2),
+            total))
+    return [(UUIDModel, uuid_rows), (Order, order_rows),
+            (OrderItem, item_rows)]
+
+
+# in the order their rows are written
+GENERATORS = OrderedDict([
+    ('users', _generate_users),
+    ('categories', _generate_categories),
+    ('produce', _generate_produce),
+    ('orders', _generate_orders),
+])
+
+
+def generate_chunk(task):
+    """
+    Return the `(model, rows)` pairs of a `(plan, kind, number)` task,
+    the rows as database values. Run by the worker processes.
+    """
+    plan, kind, number = task
+    generator = random.Random('%d:%s:%d' % (plan.seed, kind, number))
+    start = number * CHUNK_SIZE
+    stop = min(start + CHUNK_SIZE, plan.counts[kind])
+    return GENERATORS[kind](plan, generator, start, stop)
+
+
+class MarketplaceSeeder:
+    """
+    Generates users with their profile, categories, produce and orders
+    with their items, see the module docstring. The same arguments on
+    the same database always give the same rows, dates aside.
+    """
+
+    def __init__(self, seed=0, batch_size=1000, processes=1, log=None):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.processes = processes
+        self.log = log or (lambda message: None)
+        self.counts = OrderedDict()
+
+    def has_run(self):
+        """
+        Return whether the database holds the rows of this seed.
+        """
+        # every run seeds users, see `_generate_users`
+        return User.objects.filter(
+            email__startswith='seed%d.' % self.seed).exists()
+
+    def generate(self, tasks):
+        """
+        Yield the chunks of `tasks` in order, generating a few ahead in
+        the worker processes when there are any.
+        """
+        if self.processes == 1:
+            yield from map(generate_chunk, tasks)
+            return
+        with multiprocessing.Pool(
+                self.processes, initializer=django.setup) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(generate_chunk, (task,)))
+                if len(pending) > self.processes * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def run(self, users, categories, produce, orders, items_per_order):
+        """
+        Generate the rows in one transaction and return the number of rows
+        per model.
+        """
+        counts = {'users': users, 'categories': categories,
+                  'produce': produce, 'orders': orders}
+        with transaction.atomic():
+            group, _ = Group.objects.get_or_create(name='anonymous')
+            plan = Plan(self.seed, counts, items_per_order, group.pk)
+            tasks = [(plan, kind, number) for kind in GENERATORS
+                     for number in range(
+                         math.ceil(counts[kind] / CHUNK_SIZE))]
+            for chunk in self.generate(tasks):
+                for model, rows in chunk:
+                    get_table(model).insert(rows, self.batch_size)
+                    name = model._meta.verbose_name_plural
+                    self.counts[name] = self.counts.get(name, 0) + len(rows)
+            reset = connection.ops.sequence_reset_sql(no_style(), list(
+                COLUMNS))
+            with connection.cursor() as cursor:
+                for sql in reset:
+                    cursor.execute(sql)
+        for name, count in self.counts.items():
+            self.log('%d %s' % (count, name))
+        return self.counts
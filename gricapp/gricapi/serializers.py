@@ -1,9 +1,15 @@
 """ Serializers """
+from contextlib import contextmanager
 
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from .managers import InsufficientStock, EXPIRED
 from .models import (
     User, Group, Profile, Produce, Category, Order, OrderItem
 )
+from .tasks import enqueue, ORDER_ITEMS_UPDATED
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 
@@ -17,7 +23,8 @@ class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ("gender", "address", "phone_number",
-                  "is_farmer", "is_investor")
+                  "is_farmer", "is_investor", "latitude", "longitude")
+        read_only_fields = ("latitude", "longitude")
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -95,13 +102,13 @@ class ProduceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Produce
         fields = (
-            "id", "owner", "produce_name",
+            "id", "slug", "owner", "produce_name",
             "produce_category", "stock",
             "measurement_unit", "price_tag",
             "product_description",
             "image_url", "date_created"
         )
-        read_only_fields = ("date_created",)
+        read_only_fields = ("slug", "date_created",)
 
     def update(self, instance, validated_data):
         category = validated_data.pop('produce_category')
@@ -112,7 +119,7 @@ class ProduceSerializer(serializers.ModelSerializer):
 
         produce.produce_name = validated_data.get(
             'produce_name', produce.produce_name)
-        produce.stock = validated_data.get('stock', produce.stock)
+        stock = validated_data.pop('stock', produce.stock)
         produce.measurement_unit = validated_data.get(
             'measurement_unit', produce.measurement_unit)
         produce.price_tag = validated_data.get(
@@ -127,10 +134,100 @@ class ProduceSerializer(serializers.ModelSerializer):
         produce.date_modified = date_modified
         new_category = Category.objects.get(category_name=category)
         produce.produce_category = new_category
+        for attr, value in validated_data.items():
+            setattr(produce, attr, value)
+
+        with transaction.atomic():
+            # the stock moves by the difference from the stock read, so
+            # the reservations made since are kept
+            difference = stock - produce.stock
+            try:
+                if difference > 0:
+                    Produce.objects.release({produce.pk: difference})
+                elif difference < 0:
+                    Produce.objects.reserve({produce.pk: -difference})
+            except InsufficientStock:
+                raise serializers.ValidationError({
+                    'stock': 'Not enough stock left, some was ordered '
+                             'meanwhile.'})
+            produce.save(update_fields=[
+                field.name for field in Produce._meta.concrete_fields
+                if field.name not in ('id', 'stock', 'date_created')])
+            produce.refresh_from_db(fields=['stock'])
 
-        produce.save()
+        return produce
 
-        return super().update(instance, validated_data)
+
+class BulkSlugRelatedField(serializers.SlugRelatedField):
+    """
+    Slug field which resolves the slug from the rows the parent
+    `ProduceImportListSerializer` fetched in bulk, when there are any.
+    """
+
+    def to_internal_value(self, data):
+        list_serializer = getattr(self.parent, 'parent', None)
+        rows = getattr(list_serializer, 'related_in_bulk', {}).get(
+            self.field_name)
+        if rows is None or not isinstance(data, str):
+            return super().to_internal_value(data)
+        if data not in rows:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+        if rows[data] is None:
+            self.fail('invalid')
+        return rows[data]
+
+
+class ProduceImportListSerializer(serializers.ListSerializer):
+    """
+    Validates a list of produce, fetching all the owners and categories
+    it names with a single query each, and inserts them in batches of
+    `API_IMPORT_BATCH_SIZE`.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            names = {'owner': set(), 'produce_category': set()}
+            for row in data:
+                for field_name, found in names.items():
+                    value = row.get(field_name) \
+                        if isinstance(row, dict) else None
+                    if isinstance(value, str):
+                        found.add(value)
+            categories = {}
+            for category in Category.objects.filter(
+                    category_name__in=names['produce_category']):
+                # a name shared by several categories names none of them
+                name = category.category_name
+                categories[name] = None if name in categories else category
+            self.related_in_bulk = {
+                'owner': User.objects.in_bulk(
+                    names['owner'], field_name='email'),
+                'produce_category': categories,
+            }
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        rows = [Produce(**attrs) for attrs in validated_data]
+        return Produce.objects.bulk_import(
+            rows, settings.API_IMPORT_BATCH_SIZE)
+
+
+class ProduceImportSerializer(ProduceSerializer):
+    """
+    Serializes a row of a produce import, see
+    `ProduceImportListSerializer`.
+    """
+    owner = BulkSlugRelatedField(
+        queryset=User.objects.all(),
+        slug_field='email'
+    )
+    produce_category = BulkSlugRelatedField(
+        queryset=Category.objects.all(),
+        slug_field='category_name'
+    )
+
+    class Meta(ProduceSerializer.Meta):
+        list_serializer_class = ProduceImportListSerializer
 
 
 class ProduceDetailSerializer(serializers.ModelSerializer):
@@ -202,11 +299,46 @@ class CategoryProduceSerializer(serializers.ModelSerializer):
         return self.instance
 
 
+class ProduceKeyField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field for produce which resolves the key from the rows
+    the parent `ItemBulkSerializer` fetched in bulk, when there are any.
+    """
+
+    def to_internal_value(self, data):
+        list_serializer = getattr(self.parent, 'parent', None)
+        produce = getattr(list_serializer, 'produce_in_bulk', {})
+        try:
+            return produce[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class ItemBulkSerializer(serializers.ListSerializer):
+    """
+    Fetches all the produce referenced by a list of items with a single
+    `in_bulk` query before validating the items one by one.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            keys = set()
+            for item in data:
+                try:
+                    keys.add(int(item.get('produce')))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+            self.produce_in_bulk = Produce.objects.in_bulk(keys)
+        return super().to_internal_value(data)
+
+
 class ItemSerializer(serializers.ModelSerializer):
+    produce = ProduceKeyField(queryset=Produce.objects.all())
 
     class Meta:
         model = OrderItem
         fields = ('item_id', 'produce', 'quantity_ordered')
+        list_serializer_class = ItemBulkSerializer
 
 
 class ItemListSerializer(serializers.ModelSerializer):
@@ -236,20 +368,30 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             'id', 'consumer', 'items'
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         items = validated_data.pop('items', False)
         instance = self.instance
         instance = Order.objects.create(**validated_data)
         if items:
-            for item in items:
-                OrderItem.objects.create(
-                    order=instance,
-                    **item
-                )
+            with self.stock_errors(items):
+                OrderItem.objects.bulk_add(instance, items)
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items = validated_data.pop('items', None)
+        # lock the order so a concurrent release of its stock, by its
+        # deletion or expiry, waits for this update, then check it is
+        # still open
+        order_status = Order.objects.select_for_update().filter(
+            pk=instance.pk).values_list('order_status', flat=True).first()
+        if order_status is None:
+            raise NotFound()
+        if order_status == EXPIRED:
+            raise serializers.ValidationError({
+                'order_status': 'This order has expired.',
+            })
         new_date = serializers.DateTimeField(
             default=serializers.CreateOnlyDefault(timezone.now)
         )
@@ -257,12 +399,27 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         instance.save()
 
         if items is not None:
-            instance.items.all().delete()
-            for item in items:
-                instance.items.create(**item)
+            with self.stock_errors(items):
+                OrderItem.objects.bulk_replace(instance, items)
+            # bulk writes send no signals
+            enqueue(ORDER_ITEMS_UPDATED, order_pk=instance.pk)
 
         return super().update(instance, validated_data)
 
+    @contextmanager
+    def stock_errors(self, items):
+        """
+        Turn a failed stock reservation into a validation error.
+        """
+        try:
+            yield
+        except InsufficientStock as error:
+            produce = {item['produce'].pk: item['produce'] for item in items}
+            raise serializers.ValidationError({
+                'items': 'Not enough stock of "%s".'
+                         % produce[error.produce_id],
+            })
+
 
 class OrderListSerializer(serializers.ModelSerializer):
     consumer = serializers.SlugRelatedField(
@@ -271,6 +428,7 @@ class OrderListSerializer(serializers.ModelSerializer):
     )
 
     items = ItemListSerializer(many=True, read_only=True)
+    total_cost = serializers.ReadOnlyField()
 
     class Meta:
         model = Order
@@ -0,0 +1,98 @@
+"""
+Signal receivers for GricApp
+"""
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from gricapi.cache import produce_cache
+from gricapi.geo import register_sqlite_functions
+from gricapi.managers import bulk_updated
+from gricapi.models import Category, Order, Produce
+from gricapi.permissions import clear_group_cache
+from gricapi.tasks import (
+    enqueue, ORDER_CREATED, ORDER_DELETED, ORDER_PAID
+)
+
+
+@receiver(connection_created)
+def add_sqlite_functions(sender, connection, **kwargs):
+    # pylint: disable=unused-argument
+    """ Add the SQL functions of the "near me" queries to SQLite """
+    if connection.vendor == 'sqlite':
+        register_sqlite_functions(connection.connection)
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group_cache(sender, **kwargs):
+    # pylint: disable=unused-argument
+    """ Drop the cached group ids whenever a Group changes """
+    clear_group_cache()
+
+
+def invalidate_produce_payloads(pks):
+    produce_cache.invalidate_objects(pks)
+    produce_cache.invalidate_lists()
+
+
+@receiver([post_save, post_delete], sender=Produce)
+def invalidate_produce_cache(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drop the cached payloads showing a changed produce once the change is
+    committed, so a read in between does not cache the old row again
+    """
+    pks = [instance.pk]
+    transaction.on_commit(lambda: invalidate_produce_payloads(pks))
+
+
+@receiver(post_delete, sender=Produce)
+def forget_produce_slug(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Let a new produce reuse the slug of a deleted one once the delete is
+    committed
+    """
+    slug = instance.slug
+    transaction.on_commit(lambda: produce_cache.forget_slug(slug))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_produce_cache(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drop the cached payloads of produce showing a changed category once
+    the change is committed
+    """
+    pks = list(Produce.objects.filter(produce_category=instance).values_list(
+        'pk', flat=True))
+    transaction.on_commit(lambda: invalidate_produce_payloads(pks))
+
+
+@receiver(bulk_updated, sender=Produce)
+def invalidate_bulk_updated_cache(sender, pks, **kwargs):
+    # pylint: disable=unused-argument
+    """ Drop the cached payloads of produce updated in bulk """
+    invalidate_produce_payloads(pks)
+
+
+@receiver(post_save, sender=Order)
+def queue_order_saved_tasks(sender, instance, created, **kwargs):
+    # pylint: disable=unused-argument
+    """ Queue the side effects of a new order, or of one becoming paid """
+    if created:
+        enqueue(ORDER_CREATED, order_pk=instance.pk)
+    elif instance.paid and getattr(
+            instance, 'paid_when_loaded', None) is False:
+        enqueue(ORDER_PAID, order_pk=instance.pk)
+    instance.paid_when_loaded = instance.paid
+
+
+@receiver(post_delete, sender=Order)
+def queue_order_deleted_tasks(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """ Queue the side effects of a deleted order """
+    enqueue(ORDER_DELETED, order_pk=instance.pk,
+            consumer_pk=instance.consumer_id)
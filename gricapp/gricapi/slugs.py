@@ -0,0 +1,75 @@
+"""
+Slugs of produce and categories.
+
+A slug is derived from the name and a marker ("pro" or "cat") and made
+unique with the lowest free `-<n>` suffix before the row is written.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from django.template.defaultfilters import slugify
+
+# characters kept free for the suffix
+SUFFIX_LENGTH = 11
+
+
+def get_slug_base(instance, name, marker):
+    """
+    Return the slug `instance` should be saved under before suffixing,
+    or None when its slug is kept as is. A missing slug, or one without
+    `marker`, is derived from `name`; a new row keeps the slug it was
+    given but must not reuse one already taken.
+    """
+    if instance.slug and marker in instance.slug:
+        if instance.pk is not None and not instance._state.adding:
+            return None
+        return instance.slug
+    return slugify('%s-%s' % (name, marker))
+
+
+def unique_slug(instance, base):
+    """
+    Return `base`, suffixed with the lowest free `-<n>` when another row
+    already uses it. Taken candidates are read with a single prefix
+    lookup on the indexed `slug` column.
+    """
+    max_length = instance._meta.get_field('slug').max_length
+    base = base[:max_length - SUFFIX_LENGTH]
+    queryset = type(instance)._default_manager.filter(slug__startswith=base)
+    if instance.pk is not None:
+        queryset = queryset.exclude(pk=instance.pk)
+    taken = set(queryset.values_list('slug', flat=True))
+    slug, suffix = base, 1
+    while slug in taken:
+        suffix += 1
+        slug = '%s-%d' % (base, suffix)
+    return slug
+
+
+def unique_slugs(model, bases):
+    """
+    Return a slug for each of `bases`, suffixed like `unique_slug` so
+    that none is taken nor repeated, reading the taken candidates with
+    a single query.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [base[:max_length - SUFFIX_LENGTH] for base in bases]
+    if not bases:
+        return []
+    condition = reduce(or_, (Q(slug__startswith=base) for base in set(bases)))
+    taken = set(model._default_manager.filter(condition).values_list(
+        'slug', flat=True))
+    suffixes = {}
+    slugs = []
+    for base in bases:
+        slug, suffix = base, suffixes.get(base, 1)
+        if suffix > 1:
+            slug = '%s-%d' % (base, suffix)
+        while slug in taken:
+            suffix += 1
+            slug = '%s-%d' % (base, suffix)
+        suffixes[base] = suffix
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
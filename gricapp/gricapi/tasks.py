@@ -0,0 +1,144 @@
+"""
+Background tasks for GricApp
+
+The side effects of the order lifecycle, notifying the parties,
+recomputing stock or paying farmers out, must not lengthen the requests
+causing them. They are registered with `@task(name)` and queued with
+`enqueue(name, **payload)` when the transaction writing the order
+commits, so a rolled back request queues nothing. A queued task is a
+`Task` row run by the run_workers command in as many processes as
+needed. With TASKS_EAGER it runs in the same process right after the
+commit instead, as the tests do.
+
+A task is deleted once it succeeded and retried later when it raised.
+A task whose worker died is run again once its lease expires, or marked
+failed when out of attempts, so tasks run at least once and should be
+safe to run twice.
+"""
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .managers import FAILED, QUEUED
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order.created'
+ORDER_ITEMS_UPDATED = 'order.items_updated'
+ORDER_PAID = 'order.paid'
+ORDER_DELETED = 'order.deleted'
+
+# task functions by name
+TASKS = {}
+
+
+def task(name):
+    """
+    Register the decorated function as the task `name`, called with the
+    payload it was queued with as keyword arguments.
+    """
+    def register(function):
+        if name in TASKS:
+            raise ValueError('Task %r is already registered.' % name)
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, **payload):
+    """
+    Queue the task `name` with the JSON serializable `payload` when the
+    current transaction commits, right away outside of one.
+    """
+    if name not in TASKS:
+        raise ValueError('Unknown task %r.' % name)
+    # serialized now so a bad payload fails the request queuing it
+    payload = json.dumps(payload, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: _queue(name, payload))
+
+
+def _queue(name, payload):
+    if settings.TASKS_EAGER:
+        TASKS[name](**json.loads(payload))
+    else:
+        Task.objects.create(name=name, payload=payload)
+
+
+def run_task(claimed):
+    """
+    Run a task claimed by this worker and delete it, in a transaction.
+    When it raises, queue it again after a delay doubling with every
+    attempt, or mark it failed after TASKS_MAX_ATTEMPTS. Return whether
+    it succeeded.
+    """
+    try:
+        with transaction.atomic():
+            TASKS[claimed.name](**json.loads(claimed.payload))
+            Task.objects.filter(pk=claimed.pk).delete()
+        return True
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Task %s %s failed.', claimed.name, claimed.pk)
+        if claimed.attempts >= settings.TASKS_MAX_ATTEMPTS:
+            changes = {'status': FAILED}
+        else:
+            changes = {'status': QUEUED, 'run_at': timezone.now() + timedelta(
+                seconds=settings.TASKS_RETRY_DELAY * 2 ** (
+                    claimed.attempts - 1))}
+        Task.objects.filter(pk=claimed.pk).update(
+            last_error=traceback.format_exc(), **changes)
+        return False
+
+
+def work(batch_size=10, poll=1.0, burst=False):
+    """
+    Claim and run the due tasks `batch_size` at a time, waiting `poll`
+    seconds whenever none is due, until none is left with `burst` or
+    forever otherwise. Return the numbers of tasks which succeeded and
+    failed.
+    """
+    succeeded = failed = 0
+    while True:
+        # a long running worker must not keep a broken connection
+        close_old_connections()
+        claimed = Task.objects.claim(batch_size, settings.TASKS_LEASE)
+        for row in claimed:
+            if run_task(row):
+                succeeded += 1
+            else:
+                failed += 1
+        if not claimed:
+            if burst:
+                return succeeded, failed
+            time.sleep(poll)
+
+
+# The side effects of the order lifecycle, queued by gricapi.signals and
+# OrderCreateSerializer. They only log the events for now, the
+# notifications, stock recalculations and payouts belong here.
+
+@task(ORDER_CREATED)
+def order_created(order_pk):
+    logger.info('Order %s created.', order_pk)
+
+
+@task(ORDER_ITEMS_UPDATED)
+def order_items_updated(order_pk):
+    logger.info('Order %s items updated.', order_pk)
+
+
+@task(ORDER_PAID)
+def order_paid(order_pk):
+    logger.info('Order %s paid.', order_pk)
+
+
+@task(ORDER_DELETED)
+def order_deleted(order_pk, consumer_pk):
+    logger.info('Order %s of user %s deleted.', order_pk, consumer_pk)
@@ -0,0 +1,212 @@
+""" Test the ASGI serving """
+
+import asyncio
+import io
+import json
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from gricapi.asgi import ASGIHandler, get_environ
+from gricapi.models import User, Category, Produce
+
+
+class EnvironTestCase(SimpleTestCase):
+
+    def test_environ(self):
+        environ = get_environ({
+            'type': 'http', 'method': 'POST', 'path': '/api/v1/café/',
+            'query_string': b'page_size=2', 'server': ('example.com', 443),
+            'client': ('10.0.0.1', 5000), 'scheme': 'https',
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', b'7'),
+                        (b'accept', b'text/csv'),
+                        (b'accept', b'application/json')],
+        }, io.BytesIO(b'{}'))
+        self.assertEqual(environ['PATH_INFO'], '/api/v1/cafÃ©/')
+        self.assertEqual(environ['QUERY_STRING'], 'page_size=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'application/json')
+        self.assertEqual(environ['CONTENT_LENGTH'], '2')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/csv,application/json')
+        self.assertEqual(environ['SERVER_PORT'], '443')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['wsgi.url_scheme'], 'https')
+
+
+class ASGIHandlerTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='farmer@test.com')
+        category = Category.objects.create(category_name='Grains')
+        for index in range(3):
+            Produce.objects.create(
+                produce_name='Maize %d' % index, owner=self.user,
+                produce_category=category, stock=10, price_tag=100)
+        self.token = str(AccessToken.for_user(self.user))
+        self.handler = ASGIHandler(threads=2)
+        self.addCleanup(self.handler.executor.shutdown)
+
+    def request(self, method, path, body=b'', query=b'', content_type=None):
+        """
+        Send a request through the handler, its body in two messages,
+        and return the messages sent back.
+        """
+        headers = [(b'host', b'testserver'),
+                   (b'authorization', ('JWT %s' % self.token).encode())]
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query, 'headers': headers}
+        messages = [
+            {'type': 'http.request', 'body': body[:3], 'more_body': True},
+            {'type': 'http.request', 'body': body[3:]},
+        ]
+        sent = []
+
+        async def receive():
+            if not messages:
+                # the client stays until its response is sent
+                await asyncio.get_event_loop().create_future()
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.handler(scope, receive, send))
+        finally:
+            loop.close()
+        return sent
+
+    def get_body(self, sent):
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertFalse(sent[-1].get('more_body', False))
+        return b''.join(message['body'] for message in sent[1:])
+
+    def wsgi_get(self, path, **params):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT %s' % self.token)
+        cache.clear()
+        return client.get(path, params)
+
+    def test_list_and_retrieve(self):
+        for path in [reverse('api:products-list'),
+                     reverse('api:products-detail',
+                             args=[Produce.objects.first().pk])]:
+            cache.clear()
+            sent = self.request('GET', path)
+            self.assertEqual(sent[0]['status'], 200)
+            self.assertIn((b'content-type', b'application/json'),
+                          sent[0]['headers'])
+            self.assertEqual(json.loads(self.get_body(sent).decode()),
+                             self.wsgi_get(path).json())
+
+    def test_create(self):
+        data = {'owner': self.user.email, 'produce_name': 'Yam',
+                'produce_category': 'Grains', 'stock': 4,
+                'measurement_unit': 'bags', 'price_tag': '12.50'}
+        sent = self.request('POST', reverse('api:products-list'),
+                            json.dumps(data).encode(),
+                            content_type='application/json')
+        self.assertEqual(sent[0]['status'], 201, self.get_body(sent))
+        self.assertTrue(Produce.objects.filter(produce_name='Yam').exists())
+
+    def test_streaming_response(self):
+        path = reverse('api:products-export')
+        with self.settings(API_EXPORT_CHUNK_SIZE=1):
+            sent = self.request('GET', path, query=b'type=ndjson')
+            expected = b''.join(
+                self.wsgi_get(path, type='ndjson').streaming_content)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertGreater(len(sent), 3)
+        self.assertEqual(self.get_body(sent), expected)
+
+    def test_client_left(self):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.handler(
+                {'type': 'http', 'method': 'GET', 'path': '/'},
+                receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(sent, [])
+
+    def test_client_leaving_a_streaming_response(self):
+        category = Category.objects.get()
+        for index in range(30):
+            Produce.objects.create(
+                produce_name='Rice %d' % index, owner=self.user,
+                produce_category=category)
+        scope = {'type': 'http', 'method': 'GET',
+                 'path': reverse('api:products-export'),
+                 'query_string': b'type=ndjson',
+                 'headers': [(b'host', b'testserver'), (
+                     b'authorization', ('JWT %s' % self.token).encode())]}
+        messages = [{'type': 'http.request', 'body': b''}]
+        sent = []
+        loop = asyncio.new_event_loop()
+        left = loop.create_future()
+
+        async def receive():
+            if not messages:
+                await left
+                return {'type': 'http.disconnect'}
+            return messages.pop(0)
+
+        async def send(message):
+            # the server drops what is sent once the client left
+            sent.append(message)
+            if message['type'] == 'http.response.body' and not left.done():
+                left.set_result(None)
+
+        try:
+            with self.settings(API_EXPORT_CHUNK_SIZE=1):
+                loop.run_until_complete(self.handler(scope, receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(sent[0]['status'], 200)
+        # the thread stopped early rather than render all 33 rows
+        self.assertLess(len(sent), 20)
+        self.assertTrue(sent[-1]['more_body'])
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.handler(
+                {'type': 'lifespan'}, receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_asgi', '--clients=4', '--workers=2',
+                     '--latency=0', stdout=out)
+        self.assertIn('ASGI threads', out.getvalue())
+        self.assertFalse(
+            User.objects.filter(email='benchmark@example.com').exists())
@@ -0,0 +1,121 @@
+""" Test the marketplace seeding and the API benchmark """
+
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import TestCase
+
+from gricapi import seeding
+from gricapi.models import (
+    User, Profile, Category, Produce, Order, OrderItem
+)
+
+
+class SeedMarketplaceTestCase(TestCase):
+
+    def seed(self, *args):
+        call_command('seed_marketplace', '--users=4', '--categories=3',
+                     '--produce=30', '--orders=5', '--items-per-order=2',
+                     '--batch-size=7', *args, stdout=io.StringIO())
+
+    def test_rows(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Profile.objects.filter(is_farmer=True).count(), 1)
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Produce.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 5)
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total_cost,
+                             sum(item.price for item in order.items.all()))
+        # the sequences continue after the seeded rows
+        last_item = OrderItem.objects.latest('pk').pk
+        order = Order.objects.create(consumer=User.objects.first())
+        item = OrderItem.objects.create(order=order,
+                                        produce=Produce.objects.first())
+        self.assertEqual(item.pk, last_item + 1)
+
+    def test_seeds_add_distinct_rows(self):
+        self.seed()
+        self.seed('--seed=1')
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(
+            Produce.objects.values('slug').distinct().count(), 60)
+
+    def test_a_seed_is_used_once(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(User.objects.count(), 4)
+
+    def get_rows(self, *args):
+        with transaction.atomic():
+            self.seed(*args)
+            rows = [list(Produce.objects.values_list(
+                        'slug', 'owner', 'produce_category', 'stock',
+                        'price_tag').order_by('pk')),
+                    list(OrderItem.objects.values_list(
+                        'item_id', 'order', 'produce', 'quantity_ordered',
+                        'price').order_by('pk')),
+                    list(Profile.objects.values_list(
+                        'user', 'address', 'geohash').order_by('pk'))]
+            transaction.set_rollback(True)
+        return rows
+
+    @mock.patch.object(seeding, 'CHUNK_SIZE', 4)
+    def test_rows_do_not_depend_on_processes(self):
+        rows = self.get_rows()
+        self.assertEqual(self.get_rows('--processes=2', '--batch-size=3'),
+                         rows)
+        self.assertNotEqual(self.get_rows('--seed=1'), rows)
+
+
+class BenchmarkAPITestCase(TestCase):
+
+    def setUp(self):
+        call_command('seed_marketplace', '--users=3', '--categories=2',
+                     '--produce=20', '--orders=3', stdout=io.StringIO())
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def benchmark(self, *args):
+        out = io.StringIO()
+        call_command('benchmark_api', '--iterations=2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_baseline(self):
+        counts = Produce.objects.count(), Order.objects.count()
+        out = self.benchmark('--save-baseline=%s' % self.path)
+        self.assertIn('shopping-update', out)
+        # the rows written by the scenarios are rolled back
+        self.assertEqual(
+            (Produce.objects.count(), Order.objects.count()), counts)
+
+        with open(self.path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.assertEqual(
+            set(baseline['products-list']),
+            {'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'alloc_kib'})
+
+        baseline = {'products-list': dict(
+            baseline['products-list'], p50_ms=10 ** 6, p95_ms=10 ** 6,
+            p99_ms=10 ** 6, alloc_kib=10 ** 6)}
+        with open(self.path, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        out = self.benchmark('--baseline=%s' % self.path,
+                             '--scenario=products-list')
+        self.assertIn('No regression', out)
+
+        baseline['products-list']['queries'] -= 1
+        with open(self.path, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'products-list queries'):
+            self.benchmark('--baseline=%s' % self.path,
+                           '--scenario=products-list')
@@ -0,0 +1,155 @@
+""" Test the geocoding of profiles and the "near me" produce queries """
+
+import random
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+
+from gricapi.geo import (
+    distance, encode_geohash, geocode, nearest_produce, _nearest_geohash
+)
+from gricapi.models import User, Profile, Category, Produce
+
+
+def make_farmer(email, address, category, produce_name):
+    user = User.objects.create(email=email)
+    Profile.objects.create(user=user, address=address, is_farmer=True)
+    return Produce.objects.create(
+        produce_name=produce_name, produce_category=category, owner=user)
+
+
+class GeoTestCase(TestCase):
+
+    def test_geocode_uses_the_first_town_named(self):
+        self.assertEqual(geocode("12 Allen Avenue, Ikeja, Lagos"),
+                         (6.6018, 3.3515))
+        self.assertEqual(geocode("Plot 4, Port-Harcourt"), (4.8156, 7.0498))
+        self.assertIsNone(geocode("23, nintendo world"))
+        self.assertIsNone(geocode(None))
+
+    def test_encode_geohash(self):
+        self.assertEqual(encode_geohash(42.6, -5.6, 5), "ezs42")
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11),
+                         "u4pruydqqvj")
+
+    def test_profile_is_geocoded_on_save(self):
+        user = User.objects.create(email="farmer@test.com")
+        profile = Profile.objects.create(user=user, address="Kano")
+        self.assertEqual((profile.latitude, profile.longitude),
+                         (12.0022, 8.5920))
+        self.assertEqual(profile.geohash, encode_geohash(12.0022, 8.5920))
+        profile.address = "somewhere else"
+        profile.save()
+        self.assertIsNone(profile.latitude)
+        self.assertEqual(profile.geohash, "")
+
+
+class NearestProduceTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(category_name="Grains")
+        rng = random.Random(96)
+        for index in range(60):
+            produce = make_farmer("farmer%s@test.com" % index, None, category,
+                                  "Maize %s" % index)
+            # scatter the farmers around Lagos and a few far away
+            spread = 0.5 if index % 6 else 20
+            latitude = 6.5 + rng.uniform(-spread, spread)
+            longitude = 3.4 + rng.uniform(-spread, spread)
+            Profile.objects.filter(user=produce.owner).update(
+                latitude=latitude, longitude=longitude,
+                geohash=encode_geohash(latitude, longitude))
+        make_farmer("nowhere@test.com", "nowhere", category, "Rice")
+
+    def brute_force(self, latitude, longitude, radius=None):
+        rows = []
+        for produce in Produce.objects.filter(
+                owner__profile__latitude__isnull=False).select_related(
+                    'owner__profile'):
+            profile = produce.owner.profile
+            rows.append((distance(latitude, longitude, profile.latitude,
+                                  profile.longitude), produce.pk))
+        return [pk for km, pk in sorted(rows)
+                if radius is None or km <= radius]
+
+    def test_geohash_search_matches_brute_force(self):
+        for latitude, longitude, limit, radius in [
+                (6.5, 3.4, 10, None), (6.6, 3.3, 50, None),
+                (7.4, 3.9, 5, None), (6.5, 3.4, 50, 30),
+                (-1.3, 36.8, 3, None), (6.5, 3.4, 100, None)]:
+            found = _nearest_geohash(Produce.objects.all(), latitude,
+                                     longitude, limit, radius)
+            self.assertEqual(
+                [row.pk for row in found],
+                self.brute_force(latitude, longitude, radius)[:limit])
+
+    def test_nearest_produce_reads_the_cells_around_the_point(self):
+        with CaptureQueriesContext(connection) as queries:
+            found = nearest_produce(Produce.objects.all(), 6.5, 3.4, 3)
+        self.assertEqual(len(found), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 3', queries[0]['sql'])
+
+    def test_nearest_produce_stops_at_the_widest_block(self):
+        far = make_farmer("far@test.com", None, Category.objects.get(),
+                          "Taro")
+        Profile.objects.filter(user=far.owner).update(
+            latitude=-40, longitude=170, geohash=encode_geohash(-40, 170))
+        # the queries of the blocks are all limited, none reads the table
+        with CaptureQueriesContext(connection) as queries:
+            found = _nearest_geohash(Produce.objects.all(), 50, 3.4, 100,
+                                     radius=None)
+        # the widest block around 50N starts at the equator
+        self.assertEqual(len(found), Produce.objects.filter(
+            owner__profile__latitude__gte=0).count())
+        self.assertNotIn(far, found)
+        for query in queries:
+            self.assertIn('"geohash" >=', query['sql'])
+            self.assertIn('LIMIT 100', query['sql'])
+
+
+class NearbyAPITestCase(APITestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        category = Category.objects.create(category_name="Grains")
+        self.lagos = make_farmer("lagos@test.com", "Lagos", category,
+                                 "Maize")
+        self.ibadan = make_farmer("ibadan@test.com", "Ring Road, Ibadan",
+                                  category, "Rice")
+        self.nairobi = make_farmer("nairobi@test.com", "Nairobi", category,
+                                   "Beans")
+        self.user = User.objects.create(groups=group, email="buyer@test.com")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("api:products-nearby")
+
+    def test_nearby_uses_the_profile_address(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Profile.objects.create(user=self.user, address="Ikeja")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["produce_name"] for row in response.json()],
+                         ["Maize", "Rice", "Beans"])
+        distances = [row["distance"] for row in response.json()]
+        self.assertEqual(distances, sorted(distances))
+        self.assertLess(distances[0], 10)
+
+    def test_nearby_a_point_within_a_radius(self):
+        response = self.client.get(self.url, {
+            "latitude": -1.3, "longitude": 36.8, "radius": 200})
+        self.assertEqual([row["produce_name"] for row in response.json()],
+                         ["Beans"])
+        response = self.client.get(self.url, {
+            "latitude": 7.3, "longitude": 3.9, "page_size": 1})
+        self.assertEqual([row["produce_name"] for row in response.json()],
+                         ["Rice"])
+        response = self.client.get(self.url, {"latitude": 100,
+                                              "longitude": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
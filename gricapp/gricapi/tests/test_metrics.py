@@ -0,0 +1,82 @@
+""" Test the request instrumentation """
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+
+from gricapi.metrics import (
+    METRICS, get_sql_shape, repeated_queries, serialize_duration
+)
+from gricapi.models import User, Profile, Category, Produce
+
+
+class SQLShapeTestCase(SimpleTestCase):
+
+    def test_values_are_masked(self):
+        self.assertEqual(
+            get_sql_shape('SELECT "a"."id" FROM "a" WHERE "a"."id" IN '
+                          '(%s, %s, %s) LIMIT 21'),
+            get_sql_shape('SELECT "a"."id" FROM "a" WHERE "a"."id" IN '
+                          '(%s) LIMIT 2'))
+
+
+class RequestMetricsTestCase(APITestCase):
+
+    def setUp(self):
+        for metric in METRICS:
+            metric.clear()
+        cache.clear()
+        self.group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create(groups=self.group,
+                                        email="farmer@test.com")
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(category_name="Grains")
+        Produce.objects.create(produce_name="Maize", owner=self.user,
+                               produce_category=category)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("api:products-list"))
+        names = [timing.split(";")[0] for timing in
+                 response["Server-Timing"].split(", ")]
+        self.assertEqual(names, ["db", "serialize", "render", "total"])
+        total, = [line for line in serialize_duration.collect()
+                  if line.startswith("gricapi_serialize_duration_seconds_sum")]
+        self.assertGreater(float(total.split()[-1]), 0)
+
+    def test_metrics_are_admin_only(self):
+        self.client.get(reverse("api:products-list"))
+        url = reverse("api:metrics")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.groups = Group.objects.create(name='admin')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode("utf-8")
+        self.assertIn("# TYPE gricapi_request_duration_seconds histogram",
+                      body)
+        self.assertIn('gricapi_request_queries_count{basename="products",'
+                      'action="list"} 1', body)
+        self.assertIn('gricapi_serialize_duration_seconds_count{'
+                      'basename="products",action="list"} 1', body)
+        self.assertIn('gricapi_cache_requests_total{namespace="produce",'
+                      'result="miss"}', body)
+
+    @override_settings(API_N_PLUS_ONE_THRESHOLD=2)
+    def test_repeated_queries_are_reported(self):
+        for index in range(4):
+            user = User.objects.create(groups=self.group,
+                                       email="user%s@test.com" % index)
+            Profile.objects.create(user=user)
+        with self.assertLogs("gricapi.metrics", "WARNING") as logs:
+            # the profile of every user is read on its own
+            self.client.get(reverse("api:user-profile-list"))
+        self.assertIn("Possible N+1 queries: GET /api/v1/users/",
+                      logs.output[0])
+        self.assertIn(
+            'gricapi_repeated_queries_total{basename="user-profile",'
+            'action="list"} 1', list(repeated_queries.collect()))
@@ -2,6 +2,10 @@
 Create test cases for GricApp
 """
 
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.db import IntegrityError
 from gricapi.models import (
@@ -150,6 +154,35 @@ class ProduceSaveTest(TestCase):
         self.assertEqual(prod.id, self.id)
         self.assertNotEqual(prod.slug, "")
 
+    def test_slug_is_written_with_the_insert(self):
+        with self.assertNumQueries(4):
+            # slug lookup, savepoint, insert, savepoint release
+            prod = Produce.objects.create(
+                produce_name=self.produce_name,
+                produce_category=self.category,
+                owner=self.owner
+            )
+        prod.refresh_from_db()
+        self.assertEqual(prod.slug, "berry-pro")
+
+    def test_slug_gets_the_lowest_free_suffix(self):
+        slugs = [
+            Produce.objects.create(
+                produce_name=self.produce_name,
+                produce_category=self.category,
+                owner=self.owner
+            ).slug
+            for _ in range(3)
+        ]
+        self.assertEqual(slugs, ["berry-pro", "berry-pro-2", "berry-pro-3"])
+        Produce.objects.filter(slug="berry-pro-2").delete()
+        prod = Produce.objects.create(
+            produce_name=self.produce_name,
+            produce_category=self.category,
+            owner=self.owner
+        )
+        self.assertEqual(prod.slug, "berry-pro-2")
+
 
 class UserModelTestCase(TestCase):
     """ This class defines the test suite for User model """
@@ -279,6 +312,43 @@ class OrderTest(TestCase):
         self.assertEqual(order_item.price, 15*self.produce.price_tag)
         self.assertIsNotNone(self.order.total_cost)
 
+    def test_order_total_is_kept_up_to_date(self):
+        self.produce.price_tag = 10
+        self.produce.save()
+        item = OrderItem.objects.create(
+            order=self.order, produce=self.produce, quantity_ordered=3)
+        OrderItem.objects.create(
+            order=self.order, produce=self.produce, quantity_ordered=1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_cost, 40)
+        item.quantity_ordered = 5
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_cost, 60)
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_cost, 10)
+        # saving a stale order does not overwrite the stored total
+        stale = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.create(
+            order=self.order, produce=self.produce, quantity_ordered=1)
+        stale.paid = True
+        stale.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_cost, 20)
+        self.assertTrue(self.order.paid)
+
+    def test_sync_order_totals_command(self):
+        OrderItem.objects.create(
+            order=self.order, produce=self.produce, quantity_ordered=2)
+        Order.objects.update(total_cost=999)
+        with self.assertRaises(CommandError):
+            call_command('sync_order_totals', '--check', stdout=StringIO())
+        call_command('sync_order_totals', stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_cost, 2 * self.produce.price_tag)
+        call_command('sync_order_totals', '--check', stdout=StringIO())
+
 
 class OrderItemTest(TestCase):
 
@@ -0,0 +1,60 @@
+""" Test the permission classes """
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from gricapi.models import User, Category, Produce
+from gricapi.permissions import (
+    IsAdminUser, IsOwnerOrAdmin, IsAdminOrAnonymousUser, get_group_ids
+)
+
+
+class GroupPermissionTestCase(TestCase):
+
+    def setUp(self):
+        self.anonymous = Group.objects.create(name='anonymous')
+        self.admin = Group.objects.create(name='admin')
+        self.user = User.objects.create(
+            groups=self.anonymous, email="farmer@example.com")
+        self.staff = User.objects.create(
+            groups=self.admin, email="staff@example.com")
+        category = Category.objects.create(category_name="Fruits")
+        self.produce = Produce.objects.create(
+            produce_name="Mango", produce_category=category,
+            owner=self.user)
+
+    def get_request(self, user):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        return request
+
+    def test_group_membership_is_resolved(self):
+        self.assertTrue(
+            IsAdminUser().has_permission(self.get_request(self.staff), None))
+        self.assertFalse(
+            IsAdminUser().has_permission(self.get_request(self.user), None))
+        self.assertTrue(IsAdminOrAnonymousUser().has_permission(
+            self.get_request(self.user), None))
+
+    def test_permission_checks_run_no_queries_once_warm(self):
+        get_group_ids()
+        request = self.get_request(self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsOwnerOrAdmin().has_object_permission(
+                request, None, self.produce))
+            self.assertFalse(IsAdminUser().has_permission(request, None))
+            self.assertFalse(
+                IsAdminUser().has_object_permission(
+                    request, None, self.produce))
+
+    def test_group_cache_is_invalidated_on_group_changes(self):
+        self.assertIn('admin', get_group_ids())
+        self.admin.name = 'staff'
+        self.admin.save()
+        self.assertNotIn('admin', get_group_ids())
+        self.assertFalse(
+            IsAdminUser().has_permission(self.get_request(self.staff), None))
+        self.anonymous.delete()
+        self.assertNotIn('anonymous', get_group_ids())
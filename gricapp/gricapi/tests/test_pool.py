@@ -0,0 +1,132 @@
+""" Test the database connection pool """
+
+import io
+import threading
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from gricapi.pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(self.connect, max_size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual((pool.size, pool.idle), (2, 0))
+        pool.release(second)
+        pool.close_idle()
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_max_size(self):
+        pool = ConnectionPool(self.connect, max_size=1, timeout=0.01)
+        connection = pool.acquire()
+        with self.assertRaises(PoolExhausted):
+            pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [connection])
+        timer.start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+
+    def test_broken_connections_are_replaced(self):
+        pool = ConnectionPool(
+            self.connect, max_size=1,
+            check=lambda connection: not connection.closed,
+            reset=lambda connection: connection is not self.opened[0])
+        first = pool.acquire()
+        pool.release(first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.size, 0)
+
+        second = pool.acquire()
+        pool.release(second)
+        second.closed = True
+        third = pool.acquire()
+        self.assertIsNot(third, second)
+        self.assertEqual(pool.size, 1)
+
+    def test_idle_connections_expire(self):
+        pool = ConnectionPool(self.connect, max_size=1, max_idle=0)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertTrue(first.closed)
+
+    def test_failed_connect_frees_its_slot(self):
+        def connect():
+            raise OSError('refused')
+        pool = ConnectionPool(connect, max_size=1, timeout=0)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.acquire()
+        self.assertEqual(pool.size, 0)
+
+
+class BenchmarkConnectionsTestCase(TestCase):
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('benchmark_connections', '--requests=3', stdout=out)
+        self.assertIn('new connection per request', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+class PostgreSQLPoolTestCase(SimpleTestCase):
+
+    def test_session_state_is_discarded(self):
+        # pylint: disable=import-outside-toplevel
+        from gricapi.backends.postgresql.base import _reset
+        params = connection.get_connection_params()
+        pool = ConnectionPool(
+            lambda: connection.Database.connect(**params), max_size=1,
+            reset=_reset)
+        self.addCleanup(pool.close_idle)
+        raw = pool.acquire()
+        raw.autocommit = False
+        with raw.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute('CREATE TEMPORARY TABLE scratch (id int)')
+            cursor.execute('SELECT pg_advisory_lock(1)')
+            raw.commit()
+            # left inside a transaction
+            cursor.execute('SELECT 1')
+        pool.release(raw)
+
+        self.assertIs(pool.acquire(), raw)
+        self.assertTrue(raw.autocommit)
+        with raw.cursor() as cursor:
+            cursor.execute('SHOW enable_seqscan')
+            self.assertEqual(cursor.fetchone()[0], 'on')
+            cursor.execute("SELECT to_regclass('pg_temp.scratch')")
+            self.assertIsNone(cursor.fetchone()[0])
+            cursor.execute(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                "AND pid = pg_backend_pid()")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        pool.release(raw)
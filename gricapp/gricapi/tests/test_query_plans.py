@@ -0,0 +1,117 @@
+"""
+Query plan regression tests for the marketplace filters.
+
+Each case runs `EXPLAIN` for a query the endpoints rely on and fails when
+the database stops answering it from an index, e.g. because an index was
+dropped or a filter changed shape. Both SQLite and PostgreSQL are checked,
+the case for the database not in use is skipped.
+"""
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+
+from gricapi.models import User, Category, Produce, Order, OrderItem
+from gricapi.geo import _postgresql_knn
+from gricapi.search import FTS_TABLE, _postgresql_matches, _sqlite_matches
+
+
+class QueryPlanTestCase(TestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create(groups=group, email="plan@test.com")
+        self.category = Category.objects.create(category_name="Grains")
+        self.produce = Produce.objects.create(
+            produce_name="Maize", produce_category=self.category,
+            price_tag=100, owner=self.user)
+        self.order = Order.objects.create(consumer=self.user)
+        OrderItem.objects.create(order=self.order, produce=self.produce)
+
+    def explain(self, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # the test tables are tiny, make the planner show whether an
+        # index is usable at all rather than what is cheapest here, for
+        # this query only
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index_name, ordered=False):
+        plan = self.explain(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX %s' % index_name, plan)
+            if ordered:
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertIn(index_name, plan)
+            self.assertNotIn('Seq Scan on %s' % queryset.model._meta.db_table,
+                             plan)
+            if ordered:
+                self.assertNotIn('Sort Key', plan)
+        else:
+            self.skipTest('No plan expectations for %s' % connection.vendor)
+
+    def test_produce_by_category_and_price(self):
+        queryset = Produce.objects.filter(
+            produce_category=self.category, price_tag__lte=500
+        ).order_by('price_tag')
+        self.assertUsesIndex(queryset, 'produce_category_price_idx',
+                             ordered=True)
+
+    def test_produce_by_owner_newest_first(self):
+        queryset = Produce.objects.filter(
+            owner=self.user).order_by('-date_created')
+        self.assertUsesIndex(queryset, 'produce_owner_created_idx',
+                             ordered=True)
+
+    def test_produce_catalog_page(self):
+        queryset = Produce.objects.order_by('-date_created', '-id')[:100]
+        self.assertUsesIndex(queryset, 'produce_created_id_idx',
+                             ordered=True)
+
+    def test_orders_by_consumer_newest_first(self):
+        queryset = Order.objects.filter(
+            consumer=self.user).order_by('-transaction_date')
+        self.assertUsesIndex(queryset, 'order_consumer_date_idx',
+                             ordered=True)
+
+    def test_order_items_by_status(self):
+        queryset = OrderItem.objects.filter(
+            order=self.order, status='pending')
+        self.assertUsesIndex(queryset, 'orderitem_order_status_idx')
+
+    def test_produce_search(self):
+        if connection.vendor == 'sqlite':
+            plan = self.explain(_sqlite_matches(Produce.objects.all(),
+                                                ['maize']))
+            self.assertIn('SCAN %s VIRTUAL TABLE INDEX' % FTS_TABLE, plan)
+            self.assertIn('USING INTEGER PRIMARY KEY', plan)
+        else:
+            self.assertUsesIndex(
+                _postgresql_matches(Produce.objects.all(), ['maize']),
+                'produce_search_vector_idx')
+
+    def test_produce_near_a_point(self):
+        if connection.vendor == 'sqlite':
+            queryset = Produce.objects.filter(
+                owner__profile__geohash__gte='s0',
+                owner__profile__geohash__lt='s0~')
+            plan = self.explain(queryset)
+            self.assertIn('USING INDEX profile_geohash_idx', plan)
+            self.assertNotIn('SCAN gricapi_produce', plan)
+        else:
+            self.assertUsesIndex(
+                _postgresql_knn(Produce.objects.all(), 6.5, 3.4)[:50],
+                'profile_earth_idx', ordered=True)
+
+    def test_planner_settings_are_restored(self):
+        self.explain(Produce.objects.all())
+        if connection.vendor != 'postgresql':
+            self.skipTest('Only PostgreSQL plans are tuned')
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW enable_seqscan')
+            self.assertEqual(cursor.fetchone()[0], 'on')
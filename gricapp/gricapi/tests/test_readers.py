@@ -0,0 +1,116 @@
+""" Test that the compiled readers render exactly like the serializers """
+
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from gricapi.models import User, Category, Produce, Order, OrderItem
+from gricapi.queries import plan_queryset
+from gricapi.readers import get_reader
+from gricapi.serializers import (
+    UserSerializer, ProduceSerializer, CategoryProduceSerializer,
+    OrderListSerializer, ItemListSerializer
+)
+from gricapi.views import ProduceViewSet, OrderViewSet
+
+
+def make_marketplace():
+    group = Group.objects.create(name='anonymous')
+    farmer = User.objects.create(groups=group, email="farmer@test.com")
+    buyer = User.objects.create(groups=group, email="buyer@test.com")
+    grains = Category.objects.create(category_name="Grains")
+    fruits = Category.objects.create(category_name="Fruits")
+    produce = [
+        Produce.objects.create(
+            produce_name="Maize", produce_category=grains, owner=farmer,
+            price_tag=Decimal("1250.50"), stock=7, measurement_unit="tonnes",
+            product_description="Dry yellow maize",
+            image_url="https://example.com/maize.png"),
+        Produce.objects.create(
+            produce_name="Mango", produce_category=fruits, owner=buyer,
+            price_tag=Decimal("80"), stock=20,
+            measurement_unit="units", product_description=None),
+        Produce.objects.create(
+            produce_name="Rice", produce_category=grains, owner=farmer,
+            price_tag=Decimal("3"), stock=20),
+    ]
+    for consumer, quantities in [(buyer, [2, 1, 5]), (farmer, []),
+                                 (buyer, [4, 3])]:
+        order = Order.objects.create(consumer=consumer)
+        if quantities:
+            OrderItem.objects.bulk_add(order, [
+                {'produce': produce[index], 'quantity_ordered': quantity}
+                for index, quantity in reversed(list(enumerate(quantities)))
+            ])
+    OrderItem.objects.filter(quantity_ordered=1).update(status="released")
+    return buyer
+
+
+class RowReaderTestCase(TestCase):
+
+    def setUp(self):
+        make_marketplace()
+
+    def assertRendersLikeSerializer(self, serializer_class, queryset):
+        reader = get_reader(serializer_class, queryset.model)
+        self.assertIsNotNone(reader)
+        expected = serializer_class(
+            plan_queryset(queryset, serializer_class), many=True).data
+        rows = reader.values(queryset)
+        self.assertEqual(JSONRenderer().render(reader.render(rows)),
+                         JSONRenderer().render(expected))
+
+    def test_readers_render_like_the_serializers(self):
+        self.assertRendersLikeSerializer(
+            ProduceSerializer, Produce.objects.order_by('pk'))
+        self.assertRendersLikeSerializer(
+            OrderListSerializer, Order.objects.order_by('pk'))
+        self.assertRendersLikeSerializer(
+            ItemListSerializer, OrderItem.objects.order_by('-pk'))
+        self.assertRendersLikeSerializer(
+            CategoryProduceSerializer, Category.objects.order_by('pk'))
+
+    def test_orders_are_read_with_their_items_in_two_queries(self):
+        reader = get_reader(OrderListSerializer, Order)
+        with self.assertNumQueries(2):
+            reader.render(reader.values(Order.objects.all()))
+
+    def test_nested_objects_are_not_compiled(self):
+        self.assertIsNone(get_reader(UserSerializer, User))
+
+
+class FastReadAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(user=make_marketplace())
+
+    def get(self, url, params):
+        # leave the cached responses out of the comparison
+        cache.clear()
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b"".join(response.streaming_content), None
+        return response.content, response.get("Link")
+
+    def assertSameResponses(self, view, url, params):
+        fast = self.get(url, params)
+        with mock.patch.object(view, 'fast_read', False):
+            slow = self.get(url, params)
+        self.assertEqual(fast, slow)
+
+    def test_lists_and_exports_match_the_serializers(self):
+        for view, basename in [(ProduceViewSet, "products"),
+                               (OrderViewSet, "shopping")]:
+            for params in [{}, {"page_size": 2}]:
+                self.assertSameResponses(
+                    view, reverse("api:%s-list" % basename), params)
+            self.assertSameResponses(
+                view, reverse("api:%s-export" % basename),
+                {"type": "ndjson"})
@@ -0,0 +1,66 @@
+""" Test the JSON renderer and parser """
+
+import io
+from unittest import mock, skipIf
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from gricapi import parsers, renderers
+from gricapi.management.commands.benchmark_renderers import (
+    order_rows, produce_rows
+)
+from gricapi.parsers import FastJSONParser
+from gricapi.renderers import FastJSONRenderer
+
+
+class FastJSONTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.data = {
+            'produce': produce_rows(3),
+            'orders': order_rows(3),
+            'note': 'Mangoes \u00e0 vendre\u2028cheap',
+            'empty': None,
+        }
+
+    def assertRendersLikeJSONRenderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data),
+                         JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    @skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_orjson_renders_like_json_renderer(self):
+        self.assertRendersLikeJSONRenderer()
+
+    def test_json_fallback(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertRendersLikeJSONRenderer()
+
+    def test_indented_output_is_rendered_by_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(
+                self.data, 'application/json; indent=4'),
+            JSONRenderer().render(self.data, 'application/json; indent=4'))
+
+    def assertParses(self):
+        parser = FastJSONParser()
+        self.assertEqual(
+            parser.parse(io.BytesIO('{"name": "Mangü", "stock": 4}'
+                                    .encode('utf-8'))),
+            {'name': 'Mangü', 'stock': 4})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"name": '))
+
+    def test_parser(self):
+        self.assertParses()
+        with mock.patch.object(parsers, 'orjson', None):
+            self.assertParses()
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_renderers', '--rows=10', '--repeat=1',
+                     stdout=out)
+        self.assertIn('ms per 1,000 rows', out.getvalue())
@@ -153,3 +153,48 @@ class OrderSerializerTestCase(TestCase):
         self.assertFalse(serializer.is_valid())
         self.assertEqual(set(serializer.errors), set(
             ['quantity_ordered']))
+
+    def test_order_items_are_written_in_bulk(self):
+        produce2 = Produce.objects.create(
+            produce_name="mango", produce_category=self.category,
+            price_tag=200, stock=10, owner=self.user)
+        data = {
+            "consumer": EMAIL2,
+            "items": [
+                {"produce": self.produce.id, "quantity_ordered": 2},
+                {"produce": produce2.id, "quantity_ordered": 3},
+            ]
+        }
+        serializer = OrderCreateSerializer(data=data)
+        # consumer lookup, produce in bulk
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+        order = serializer.save()
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total_cost, 2 * 1500 + 3 * 200)
+
+    def test_order_update_only_writes_changed_items(self):
+        produce2 = Produce.objects.create(
+            produce_name="mango", produce_category=self.category,
+            price_tag=200, stock=10, owner=self.user)
+        kept = OrderItem.objects.create(**self.order_item_attributes)
+        changed = OrderItem.objects.create(
+            order=self.order, produce=produce2, quantity_ordered=1)
+        data = {
+            "consumer": EMAIL2,
+            "items": [
+                {"produce": self.produce.id, "quantity_ordered": 30},
+                {"produce": produce2.id, "quantity_ordered": 5},
+                {"produce": produce2.id, "quantity_ordered": 1},
+            ]
+        }
+        serializer = OrderCreateSerializer(instance=self.order, data=data)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        items = self.order.items.all()
+        self.assertEqual(items.count(), 3)
+        self.assertTrue(items.filter(item_id=kept.item_id).exists())
+        changed.refresh_from_db()
+        self.assertEqual(changed.quantity_ordered, 5)
+        self.assertEqual(changed.price, 5 * produce2.price_tag)
+        self.assertEqual(self.order.total_cost, 30 * 1500 + 6 * 200)
@@ -0,0 +1,277 @@
+""" Test the stock reservations of orders """
+
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework.views import status
+
+from gricapi.managers import InsufficientStock, ProduceQuerySet
+from gricapi.models import User, Category, Produce, Order, OrderItem
+from gricapi.views import ProduceViewSet
+
+
+class StockReservationTestCase(APITestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create_user(
+            groups=group, email="buyer@test.com", password="pass")
+        category = Category.objects.create(category_name="Grains")
+        self.maize = Produce.objects.create(
+            produce_name="Maize", produce_category=category,
+            price_tag=10, stock=20, owner=self.user)
+        self.rice = Produce.objects.create(
+            produce_name="Rice", produce_category=category,
+            price_tag=30, stock=5, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("api:shopping-list")
+
+    def order(self, maize, rice, url=None):
+        data = {
+            "consumer": self.user.email,
+            "items": [
+                {"produce": self.maize.id, "quantity_ordered": maize},
+                {"produce": self.rice.id, "quantity_ordered": rice},
+            ]
+        }
+        if url is None:
+            return self.client.post(self.url, data=data, format='json')
+        return self.client.put(url, data=data, format='json')
+
+    def assertStock(self, maize, rice):
+        self.maize.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual((self.maize.stock, self.rice.stock), (maize, rice))
+
+    def test_order_reserves_stock(self):
+        response = self.order(15, 5)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertStock(5, 0)
+        self.assertEqual(
+            [item["status"] for item in response.data["items"]],
+            ["reserved", "reserved"])
+
+    def test_order_cannot_oversell_and_reserves_nothing(self):
+        response = self.order(15, 6)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Rice", str(response.data["items"]))
+        self.assertStock(20, 5)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_order_update_reserves_the_difference(self):
+        self.order(15, 5)
+        order = Order.objects.get()
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        response = self.order(20, 2, url=url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertStock(0, 3)
+        response = self.order(21, 2, url=url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertStock(0, 3)
+
+    def test_deleting_an_order_releases_its_stock(self):
+        self.order(15, 5)
+        order = Order.objects.get()
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertStock(20, 5)
+
+    def test_expired_reservations_are_released(self):
+        self.order(15, 5)
+        self.order(1, 0)
+        Order.objects.filter(items__quantity_ordered=15).update(
+            update_transaction_date=timezone.now() - timedelta(hours=1))
+        call_command('release_expired_reservations', '--minutes=30',
+                     stdout=StringIO())
+        self.assertStock(19, 5)
+        self.assertEqual(
+            Order.objects.filter(order_status="expired").count(), 1)
+        self.assertEqual(
+            OrderItem.objects.filter(status="released").count(), 2)
+
+        expired = Order.objects.get(order_status="expired")
+        url = reverse('api:shopping-detail', kwargs={"pk": expired.pkid})
+        response = self.order(1, 1, url=url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expiring_an_order_changes_its_etag(self):
+        self.order(15, 5)
+        order = Order.objects.get()
+        Order.objects.update(
+            update_transaction_date=timezone.now() - timedelta(hours=1))
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        etag = self.client.get(url)["ETag"]
+        call_command('release_expired_reservations', '--minutes=30',
+                     stdout=StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["order_status"], "expired")
+
+    def test_produce_edit_keeps_the_reservations_made_meanwhile(self):
+        url = reverse('api:products-detail', kwargs={"pk": self.maize.pk})
+        data = self.client.get(url).json()
+        get_object = ProduceViewSet.get_object
+
+        def read_then_reserve(view):
+            produce = get_object(view)
+            Produce.objects.reserve({self.maize.pk: 5})
+            return produce
+
+        with mock.patch.object(ProduceViewSet, 'get_object',
+                               read_then_reserve):
+            response = self.client.put(url, data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()["stock"], 15)
+            self.assertStock(15, 5)
+
+            data["stock"] = 25
+            response = self.client.put(url, data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertStock(20, 5)
+
+            # taking out more than the orders left
+            data["stock"] = 0
+            response = self.client.put(url, data=data, format='json')
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+            self.assertStock(15, 5)
+
+
+class ReserveTestCase(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(email="farmer@test.com")
+        category = Category.objects.create(category_name="Grains")
+        self.produce = Produce.objects.create(
+            produce_name="Maize", produce_category=category,
+            stock=3, owner=user)
+        self.produce2 = Produce.objects.create(
+            produce_name="Rice", produce_category=category,
+            stock=1, owner=user)
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientStock) as error:
+            Produce.objects.reserve({self.produce.pk: 2, self.produce2.pk: 2})
+        self.assertEqual(error.exception.produce_id, self.produce2.pk)
+        self.produce.refresh_from_db()
+        self.assertEqual(self.produce.stock, 3)
+
+    def test_reserve_runs_one_update_per_produce(self):
+        with self.assertNumQueries(4):
+            # savepoint, two updates, savepoint release
+            Produce.objects.reserve({self.produce.pk: 2, self.produce2.pk: 1})
+
+
+class ConcurrentReservationTestCase(TransactionTestCase):
+
+    def test_concurrent_reservations_never_oversell(self):
+        user = User.objects.create(email="farmer@test.com")
+        category = Category.objects.create(category_name="Grains")
+        produce = Produce.objects.create(
+            produce_name="Maize", produce_category=category,
+            stock=10, owner=user)
+        results = []
+
+        def buy():
+            try:
+                for _ in range(200):
+                    try:
+                        with transaction.atomic():
+                            Produce.objects.reserve({produce.pk: 1})
+                        results.append(True)
+                        return
+                    except InsufficientStock:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite lets a single writer in at a time
+                        continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        produce.refresh_from_db()
+        self.assertEqual(len(results), 25)
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(produce.stock, 0)
+
+    def test_concurrent_releases_put_stock_back_once(self):
+        group = Group.objects.create(name='anonymous')
+        user = User.objects.create_user(
+            groups=group, email="buyer@test.com", password="pass")
+        category = Category.objects.create(category_name="Grains")
+        produce = Produce.objects.create(
+            produce_name="Maize", produce_category=category,
+            price_tag=10, stock=10, owner=user)
+        with transaction.atomic():
+            order = Order.objects.create(consumer=user)
+            OrderItem.objects.bulk_add(
+                order, [{'produce': produce, 'quantity_ordered': 4}])
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        cutoff = timezone.now() + timedelta(hours=1)
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def delete():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            return client.delete(url)
+
+        def expire():
+            return Order.objects.filter(
+                pk=order.pk).expire_reservations(cutoff)
+
+        def run(release):
+            barrier.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        release()
+                        return
+                    except OperationalError:
+                        # SQLite lets a single writer in at a time
+                        continue
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+            finally:
+                connection.close()
+
+        release = ProduceQuerySet.release
+        releasing = threading.Barrier(2, timeout=1)
+
+        def slow_release(queryset, quantities):
+            # have both releases read the reservations before either puts
+            # their stock back, unless one waits for the other's locks
+            try:
+                releasing.wait()
+            except threading.BrokenBarrierError:
+                pass
+            release(queryset, quantities)
+
+        threads = [threading.Thread(target=run, args=[release])
+                   for release in (delete, expire)]
+        with mock.patch.object(ProduceQuerySet, 'release', slow_release):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertFalse(Order.objects.exists())
+        produce.refresh_from_db()
+        self.assertEqual(produce.stock, 10)
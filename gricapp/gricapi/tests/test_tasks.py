@@ -0,0 +1,182 @@
+""" Test the background tasks """
+
+import io
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import status
+
+from gricapi.managers import FAILED, QUEUED, RUNNING
+from gricapi.models import User, Category, Produce, Order, Task
+from gricapi.tasks import (
+    enqueue, task, work, ORDER_CREATED, ORDER_DELETED, ORDER_ITEMS_UPDATED,
+    ORDER_PAID
+)
+
+CALLS = []
+
+
+@task('tests.record')
+def record(value, fail=False):
+    CALLS.append(value)
+    if fail:
+        raise RuntimeError('failed')
+
+
+class TaskQueueTestCase(TransactionTestCase):
+
+    def setUp(self):
+        del CALLS[:]
+
+    def test_queued_on_commit(self):
+        with transaction.atomic():
+            enqueue('tests.record', value=1)
+            self.assertFalse(Task.objects.exists())
+        queued = Task.objects.get()
+        self.assertEqual((queued.name, queued.status),
+                         ('tests.record', QUEUED))
+        self.assertEqual(json.loads(queued.payload), {'value': 1})
+        self.assertEqual(CALLS, [])
+
+    def test_nothing_queued_on_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue('tests.record', value=1)
+                raise RuntimeError
+        self.assertFalse(Task.objects.exists())
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.unknown')
+
+    def test_eager(self):
+        with self.settings(TASKS_EAGER=True):
+            with transaction.atomic():
+                enqueue('tests.record', value=1)
+                self.assertEqual(CALLS, [])
+            self.assertEqual(CALLS, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_work(self):
+        for value in range(3):
+            enqueue('tests.record', value=value)
+        self.assertEqual(work(batch_size=2, burst=True), (3, 0))
+        self.assertEqual(CALLS, [0, 1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_tasks_are_retried(self):
+        enqueue('tests.record', value=1, fail=True)
+        with self.settings(TASKS_MAX_ATTEMPTS=2, TASKS_RETRY_DELAY=60):
+            self.assertEqual(work(burst=True), (0, 1))
+            retried = Task.objects.get()
+            self.assertEqual((retried.status, retried.attempts), (QUEUED, 1))
+            self.assertIn('RuntimeError', retried.last_error)
+            self.assertGreater(retried.run_at,
+                               timezone.now() + timedelta(seconds=50))
+
+            Task.objects.update(run_at=timezone.now())
+            self.assertEqual(work(burst=True), (0, 1))
+            self.assertEqual(Task.objects.get().status, FAILED)
+            self.assertEqual(work(burst=True), (0, 0))
+        self.assertEqual(CALLS, [1, 1])
+
+    def test_claim(self):
+        enqueue('tests.record', value=1)
+        claimed, = Task.objects.claim(10, lease=60)
+        self.assertEqual((claimed.status, claimed.attempts), (RUNNING, 1))
+        self.assertEqual(Task.objects.claim(10, lease=60), [])
+
+        # the lease of a dead worker expires
+        Task.objects.update(run_at=timezone.now())
+        claimed, = Task.objects.claim(10, lease=60)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_abandoned_tasks_out_of_attempts_fail(self):
+        enqueue('tests.record', value=1)
+        with self.settings(TASKS_MAX_ATTEMPTS=2):
+            for attempts in (1, 2):
+                claimed, = Task.objects.claim(10, lease=60)
+                self.assertEqual(claimed.attempts, attempts)
+                # the worker dies and its lease expires
+                Task.objects.update(run_at=timezone.now())
+            self.assertFalse(Task.objects.due().exists())
+            self.assertEqual(Task.objects.claim(10, lease=60), [])
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (FAILED, 2))
+        self.assertIn('died', failed.last_error)
+        self.assertEqual(CALLS, [])
+
+    def test_command(self):
+        enqueue('tests.record', value=1)
+        enqueue('tests.record', value=2, fail=True)
+        out = io.StringIO()
+        call_command('run_workers', '--burst', stdout=out)
+        self.assertIn('Ran 2 task(s), 1 failed.', out.getvalue())
+        self.assertEqual(CALLS, [1, 2])
+
+
+class OrderTasksTestCase(TransactionTestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create_user(
+            groups=group, email='buyer@test.com', password='pass')
+        category = Category.objects.create(category_name='Grains')
+        self.maize = Produce.objects.create(
+            produce_name='Maize', produce_category=category,
+            price_tag=10, stock=20, owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def queued(self):
+        return [(row.name, json.loads(row.payload))
+                for row in Task.objects.order_by('pk')]
+
+    def test_order_lifecycle(self):
+        response = self.client.post(reverse('api:shopping-list'), {
+            'consumer': self.user.email,
+            'items': [{'produce': self.maize.id, 'quantity_ordered': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        self.assertEqual(self.queued(),
+                         [(ORDER_CREATED, {'order_pk': order.pk})])
+
+        Task.objects.all().delete()
+        response = self.client.put(
+            reverse('api:shopping-detail', args=[order.pk]), {
+                'consumer': self.user.email,
+                'items': [{'produce': self.maize.id, 'quantity_ordered': 3}],
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.queued(),
+                         [(ORDER_ITEMS_UPDATED, {'order_pk': order.pk})])
+
+        Task.objects.all().delete()
+        order = Order.objects.get()
+        order.paid = True
+        order.save()
+        order.save()
+        self.assertEqual(self.queued(),
+                         [(ORDER_PAID, {'order_pk': order.pk})])
+
+        Task.objects.all().delete()
+        response = self.client.delete(
+            reverse('api:shopping-detail', args=[order.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.queued(), [(ORDER_DELETED, {
+            'order_pk': order.pk, 'consumer_pk': self.user.pk})])
+
+    def test_eager_orders(self):
+        with self.settings(TASKS_EAGER=True):
+            with self.assertLogs('gricapi.tasks', 'INFO') as logs:
+                Order.objects.create(consumer=self.user)
+        self.assertIn('created', logs.output[0])
+        self.assertFalse(Task.objects.exists())
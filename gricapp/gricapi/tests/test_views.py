@@ -1,10 +1,20 @@
 """
 Test the API Views
 """
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.views import status
 
+from gricapi.cache import get_cache_stats, produce_cache
 from gricapi.models import (
     User, Profile, Produce, Category, Order, OrderItem
 )
@@ -227,6 +237,7 @@ class ProduceListCreateAPIView(APITestCase):
         self.user.save()
         self.client.force_authenticate(user=self.user)
         self.url = reverse("api:products-list")
+        cache.clear()
         self.category = Category.objects.create(category_name="Vegetables")
         self.produce = Produce.objects.create(
             produce_category=self.category,
@@ -258,6 +269,104 @@ class ProduceListCreateAPIView(APITestCase):
         self.assertEqual(data["produce_name"], self.produce.produce_name)
         self.assertEqual(data["produce_category"], self.category.category_name)
 
+    @override_settings(API_MAX_PAGE_SIZE=3)
+    def test_produce_list_is_paginated_by_cursor(self):
+        for index in range(6):
+            Produce.objects.create(
+                produce_category=self.category, owner=self.user,
+                produce_name="Produce %s" % index)
+        response = self.client.get(self.url, {"page_size": 50})
+        self.assertEqual(len(response.json()), 3)
+
+        seen = []
+        url = self.url + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.json()), 2)
+            seen.extend(row["id"] for row in response.json())
+            link = response.get("Link")
+            url = link[1:link.index(">")] if link else None
+        expected = list(Produce.objects.order_by(
+            "-date_created", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filter_produce_with_facets(self):
+        fruits = Category.objects.create(category_name="Fruits")
+        for name, category, unit, stock, price in [
+                ("Mango", fruits, "units", 5, 200),
+                ("Banana", fruits, "bags", 0, 900),
+                ("Kale", self.category, "bags", 3, 700)]:
+            Produce.objects.create(
+                produce_name=name, produce_category=category, owner=self.user,
+                measurement_unit=unit, stock=stock, price_tag=price)
+
+        def names(params):
+            response = self.client.get(self.url, params)
+            return sorted(row["produce_name"] for row in response.json())
+
+        self.assertEqual(names({"category": "Fruits"}), ["Banana", "Mango"])
+        self.assertEqual(names({
+            "category": ["Fruits", "Vegetables"], "in_stock": "true",
+            "max_price": 1000}), ["Kale", "Mango"])
+
+        params = {"measurement_unit": "bags", "max_price": 1000}
+        with self.assertNumQueries(2):
+            self.client.get(self.url, params)
+        params["facets"] = "true"
+        with self.assertNumQueries(3):
+            # the facets take a single grouped query
+            response = self.client.get(self.url, params)
+        self.assertEqual([row["produce_name"] for row in response.json()[
+            "results"]], ["Kale", "Banana"])
+        facets = response.json()["facets"]
+        self.assertEqual(facets["category"], [
+            {"value": "Fruits", "count": 1},
+            {"value": "Vegetables", "count": 1}])
+        self.assertEqual(facets["measurement_unit"], [
+            {"value": "bags", "count": 2}, {"value": "units", "count": 1}])
+        self.assertEqual(facets["in_stock"], [
+            {"value": False, "count": 1}, {"value": True, "count": 1}])
+        self.assertEqual(facets["price"], {"min": "700.00", "max": "900.00"})
+
+        response = self.client.get(self.url, {"min_price": "cheap"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_produce(self):
+        for name, description in [
+                ("Tomatoes", "Ripe and red"),
+                ("Red onions", "Grown next to the tomato field"),
+                ("Cabbage", None)]:
+            Produce.objects.create(
+                produce_category=self.category, owner=self.user,
+                produce_name=name, product_description=description)
+        url = reverse("api:products-search")
+
+        response = self.client.get(url, {"q": "toma"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["produce_name"] for row in response.json()],
+                         ["Tomatoes", "Red onions"])
+        response = self.client.get(url, {"q": "RED tom"})
+        self.assertEqual(len(response.json()), 2)
+        response = self.client.get(url, {"q": "cabbage", "page_size": 1})
+        self.assertEqual(response.json()[0]["produce_name"], "Cabbage")
+        response = self.client.get(url, {"q": "bananas"})
+        self.assertEqual(response.json(), [])
+
+        cabbage = Produce.objects.get(produce_name="Cabbage")
+        cabbage.produce_name = "Kale"
+        cabbage.save()
+        self.assertEqual(self.client.get(url, {"q": "cabbage"}).json(), [])
+        self.assertEqual(len(self.client.get(url, {"q": "kale"}).json()), 1)
+        cabbage.delete()
+        self.assertEqual(self.client.get(url, {"q": "kale"}).json(), [])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_a_new_produce(self):
         self.assertEqual(
             Produce.objects.count(),
@@ -333,6 +442,124 @@ class ProduceListCreateAPIView(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class ProduceCacheTestCase(APITransactionTestCase):
+    """ The cache is invalidated once writes are committed """
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create(groups=group, email=EMAIL)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("api:products-list")
+        cache.clear()
+        self.category = Category.objects.create(category_name="Vegetables")
+        self.produce = Produce.objects.create(
+            produce_category=self.category, produce_name="Lenscus",
+            stock=50, price_tag=3500, owner=self.user)
+
+    def test_produce_reads_are_cached_until_a_write(self):
+        detail_url = reverse('api:products-detail',
+                             kwargs={"pk": self.produce.pk})
+        for url in [self.url, detail_url]:
+            response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "MISS")
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "HIT")
+
+        self.produce.stock = 7
+        self.produce.save()
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["stock"], 7)
+
+        self.category.category_name = "Greens"
+        self.category.save()
+        for url in [self.url, detail_url]:
+            response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["produce_category"], "Greens")
+        self.assertGreaterEqual(get_cache_stats()["produce"]["hits"], 2)
+
+    def test_cached_produce_answers_conditional_requests(self):
+        detail_url = reverse('api:products-detail',
+                             kwargs={"pk": self.produce.pk})
+        etag = self.client.get(detail_url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.produce.save()
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_get_produce_by_slug(self):
+        url = reverse('api:products-detail', kwargs={"pk": "lenscus-pro"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["id"], self.produce.id)
+        self.assertEqual(response.json()["slug"], "lenscus-pro")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        self.produce.stock = 7
+        self.produce.save()
+        self.assertEqual(self.client.get(url).json()["stock"], 7)
+
+        url = reverse('api:products-detail', kwargs={"pk": "missing-pro"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filtered_retrieve_is_not_served_from_the_cache(self):
+        detail_url = reverse('api:products-detail',
+                             kwargs={"pk": self.produce.pk})
+        self.client.get(detail_url)
+        response = self.client.get(detail_url, {"category": "Fruits"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(detail_url, {"category": "Vegetables"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-Cache", response)
+
+    def test_reads_during_a_write_are_dropped_on_commit(self):
+        detail_url = reverse('api:products-detail',
+                             kwargs={"pk": self.produce.pk})
+        self.client.get(detail_url)
+        with transaction.atomic():
+            self.produce.stock = 7
+            self.produce.save()
+            # a read before the commit still gets the cached payload
+            response = self.client.get(detail_url)
+            self.assertEqual(response["X-Cache"], "HIT")
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["stock"], 7)
+
+    def test_a_slug_reused_after_a_delete_serves_the_new_produce(self):
+        url = reverse('api:products-detail', kwargs={"pk": "lenscus-pro"})
+        self.client.get(url)
+        old_pk = self.produce.pk
+        slug_key = produce_cache.slug_key("lenscus-pro")
+        with transaction.atomic():
+            self.produce.delete()
+            # a concurrent read resolving the slug before the commit
+            cache.set(slug_key, old_pk)
+        self.assertIsNone(cache.get(slug_key))
+
+        # a mapping left over anyway must not serve nor cache the new row
+        cache.set(slug_key, old_pk)
+        produce = Produce.objects.create(
+            produce_category=self.category, produce_name="Lenscus",
+            owner=self.user)
+        self.assertEqual(produce.slug, "lenscus-pro")
+        response = self.client.get(url)
+        self.assertEqual(response.json()["id"], produce.pk)
+        self.assertIsNone(cache.get(produce_cache.detail_key(old_pk)))
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json()["id"], produce.pk)
+
+
 class CategoryListCreate(APITestCase):
 
     def setUp(self):
@@ -355,6 +582,25 @@ class CategoryListCreate(APITestCase):
         data = response_json[0]
         self.assertEqual(category.category_name, data["category_name"])
 
+    def test_category_list_runs_constant_queries(self):
+        for index in range(4):
+            category = Category.objects.create(
+                category_name="Category %s" % index)
+            for number in range(3):
+                owner = User.objects.create_user(
+                    groups=self.group, password=PASSWORD,
+                    email="farmer%s-%s@test.com" % (index, number))
+                Produce.objects.create(
+                    produce_category=category, owner=owner,
+                    produce_name="Produce %s" % number)
+        # one query for the categories, one for the products and owners
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual(
+            response.json()[0]["products"][0]["owner"], "farmer0-0@test.com")
+
     def test_create_a_new_produce_and_category(self):
         self.assertEqual(
             Produce.objects.count(),
@@ -456,7 +702,30 @@ class CategoryProduceDetailsAPITest(APITestCase):
         user.is_superuser = True
         user.save()
         response = self.client.delete(self.url)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"moved": 2})
+        general = Category.objects.get(category_name="General")
+        self.assertEqual(general.products.count(), 2)
+
+    def test_delete_category_in_chunks(self):
+        group = Group.objects.create(name='admin')
+        user = User.objects.create(
+            groups=group, email=EMAIL2, is_staff=True, is_superuser=True)
+        self.client.force_authenticate(user=user)
+        for index in range(3):
+            Produce.objects.create(
+                produce_category=self.category, owner=self.owner,
+                produce_name="Berry %s" % index)
+        response = self.client.delete(self.url + "?chunk_size=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"moved": 5})
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertEqual(Produce.objects.count(), 5)
+
+        general = Category.objects.get(category_name="General")
+        url = reverse("api:produce-category-detail", kwargs={"pk": general.pk})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 class OrderTestCase(APITestCase):
@@ -476,7 +745,7 @@ class OrderTestCase(APITestCase):
         self.produce = Produce.objects.create(
             produce_category=self.category,
             produce_name="Lenscus",
-            stock=50,
+            stock=500,
             price_tag=3500,
             measurement_unit="tonnes",
             owner=self.user
@@ -485,7 +754,7 @@ class OrderTestCase(APITestCase):
         self.produce2 = Produce.objects.create(
             produce_category=self.category,
             produce_name="Letus",
-            stock=10,
+            stock=1000,
             price_tag=300,
             measurement_unit="tonnes",
             owner=self.user
@@ -568,3 +837,227 @@ class OrderTestCase(APITestCase):
         self.assertEqual(response2.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Order.objects.count(), 0)
         self.assertFalse(OrderItem.objects.filter(order=order).exists())
+
+    def test_order_list_runs_constant_queries(self):
+        for _ in range(5):
+            self.test_add_an_item_and_make_new_order()
+        # one query for the ETag of the page, one for the orders and
+        # one for their items
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 5)
+        order = Order.objects.first()
+        data = [row for row in response.json()
+                if row["id"] == str(order.id)][0]
+        self.assertEqual(data["total_cost"], float(order.total_cost))
+
+    def test_order_list_is_paginated_by_cursor(self):
+        for _ in range(3):
+            self.client.post(self.url, data={"consumer": EMAIL}, format='json')
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(len(response.json()), 2)
+        link = response["Link"]
+        response2 = self.client.get(link[1:link.index(">")])
+        self.assertEqual(len(response2.json()), 1)
+        self.assertFalse(response2.has_header("Link"))
+        self.assertEqual(
+            [row["id"] for row in response.json() + response2.json()],
+            [str(order.id) for order in Order.objects.order_by(
+                "-transaction_date", "-pk")])
+
+    def test_orders_can_be_sorted_and_filtered_by_value(self):
+        self.test_add_an_item_and_make_new_order()
+        self.client.post(self.url, data={
+            "consumer": EMAIL,
+            "items": [{"produce": self.produce2.id, "quantity_ordered": 1}]
+        }, format='json')
+        response = self.client.get(self.url, {"ordering": "total_cost"})
+        totals = [row["total_cost"] for row in response.json()]
+        self.assertEqual(totals, [300.0, 102000.0])
+        response = self.client.get(self.url, {"ordering": "-total_cost"})
+        totals = [row["total_cost"] for row in response.json()]
+        self.assertEqual(totals, [102000.0, 300.0])
+        response = self.client.get(self.url, {"min_total": "1000"})
+        self.assertEqual(len(response.json()), 1)
+        response = self.client.get(self.url, {"max_total": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_reads_answer_conditional_requests(self):
+        self.test_add_an_item_and_make_new_order()
+        order = Order.objects.first()
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        for path in [self.url, url]:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response["ETag"]
+
+            with self.assertNumQueries(1):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response["ETag"], etag)
+
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # a row leaving the list does not move the latest date on it
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        order.paid = True
+        order.save()
+        for path in [self.url, url]:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_renaming_an_ordered_produce_changes_the_order_validators(self):
+        self.test_add_an_item_and_make_new_order()
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Order.objects.update(update_transaction_date=an_hour_ago)
+        Produce.objects.update(date_modified=an_hour_ago)
+        order = Order.objects.first()
+        url = reverse('api:shopping-detail', kwargs={"pk": order.pkid})
+        etags = [self.client.get(path)["ETag"] for path in [self.url, url]]
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        self.produce.produce_name = "Renamed"
+        self.produce.save()
+        for path, etag in zip([self.url, url], etags):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Renamed", [
+            item["produce"] for item in response.json()["items"]])
+
+
+@override_settings(API_EXPORT_CHUNK_SIZE=2)
+class ExportTestCase(APITestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create(groups=group, email=EMAIL)
+        self.other = User.objects.create(groups=group, email=EMAIL2)
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(category_name="Grains")
+        self.produce = [
+            Produce.objects.create(
+                produce_name="Maize %s" % index, produce_category=category,
+                price_tag=10, stock=100, owner=self.user)
+            for index in range(5)
+        ]
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_export_catalog(self):
+        url = reverse("api:products-export")
+        with self.assertNumQueries(3):
+            # one query per chunk of two
+            lines = self.export(url).splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "slug", "owner"])
+        self.assertEqual([line.split(",")[0] for line in lines[1:]],
+                         [str(produce.pk) for produce in self.produce])
+
+        lines = self.export(url, type="ndjson").splitlines()
+        self.assertEqual([json.loads(line)["produce_name"] for line in lines],
+                         ["Maize %s" % index for index in range(5)])
+        self.assertEqual(self.export(url, type="ndjson", category="Fruits"),
+                         "")
+        response = self.client.get(url, {"type": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_orders_of_the_user(self):
+        for consumer, quantities in [(self.user, [1, 2]), (self.user, []),
+                                     (self.other, [3])]:
+            order = Order.objects.create(consumer=consumer)
+            for produce, quantity in zip(self.produce, quantities):
+                OrderItem.objects.create(order=order, produce=produce,
+                                         quantity_ordered=quantity)
+        url = reverse("api:shopping-export")
+
+        rows = list(csv.DictReader(io.StringIO(self.export(url))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row["quantity_ordered"] for row in rows],
+                         ["1", "2", ""])
+        self.assertEqual({row["consumer"] for row in rows}, {EMAIL})
+        self.assertEqual(rows[0]["produce"], "Maize 0")
+
+        lines = self.export(url, type="ndjson").splitlines()
+        self.assertEqual([len(json.loads(line)["items"]) for line in lines],
+                         [2, 0])
+
+        self.user.groups = Group.objects.create(name='admin')
+        self.user.save()
+        self.assertEqual(len(self.export(url, type="ndjson").splitlines()), 3)
+
+
+@override_settings(API_IMPORT_BATCH_SIZE=2)
+class ImportTestCase(APITestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='anonymous')
+        self.user = User.objects.create(groups=group, email=EMAIL)
+        User.objects.create(groups=group, email=EMAIL2)
+        self.client.force_authenticate(user=self.user)
+        Category.objects.create(category_name="Grains")
+        Category.objects.create(category_name="Fruits")
+        Produce.objects.create(
+            produce_name="Maize", owner=self.user,
+            produce_category=Category.objects.get(category_name="Grains"))
+        self.url = reverse("api:products-import")
+
+    def test_import_json(self):
+        rows = [{"produce_name": "Maize", "produce_category": "Grains",
+                 "owner": email, "stock": 10, "measurement_unit": "bags",
+                 "price_tag": "12.50"}
+                for email in [EMAIL, EMAIL2, EMAIL, EMAIL2, EMAIL]]
+        # the owners, the categories and two queries per batch of two
+        # inside a savepoint
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {"created": 5})
+        self.assertEqual(
+            sorted(Produce.objects.values_list("slug", flat=True)),
+            ["maize-pro"] + ["maize-pro-%s" % index for index in range(2, 7)])
+
+        response = self.client.get(reverse("api:products-list"))
+        self.assertEqual(len(response.json()), 6)
+
+    def test_import_csv(self):
+        content = "\n".join([
+            "produce_name,produce_category,owner,stock,measurement_unit",
+            "Mango,Fruits,%s,5,units" % EMAIL2,
+            "Rice,Grains,%s,,bags" % EMAIL,
+        ])
+        response = self.client.post(self.url, content,
+                                    content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mango = Produce.objects.get(produce_name="Mango")
+        self.assertEqual((mango.owner.email, mango.stock), (EMAIL2, 5))
+        self.assertEqual(Produce.objects.get(produce_name="Rice").stock, 0)
+
+    def test_import_reports_every_invalid_row(self):
+        rows = [
+            {"produce_name": "Rice", "produce_category": "Grains",
+             "owner": EMAIL, "measurement_unit": "bags"},
+            {"produce_name": "Rice", "produce_category": "Nuts",
+             "owner": EMAIL, "measurement_unit": "bags"},
+            {"produce_name": "Rice", "produce_category": "Grains",
+             "owner": "nobody@test.com", "measurement_unit": "sacks"},
+        ]
+        response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()["errors"]
+        self.assertEqual([error["row"] for error in errors], [2, 3])
+        self.assertEqual(set(errors[0]), {"row", "produce_category"})
+        self.assertEqual(set(errors[1]),
+                         {"row", "owner", "measurement_unit"})
+        self.assertEqual(Produce.objects.count(), 1)
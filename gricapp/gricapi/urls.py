@@ -18,4 +18,5 @@ router.register(r'shop/order', views.OrderViewSet, basename='shopping')
 app_name = "api"
 urlpatterns = [
     path('', include(router.urls)),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
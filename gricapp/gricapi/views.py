@@ -1,23 +1,35 @@
 """
 Create views here
 """
-from gricapi.models import User, Produce, Category, Order
+from gricapi.models import User, Profile, Produce, Category, Order
 from gricapi.serializers import (
     UserSerializer, ProduceSerializer, CategoryProduceSerializer,
-    OrderCreateSerializer, OrderListSerializer
+    OrderCreateSerializer, OrderListSerializer, ItemListSerializer,
+    ProduceImportSerializer
 )
-from rest_framework import viewsets, mixins
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework import viewsets, mixins, serializers
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated
 )
 
+from gricapi.cache import produce_cache
+from gricapi.filters import ProduceFacetFilter
+from gricapi.geo import nearest_produce
+from gricapi.metrics import render_metrics
 from gricapi.mixins import (
-    CreateModelMixin, UpdateModelMixin,
-    ListModelMixin, RetrieveModelMixin
+    CacheResponseMixin, CreateModelMixin, UpdateModelMixin,
+    ListModelMixin, RetrieveModelMixin, ExportMixin
 )
 from gricapi.generics import GenericAPIView
+from gricapi.parsers import CSVParser, FastJSONParser
+from gricapi.queries import plan_queryset
+from gricapi.search import search_produce
 from gricapi.permissions import (
     IsAdminUser, IsAdminOrAnonymousUser, IsOwnerOrAdmin
 )
@@ -56,17 +68,45 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(response, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
-class ProduceViewSet(viewsets.ModelViewSet):
+class ProduceViewSet(CacheResponseMixin,
+                     ExportMixin,
+                     CreateModelMixin,
+                     UpdateModelMixin,
+                     ListModelMixin,
+                     RetrieveModelMixin,
+                     mixins.DestroyModelMixin,
+                     GenericAPIView,
+                     viewsets.GenericViewSet):
     """
     retrieve:
-    Return the given produce.
+    Return the given produce, looked up by id or slug.
 
     list:
-    Return a list of all the existing produce.
+    Return a list of all the existing produce, filtered by
+    `?category=`, `?measurement_unit=`, `?min_price=`, `?max_price=` and
+    `?in_stock=`. With `?facets=true` the page comes with the count of
+    produce per category, measurement unit and stock status.
+
+    search:
+    Return the produce whose name or description match every word of
+    `?q=` as a prefix, best match first, up to `?page_size=` of them.
+
+    export:
+    Stream the whole catalog, filtered like the list, as CSV or with
+    `?type=ndjson` as one JSON object per line.
+
+    nearby:
+    Return the produce of the farmers nearest to `?latitude=` and
+    `?longitude=`, or to the address in the user's profile, nearest first
+    with their `distance` in km. `?radius=` (km) leaves out farther ones.
 
     create:
     Create a new produce instance.
 
+    import:
+    Create many produce from a JSON array or a CSV file, all or none:
+    the errors of the invalid rows are returned with their 1-based `row`.
+
     Update:
     The update produce attributes except date_created and date_modified.
     Date_modified is updated automatically upon successful serializer
@@ -79,12 +119,25 @@ class ProduceViewSet(viewsets.ModelViewSet):
     """
     queryset = Produce.objects.all()
     serializer_class = ProduceSerializer
+    slug_lookup_field = 'slug'
+    fast_read = True
+    filter_backends = [ProduceFacetFilter]
+    cursor_ordering = ('-date_created', '-id')
+    last_modified_field = 'date_modified'
+    response_cache = produce_cache
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve', 'search', 'nearby', 'export']:
+            queryset = plan_queryset(queryset, self.get_serializer_class())
+        return queryset
 
     def get_permissions(self):
         permission_classes = []
-        if self.action == 'create':
+        if self.action in ['create', 'import_produce']:
             permission_classes = [IsAuthenticated]
-        elif self.action in ['list', 'retrieve']:
+        elif self.action in ['list', 'retrieve', 'search', 'nearby',
+                             'export']:
             permission_classes = [IsAuthenticated]
         elif self.action in ['update', 'partial_update']:
             permission_classes = [IsOwnerOrAdmin]
@@ -97,8 +150,73 @@ class ProduceViewSet(viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-
-class ProduceCategoryViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def search(self, request):
+        query = serializers.CharField(max_length=200).run_validation(
+            request.query_params.get('q', serializers.empty))
+        results = search_produce(
+            self.filter_queryset(self.get_queryset()), query,
+            self.paginator.get_page_size(request))
+        serializer = self.get_read_serializer(results, many=True)
+        return Response(self.serialize(lambda: serializer.data))
+
+    @action(detail=False)
+    def nearby(self, request):
+        params = request.query_params
+        if 'latitude' in params or 'longitude' in params:
+            latitude = serializers.FloatField(
+                min_value=-90, max_value=90).run_validation(
+                    params.get('latitude', serializers.empty))
+            longitude = serializers.FloatField(
+                min_value=-180, max_value=180).run_validation(
+                    params.get('longitude', serializers.empty))
+        else:
+            profile = Profile.objects.filter(user=request.user).first()
+            if profile is None or profile.latitude is None:
+                response = {'message': 'Give a latitude and longitude or an '
+                                       'address in your profile.'}
+                return Response(response, status=status.HTTP_400_BAD_REQUEST)
+            latitude, longitude = profile.latitude, profile.longitude
+        radius = params.get('radius')
+        if radius is not None:
+            radius = serializers.FloatField(min_value=0).run_validation(radius)
+
+        results = nearest_produce(
+            self.filter_queryset(self.get_queryset()), latitude, longitude,
+            self.paginator.get_page_size(request), radius)
+        serializer = self.get_read_serializer(results, many=True)
+        data = self.serialize(lambda: serializer.data)
+        for row, produce in zip(data, results):
+            row['distance'] = round(produce.distance, 3)
+        return Response(data)
+
+    @action(detail=False, methods=['post'], url_path='import',
+            url_name='import', parser_classes=[FastJSONParser, CSVParser])
+    def import_produce(self, request):
+        serializer = ProduceImportSerializer(
+            data=request.data, many=True,
+            context=self.get_serializer_context())
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = [dict(row=index, **row_errors)
+                          for index, row_errors in enumerate(errors, 1)
+                          if row_errors]
+            return Response({'errors': errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            rows = serializer.save()
+        return Response({'created': len(rows)},
+                        status=status.HTTP_201_CREATED)
+
+
+class ProduceCategoryViewSet(CreateModelMixin,
+                             UpdateModelMixin,
+                             ListModelMixin,
+                             RetrieveModelMixin,
+                             mixins.DestroyModelMixin,
+                             GenericAPIView,
+                             viewsets.GenericViewSet):
     """
     retrieve:
     Return the given category and corresponding produces.
@@ -114,11 +232,24 @@ class ProduceCategoryViewSet(viewsets.ModelViewSet):
 
     Destroy:
     Delete the category from list of Categories and change all
-    corresponding products to 'General' category.
+    corresponding products to 'General' category, returning the number
+    of products moved. Large categories can be moved `?chunk_size=` rows
+    at a time.
 
     """
     queryset = Category.objects.all()
     serializer_class = CategoryProduceSerializer
+    cursor_ordering = ('id',)
+
+    def get_queryset(self):
+        """
+        Fetch the products and their owners rendered by the serializer
+        in bulk, whatever the size of the catalog.
+        """
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = plan_queryset(queryset, self.get_serializer_class())
+        return queryset
 
     def get_permissions(self):
         permission_classes = []
@@ -140,19 +271,31 @@ class ProduceCategoryViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         if not (request.user.is_superuser):
             return Response(status=status.HTTP_403_FORBIDDEN)
+        chunk_size = request.query_params.get('chunk_size')
+        if chunk_size is not None:
+            chunk_size = serializers.IntegerField(min_value=1).run_validation(
+                chunk_size)
         new_category, created = Category.objects.get_or_create(
             category_name="General")
         if created:
             pass
-        products = Produce.objects.filter(produce_category=instance)
-        for product in products:
-            product.produce_category = new_category
-            product.save()
-        self.perform_destroy(instance)
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-
-class OrderViewSet(CreateModelMixin,
+        if new_category == instance:
+            response = {'message': 'The General category cannot be deleted.'}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        moved = 0
+        if chunk_size is not None:
+            # move most products in short transactions of their own
+            moved = Produce.objects.reassign_category(
+                instance, new_category, chunk_size)
+        with transaction.atomic():
+            moved += Produce.objects.reassign_category(instance, new_category)
+            self.perform_destroy(instance)
+        return Response({'moved': moved}, status=status.HTTP_200_OK)
+
+
+class OrderViewSet(ExportMixin,
+                   CreateModelMixin,
                    UpdateModelMixin,
                    ListModelMixin,
                    RetrieveModelMixin,
@@ -166,6 +309,11 @@ class OrderViewSet(CreateModelMixin,
     list:
     Return a list of all orders by the user.
 
+    export:
+    Stream the orders of the user, or every order for admins, as CSV
+    with a line per item or with `?type=ndjson` as one JSON object per
+    order.
+
     create:
     Create a new order.
 
@@ -180,10 +328,14 @@ class OrderViewSet(CreateModelMixin,
     read_serializer_class = OrderListSerializer
     serializer_class = read_serializer_class
     write_serializer_class = OrderCreateSerializer
+    cursor_ordering = ('-transaction_date', '-pk')
+    fast_read = True
+    last_modified_field = 'update_transaction_date'
+    related_modified_fields = ('items__produce__date_modified',)
 
     def get_permissions(self):
         permission_classes = []
-        if self.action in ['create', 'list', 'retrieve']:
+        if self.action in ['create', 'list', 'retrieve', 'export']:
             permission_classes = [IsAuthenticated]
         elif self.action in ['update', 'partial_update']:
             permission_classes = [IsOwnerOrAdmin]
@@ -191,6 +343,52 @@ class OrderViewSet(CreateModelMixin,
             permission_classes = [IsOwnerOrAdmin]
         return [permission() for permission in permission_classes]
 
+    def get_queryset(self):
+        """
+        Fetch items in bulk for the read actions so the cost of a listing
+        does not grow per order, and filter by `min_total`/`max_total`.
+        """
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve', 'export']:
+            queryset = queryset.with_items()
+        if self.action == 'export' and not IsAdminUser().has_permission(
+                self.request, self):
+            queryset = queryset.filter(consumer=self.request.user)
+        if self.action == 'list':
+            total = serializers.DecimalField(max_digits=12, decimal_places=2)
+            for param, lookup in [('min_total', 'total_cost__gte'),
+                                  ('max_total', 'total_cost__lte')]:
+                value = self.request.query_params.get(param)
+                if value is not None:
+                    queryset = queryset.filter(
+                        **{lookup: total.run_validation(value)})
+        return queryset
+
+    def get_cursor_ordering(self):
+        """
+        Orders are listed newest first, or by value with
+        `?ordering=total_cost` or `?ordering=-total_cost`.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if ordering == 'total_cost':
+            return ('total_cost', 'pk')
+        if ordering == '-total_cost':
+            return ('-total_cost', '-pk')
+        return self.cursor_ordering
+
+    def get_export_header(self):
+        order_fields = super().get_export_header()
+        order_fields.remove('items')
+        return order_fields + list(ItemListSerializer().fields)
+
+    def get_export_rows(self, record):
+        """
+        Spread an order over a row per item, or a single row when it has
+        no items.
+        """
+        items = record.pop('items')
+        return [dict(record, **item) for item in items] or [record]
+
     def get_serializer_class(self):
         """
         Determines which serializer to order `list` or `detail`
@@ -201,11 +399,24 @@ class OrderViewSet(CreateModelMixin,
         return self.read_serializer_class
 
     # pylint: disable=unused-argument
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        items = instance.items.all()
-        for item in items:
-            item.delete()
+        Order.objects.filter(pk=instance.pk).release_reservations()
+        instance.items.all().delete()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    """
+    get:
+    Return the request metrics of this process in the Prometheus text
+    format.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):  # pylint: disable=unused-argument,no-self-use
+        return HttpResponse(render_metrics(),
+                            content_type='text/plain; version=0.0.4')